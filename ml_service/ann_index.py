@@ -0,0 +1,376 @@
+"""Approximate nearest-neighbour index over the product feature matrix.
+
+The index implements multi-table random-hyperplane LSH (SimHash) in pure
+numpy/scipy. Every table hashes an L2-normalised product vector into an
+``n_bits`` signature; products sharing a bucket in any table become
+candidates and are re-ranked by exact cosine similarity. Building the index
+costs one sparse projection and a sort per table, i.e. ``O(n log n)``, and new
+products can be appended without touching the rest of the catalog.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NUM_TABLES = 16
+TARGET_BUCKET_SIZE = 256
+MAX_BITS = 24
+MAX_BUCKET_BLOCK = 512
+# Stored codes re-hashed to check regenerated planes.
+CHECK_ROWS = 64
+
+
+def _auto_bits(n_items: int) -> int:
+    if n_items <= TARGET_BUCKET_SIZE:
+        return 1
+    return int(min(MAX_BITS, max(1, round(math.log2(n_items / TARGET_BUCKET_SIZE)))))
+
+
+def _random_planes(n_features: int, n_planes: int, seed: int) -> np.ndarray:
+    # Only the seed is persisted: a loaded index regenerates the planes.
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n_features, n_planes), dtype=np.float32)
+
+
+def _prune_pairs(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    scores: np.ndarray,
+    top_k: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Deduplicate ``(row, col, score)`` triples and keep the top-k per row.
+
+    The result is sorted by row, then by descending score and ascending column.
+    """
+
+    if rows.size == 0:
+        return rows, cols, scores
+
+    keys = rows.astype(np.int64) * (np.int64(cols.max()) + 1) + cols
+    _, first = np.unique(keys, return_index=True)
+    rows, cols, scores = rows[first], cols[first], scores[first]
+
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    starts = np.searchsorted(rows, rows, side="left")
+    keep = np.arange(rows.size) - starts < top_k
+    return rows[keep], cols[keep], scores[keep]
+
+
+class LSHIndex:
+    """Random-hyperplane LSH index with exact re-ranking of candidates."""
+
+    def __init__(
+        self,
+        num_tables: int = DEFAULT_NUM_TABLES,
+        num_bits: Optional[int] = None,
+        seed: int = 0,
+    ) -> None:
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.seed = seed
+        self.ids: List[str] = []
+        self.vectors: sparse.csr_matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.planes: Optional[np.ndarray] = None
+        self.codes = np.empty((0, num_tables), dtype=np.int64)
+        self._orders: List[np.ndarray] = []
+        self._sorted_codes: List[np.ndarray] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, product_id: object) -> bool:
+        return str(product_id) in self._positions
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    def _planes(self) -> np.ndarray:
+        """The hyperplanes, regenerated from ``seed`` on first use.
+
+        A loaded index only needs them to hash new products or external
+        vectors; queries for indexed products use the stored ``codes``.
+        """
+
+        if self.planes is None:
+            assert self.num_bits is not None
+            self.planes = _random_planes(self.vectors.shape[1], self.num_tables * self.num_bits, self.seed)
+            sample = self.vectors[:CHECK_ROWS]
+            if not np.array_equal(self._hash(sample), self.codes[:CHECK_ROWS]):
+                # A numpy release with a different random stream: re-hash, so
+                # that the stored codes and new products use the same planes.
+                logger.warning("LSH planes do not reproduce the stored codes; re-hashing %s products", len(self.ids))
+                self.codes = self._hash(self.vectors)
+                self._rebuild_tables()
+        return self.planes
+
+    def _hash(self, vectors: sparse.csr_matrix) -> np.ndarray:
+        assert self.num_bits is not None
+        projected = np.asarray(vectors @ self._planes())
+        bits = (projected > 0).reshape(vectors.shape[0], self.num_tables, self.num_bits)
+        weights = np.left_shift(np.int64(1), np.arange(self.num_bits, dtype=np.int64))
+        return bits.astype(np.int64) @ weights
+
+    def _rebuild_tables(self) -> None:
+        self._orders = []
+        self._sorted_codes = []
+        for table in range(self.num_tables):
+            order = np.argsort(self.codes[:, table], kind="stable")
+            self._orders.append(order)
+            self._sorted_codes.append(self.codes[order, table])
+        self._positions = {product_id: idx for idx, product_id in enumerate(self.ids)}
+
+    def fit(self, vectors: sparse.spmatrix, ids: Sequence[object]) -> "LSHIndex":
+        if vectors.shape[0] != len(ids):
+            raise ValueError("Number of vectors and ids must match")
+
+        self.vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        self.ids = [str(product_id) for product_id in ids]
+        if self.num_bits is None:
+            self.num_bits = _auto_bits(len(self.ids))
+        self.planes = _random_planes(
+            self.vectors.shape[1], self.num_tables * self.num_bits, self.seed
+        )
+        self.codes = self._hash(self.vectors)
+        self._rebuild_tables()
+        logger.info(
+            "Built LSH index for %s products with %s tables of %s bits",
+            len(self.ids),
+            self.num_tables,
+            self.num_bits,
+        )
+        return self
+
+    def add(self, vectors: sparse.spmatrix, ids: Sequence[object]) -> None:
+        """Append (or replace) products without re-hashing the existing ones."""
+
+        if self.num_bits is None or not self.vectors.shape[1]:
+            raise RuntimeError("The index must be fitted before products can be added")
+        if vectors.shape[0] != len(ids):
+            raise ValueError("Number of vectors and ids must match")
+
+        vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        if vectors.shape[1] != self.vectors.shape[1]:
+            raise ValueError("New vectors do not match the dimensionality of the index")
+
+        codes = self._hash(vectors)
+        new_ids = [str(product_id) for product_id in ids]
+        existing = [self._positions.get(product_id) for product_id in new_ids]
+
+        replaced = [(pos, row) for row, pos in enumerate(existing) if pos is not None]
+        appended = [row for row, pos in enumerate(existing) if pos is None]
+
+        if replaced:
+            lil = self.vectors.tolil()
+            for pos, row in replaced:
+                lil[pos] = vectors[row]
+                self.codes[pos] = codes[row]
+            self.vectors = lil.tocsr()
+        if appended:
+            self.vectors = sparse.vstack([self.vectors, vectors[appended]], format="csr")
+            self.codes = np.vstack([self.codes, codes[appended]])
+            self.ids.extend(new_ids[row] for row in appended)
+
+        self._rebuild_tables()
+        logger.info(
+            "Added %s and updated %s products in the LSH index", len(appended), len(replaced)
+        )
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def _candidates(self, codes: np.ndarray) -> np.ndarray:
+        """Return positions sharing a bucket with ``codes`` (one per table).
+
+        Besides the exact bucket, every bucket at Hamming distance one is
+        probed as well, which lifts recall without adding tables.
+        """
+
+        assert self.num_bits is not None
+        flips = np.left_shift(np.int64(1), np.arange(self.num_bits, dtype=np.int64))
+        found: List[np.ndarray] = []
+        for table, code in enumerate(codes):
+            probes = np.concatenate([[code], np.bitwise_xor(code, flips)])
+            sorted_codes = self._sorted_codes[table]
+            lo = np.searchsorted(sorted_codes, probes, side="left")
+            hi = np.searchsorted(sorted_codes, probes, side="right")
+            for start, end in zip(lo, hi):
+                if end > start:
+                    found.append(self._orders[table][start:end])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def query_vector(
+        self,
+        vector: sparse.spmatrix,
+        top_k: int,
+        exclude: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        vector = sparse.csr_matrix(vector, dtype=np.float32)
+        return self._rank(self._candidates(self._hash(vector)[0]), vector, top_k, exclude)
+
+    def _rank(
+        self,
+        candidates: np.ndarray,
+        vector: sparse.csr_matrix,
+        top_k: int,
+        exclude: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-rank ``candidates`` by exact cosine similarity with ``vector``."""
+
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = np.asarray((self.vectors[candidates] @ vector.T).todense()).ravel()
+        keep = scores > 0
+        candidates, scores = candidates[keep], scores[keep]
+        if scores.size > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[best], scores[best]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
+
+    def query_id(self, product_id: object, top_k: int) -> List[Dict[str, float]]:
+        """Return the approximate ``top_k`` neighbours of an indexed product."""
+
+        position = self._positions.get(str(product_id))
+        if position is None:
+            return []
+        # The stored codes of the product, so no planes are needed to serve it.
+        candidates = self._candidates(self.codes[position])
+        positions, scores = self._rank(candidates, self.vectors[position], top_k, exclude=position)
+        return [
+            {"product_id": self.ids[pos], "score": float(score)}
+            for pos, score in zip(positions, scores)
+        ]
+
+    def all_neighbors(self, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Compute approximate neighbours for every indexed product at once.
+
+        Instead of querying products one by one, the similarities inside each
+        bucket are computed with a single sparse product per bucket, so the
+        cost grows with ``n * bucket_size`` rather than ``n ** 2``.
+        """
+
+        n_items = len(self.ids)
+        rows: List[np.ndarray] = []
+        cols: List[np.ndarray] = []
+        scores: List[np.ndarray] = []
+
+        for table in range(self.num_tables):
+            order = self._orders[table]
+            sorted_codes = self._sorted_codes[table]
+            boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+            starts = np.concatenate([[0], boundaries])
+            ends = np.concatenate([boundaries, [n_items]])
+
+            for start, end in zip(starts, ends):
+                if end - start < 2:
+                    continue
+                members = order[start:end]
+                member_vectors = self.vectors[members]
+                for block_start in range(0, members.size, MAX_BUCKET_BLOCK):
+                    block_vectors = member_vectors[block_start:block_start + MAX_BUCKET_BLOCK]
+                    similarity = (block_vectors @ member_vectors.T).tocoo()
+                    row_ids = members[block_start + similarity.row]
+                    col_ids = members[similarity.col]
+                    keep = (row_ids != col_ids) & (similarity.data > 0)
+                    # Prune every block right away so that memory stays
+                    # bounded by ``n * num_tables * top_k`` even for the
+                    # oversized buckets produced by duplicate products.
+                    block_rows, block_cols, block_scores = _prune_pairs(
+                        row_ids[keep], col_ids[keep], similarity.data[keep], top_k
+                    )
+                    rows.append(block_rows)
+                    cols.append(block_cols)
+                    scores.append(block_scores)
+
+        if rows:
+            all_rows, all_cols, all_scores = _prune_pairs(
+                np.concatenate(rows), np.concatenate(cols), np.concatenate(scores), top_k
+            )
+        else:
+            all_rows = all_cols = np.empty(0, dtype=np.int64)
+            all_scores = np.empty(0, dtype=np.float32)
+
+        bounds = np.searchsorted(all_rows, np.arange(n_items + 1))
+        return [
+            (all_cols[bounds[idx]:bounds[idx + 1]], all_scores[bounds[idx]:bounds[idx + 1]])
+            for idx in range(n_items)
+        ]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        """Persist the index atomically as an uncompressed ``.npz`` archive.
+
+        The dense ``n_features x n_tables * n_bits`` planes are not stored;
+        a loaded index regenerates them from ``seed`` when it first needs them.
+        """
+
+        if self.num_bits is None or not self.vectors.shape[1]:
+            raise RuntimeError("Cannot save an index that has not been fitted")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("wb") as handle:
+            np.savez(
+                handle,
+                ids=np.asarray(self.ids, dtype=str),
+                codes=self.codes,
+                vectors_data=self.vectors.data,
+                vectors_indices=self.vectors.indices,
+                vectors_indptr=self.vectors.indptr,
+                vectors_shape=np.asarray(self.vectors.shape),
+                params=np.asarray([self.num_tables, self.num_bits, self.seed]),
+            )
+            handle.flush()
+            os.fsync(handle.fileno())
+        tmp_path.replace(path)
+        logger.info("Saved LSH index with %s products to %s", len(self.ids), path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LSHIndex":
+        with np.load(path, allow_pickle=False) as archive:
+            num_tables, num_bits, seed = (int(value) for value in archive["params"])
+            index = cls(num_tables=num_tables, num_bits=num_bits, seed=seed)
+            index.ids = [str(product_id) for product_id in archive["ids"]]
+            index.codes = archive["codes"]
+            index.vectors = sparse.csr_matrix(
+                (archive["vectors_data"], archive["vectors_indices"], archive["vectors_indptr"]),
+                shape=tuple(archive["vectors_shape"]),
+            )
+        index._rebuild_tables()
+        return index
+
+
+def recall_at_k(
+    exact: Iterable[Sequence[int]],
+    approximate: Iterable[Sequence[int]],
+    k: int,
+) -> float:
+    """Average fraction of the exact top-``k`` recovered by the approximate lists."""
+
+    total = 0.0
+    rows = 0
+    for exact_row, approx_row in zip(exact, approximate):
+        expected = set(list(exact_row)[:k])
+        if not expected:
+            continue
+        total += len(expected & set(list(approx_row)[:k])) / len(expected)
+        rows += 1
+    return total / rows if rows else 1.0
@@ -1,22 +1,48 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
+import os
+import time
+from contextlib import asynccontextmanager
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
-
-from fastapi import Depends, FastAPI, HTTPException, Query
-
-from catalog_loader import CatalogLoaderError, load_catalog
-from models import CatalogResponse, ServiceSettings
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse
+
+from ann_index import LSHIndex
+from artifact_store import ArtifactStore
+from artifacts import RankedLists, load_artifact, resolve_existing
+from catalog_columns import ColumnarCatalog
+from catalog_loader import CatalogCache, CatalogLoaderError, CircuitBreaker
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, MetricsMiddleware, read_job_metrics
+from models import (
+    BatchRecommendationsResponse,
+    CatalogResponse,
+    PersonalRequest,
+    PersonalizedBatchRequest,
+    Recommendation,
+    ServiceSettings,
+    SimilarBatchRequest,
+)
+from popularity import PopularRanking, blend_popularity
+from profiling import StackSampler
+from registry import ModelRegistry
+from response_cache import ResponseCache, encode_json
+from scoring import NO_FILTER, ItemFilter, PersonalScorer
+from shared_artifacts import SharedArtifactCache
+from session import score_session, session_weights
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="ML Service", version="1.0.0")
+# List length used when an unbounded list is requested from the ANN index or the scorer.
+DEFAULT_TOP_K = 50
 
-_recommendations_cache: Dict[str, object] = {"mtime": None, "data": {}}
+FILTERS_UNAVAILABLE = "Filtered recommendations are unavailable until the factor model and the catalog are loaded"
 
 
 @lru_cache
@@ -24,109 +50,256 @@ def get_settings() -> ServiceSettings:
     return ServiceSettings()
 
 
+NEIGHBOURS = "neighbours"
+RECOMMENDATIONS = "recommendations"
+POPULARITY = "popularity"
+POPULAR = "popular"
+ANN_INDEX = "ann_index"
+FACTORS = "factors"
+CATALOG = "catalog"
+SCORER = "scorer"
+
+
 @lru_cache
-def get_neighbors_map() -> Dict[str, List[Dict[str, float]]]:
+def get_registry() -> ModelRegistry:
     settings = get_settings()
-    path = Path(settings.fallback_neighbors_path)
-    if not path.exists():
-        logger.warning("Neighbour file %s not found; returning empty mapping", path)
-        return {}
+    return ModelRegistry(Path(settings.model_registry_dir), keep_versions=settings.registry_keep_versions)
+
+
+def _locate_model(path: Path) -> Optional[Path]:
+    # Versions published by trainer.py win over files written by a manual train_model.py run.
+    return get_registry().locate(path.name) or resolve_existing(path)
+
+
+@lru_cache
+def get_artifact_store() -> ArtifactStore:
+    """Create the store that hot-reloads every artifact served by the API."""
 
-    try:
-        with path.open("r", encoding="utf-8") as fp:
-            payload = json.load(fp)
-    except (OSError, json.JSONDecodeError) as exc:
-        logger.error("Failed to load neighbours from %s: %s", path, exc)
-        return {}
-
-    neighbours: Dict[str, List[Dict[str, float]]] = {}
-    if isinstance(payload, dict):
-        for key, value in payload.items():
-            if not isinstance(value, list):
-                continue
-            cleaned: List[Dict[str, float]] = []
-            for item in value:
-                if not isinstance(item, dict):
-                    continue
-                neighbour_id = item.get("product_id")
-                score = item.get("score")
-                if neighbour_id is None or score is None:
-                    continue
-                try:
-                    cleaned.append({"product_id": str(neighbour_id), "score": float(score)})
-                except (TypeError, ValueError):
-                    continue
-            neighbours[str(key)] = cleaned
-
-    logger.info("Loaded neighbours for %s products", len(neighbours))
-    return neighbours
-
-
-def _load_recommendations() -> Dict[str, List[Dict[str, float]]]:
     settings = get_settings()
-    path = Path(settings.recommendations_output_path)
+    store = ArtifactStore(
+        interval=settings.artifact_reload_interval,
+        shared=SharedArtifactCache(Path(settings.shared_artifacts_dir)) if settings.shared_artifacts_dir else None,
+    )
+    store.register(
+        NEIGHBOURS,
+        lambda: resolve_existing(Path(settings.fallback_neighbors_path)),
+        load_artifact,
+        RankedLists.empty,
+    )
+    store.register(
+        RECOMMENDATIONS,
+        lambda: _locate_model(Path(settings.recommendations_output_path)),
+        load_artifact,
+        RankedLists.empty,
+    )
+    store.register(
+        POPULARITY,
+        lambda: _locate_model(Path(settings.popularity_path)),
+        load_artifact,
+        RankedLists.empty,
+    )
+    store.derive(
+        POPULAR,
+        [NEIGHBOURS, POPULARITY],
+        lambda neighbours, popularity: blend_popularity(
+            neighbours, popularity, settings.popularity_weight
+        ),
+        PopularRanking.empty,
+        shared_as=PopularRanking,
+        params=(settings.popularity_weight,),
+    )
+    if settings.neighbors_backend == "lsh":
+        store.register(ANN_INDEX, lambda: Path(settings.ann_index_path), LSHIndex.load, lambda: None)
+    if settings.on_demand_scoring:
+        # Only the paths are published: the scorer is built from the files by
+        # one worker and memory-mapped by the others. The catalog snapshot is
+        # kept up to date by the batch jobs and GET /catalog.
+        store.register(FACTORS, lambda: _locate_model(Path(settings.factor_model_path)), Path, lambda: None)
+        store.register(CATALOG, lambda: Path(settings.catalog_snapshot_path), Path, lambda: None)
+        store.derive(
+            SCORER,
+            [FACTORS, CATALOG],
+            PersonalScorer.from_files,
+            lambda: None,
+            shared_as=PersonalScorer,
+            params=(PersonalScorer.FORMAT,),
+        )
+    return store
 
-    try:
-        mtime = path.stat().st_mtime
-    except OSError:
-        return {}
 
-    cache_mtime = _recommendations_cache.get("mtime")
-    if cache_mtime == mtime:
-        cached = _recommendations_cache.get("data")
-        if isinstance(cached, dict):
-            return cached  # type: ignore[return-value]
+@lru_cache
+def get_response_cache() -> ResponseCache:
+    cache = ResponseCache(get_settings().response_cache_size)
+    # Keys carry artifact versions, so old entries could never be hit again;
+    # dropping them on every publish keeps them from occupying the cache.
+    get_artifact_store().add_listener(lambda _state: cache.invalidate())
+    return cache
 
-    try:
-        with path.open("r", encoding="utf-8") as fp:
-            payload = json.load(fp)
-    except (OSError, json.JSONDecodeError) as exc:
-        logger.error("Failed to load personalized recommendations: %s", exc)
-        return {}
-
-    users_obj = payload.get("users") if isinstance(payload, dict) else None
-    recommendations: Dict[str, List[Dict[str, float]]] = {}
-    if isinstance(users_obj, dict):
-        for key, value in users_obj.items():
-            if not isinstance(value, list):
-                continue
-            cleaned: List[Dict[str, float]] = []
-            for item in value:
-                if not isinstance(item, dict):
-                    continue
-                product_id = item.get("product_id") or item.get("productId")
-                score = item.get("score")
-                if product_id is None or score is None:
-                    continue
-                try:
-                    cleaned.append({"product_id": str(product_id), "score": float(score)})
-                except (TypeError, ValueError):
-                    continue
-            if cleaned:
-                recommendations[str(key)] = cleaned
-
-    _recommendations_cache["mtime"] = mtime
-    _recommendations_cache["data"] = recommendations
-    logger.info("Loaded personalized recommendations for %s users", len(recommendations))
-    return recommendations
-
-
-def _build_fallback(neighbours: Dict[str, List[Dict[str, float]]], limit: int) -> List[Dict[str, float]]:
-    scores: Dict[str, float] = {}
-    for items in neighbours.values():
-        for item in items:
-            product_id = str(item.get("product_id"))
-            if not product_id:
-                continue
+
+@lru_cache
+def get_stack_sampler() -> Optional[StackSampler]:
+    settings = get_settings()
+    return StackSampler.from_settings(
+        settings.profile_routes, settings.profile_sample_rate, settings.profile_interval_ms
+    )
+
+
+@lru_cache
+def get_catalog_cache() -> CatalogCache:
+    settings = get_settings()
+    breaker = CircuitBreaker(settings.catalog_breaker_failures, settings.catalog_breaker_reset_seconds)
+    return CatalogCache(settings, ttl=settings.catalog_ttl_seconds, breaker=breaker, render=_render_catalog)
+
+
+def _render_catalog(catalog: ColumnarCatalog) -> bytes:
+    # Serialised once per catalog version in the refresh thread, not per call on the event loop.
+    response = CatalogResponse(
+        products=catalog.to_products(),
+        total_products=len(catalog),
+        source=catalog.source or "unknown",
+    )
+    return encode_json(jsonable_encoder(response))
+
+
+def get_neighbors() -> RankedLists:
+    return get_artifact_store().get(NEIGHBOURS)
+
+
+def get_recommendations() -> RankedLists:
+    return get_artifact_store().get(RECOMMENDATIONS)
+
+
+def get_popular() -> PopularRanking:
+    return get_artifact_store().get(POPULAR)
+
+
+def get_ann_index() -> Optional[LSHIndex]:
+    store = get_artifact_store()
+    if ANN_INDEX not in store.snapshot():
+        return None
+    return store.get(ANN_INDEX)
+
+
+def get_scorer() -> Optional[PersonalScorer]:
+    store = get_artifact_store()
+    if SCORER not in store.snapshot():
+        return None
+    return store.get(SCORER)
+
+
+def _json(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+def _artifact_metrics() -> List[Any]:
+    labels = ("artifact",)
+    version = Gauge("ml_artifact_version", "Version of a served artifact; bumped on every reload.", labels)
+    entries = Gauge("ml_artifact_entries", "Keys (products or users) in a served artifact.", labels)
+    size = Gauge("ml_artifact_bytes", "Size of the file a served artifact was loaded from.", labels)
+    load = Gauge("ml_artifact_load_seconds", "Time the last load of an artifact took.", labels)
+    loaded = Gauge("ml_artifact_loaded_timestamp_seconds", "Unix time an artifact was last loaded.", labels)
+    failed = Gauge("ml_artifact_load_failed", "1 if the last load of an artifact failed, else 0.", labels)
+    for name, state in get_artifact_store().snapshot().items():
+        key = (name,)
+        version.set(state.version, key)
+        failed.set(1 if state.error else 0, key)
+        if hasattr(state.value, "__len__"):
+            entries.set(len(state.value), key)
+        if state.load_seconds is not None:
+            load.set(state.load_seconds, key)
+        if state.loaded_at is not None:
+            loaded.set(state.loaded_at, key)
+        if state.path:
             try:
-                score = float(item.get("score", 0.0))
-            except (TypeError, ValueError):
-                score = 0.0
-            if product_id not in scores or score > scores[product_id]:
-                scores[product_id] = score
+                size.set(os.stat(state.path).st_size, key)
+            except OSError:
+                pass
+    model = Gauge("ml_model_info", "Model version published in the registry and served.", ("version",))
+    model.set(1, (get_registry().current_version() or "unversioned",))
+    return [version, entries, size, load, loaded, failed, model]
+
+
+def _cache_metrics() -> List[Any]:
+    stats = get_response_cache().stats()
+    metrics: List[Any] = []
+    for field in ("hits", "misses", "evictions", "invalidations"):
+        counter = Counter(f"ml_response_cache_{field}_total", f"Response cache {field}.")
+        counter.inc(stats[field])
+        metrics.append(counter)
+    for field, documentation in (
+        ("entries", "Responses held by the response cache."),
+        ("bytes", "Bytes of the responses held by the response cache."),
+        ("max_entries", "Capacity of the response cache."),
+    ):
+        gauge = Gauge(f"ml_response_cache_{field}", documentation)
+        gauge.set(stats[field])
+        metrics.append(gauge)
+    return metrics
+
+
+def _catalog_metrics() -> List[Any]:
+    stats = get_catalog_cache().stats()
+    requests = Counter(
+        "ml_catalog_cache_requests_total",
+        "GET /catalog calls by how they were answered: fresh or stale copy, joined an in-flight "
+        "refresh, or rejected by the open circuit breaker.",
+        ("result",),
+    )
+    for result in ("fresh", "stale", "coalesced", "rejected"):
+        requests.inc(stats[result], (result,))
+    refreshes = Counter("ml_catalog_refreshes_total", "Completed catalog refreshes, by outcome.", ("outcome",))
+    refreshes.inc(stats["refreshed"], ("ok",))
+    refreshes.inc(stats["failures"], ("error",))
+    breaker = Gauge(
+        "ml_catalog_breaker_state", "State of the catalog API circuit breaker (1 for the current one).", ("state",)
+    )
+    for state in ("closed", "open", "half_open"):
+        breaker.set(float(stats["breaker"] == state), (state,))
+    return [requests, refreshes, breaker]
+
+
+def _profiler_metrics() -> List[Any]:
+    sampler = get_stack_sampler()
+    if sampler is None:
+        return []
+    profiled = Counter("ml_profiled_requests_total", "Requests profiled by the stack sampler.", ("path",))
+    for path, count in sampler.stats().items():
+        profiled.inc(count, (path,))
+    return [profiled]
+
+
+REGISTRY.add_collector(_artifact_metrics)
+REGISTRY.add_collector(_cache_metrics)
+REGISTRY.add_collector(_catalog_metrics)
+REGISTRY.add_collector(_profiler_metrics)
+
+
+# The hot single-id endpoints below read the process-wide store and response
+# cache directly: resolving them as sync dependencies costs a thread-pool
+# round trip per request, more than a cache hit itself.
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    start = time.perf_counter()
+    store = get_artifact_store()
+    # The initial load runs in a worker thread as well, so the event loop is
+    # never blocked by artifact I/O. Models are never trained in-process.
+    await asyncio.to_thread(store.refresh)
+    store.start()
+    logger.info(
+        "Serving model version %s; artifacts loaded in %.3f seconds",
+        get_registry().current_version() or "unversioned",
+        time.perf_counter() - start,
+    )
+    try:
+        yield
+    finally:
+        store.stop()
 
-    ranked = sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
-    return [{"product_id": product_id, "score": score} for product_id, score in ranked[:limit]]
+
+app = FastAPI(title="ML Service", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, sampler=get_stack_sampler)
 
 
 @app.get("/health")
@@ -136,58 +309,321 @@ async def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/artifacts")
+async def artifacts_status(store: ArtifactStore = Depends(get_artifact_store)) -> Dict[str, Dict[str, Any]]:
+    """Report the version, source file and load duration of every served artifact."""
+
+    return {name: state.describe() for name, state in store.snapshot().items()}
+
+
+@app.get("/cache")
+async def cache_status(cache: ResponseCache = Depends(get_response_cache)) -> Dict[str, Any]:
+    """Report size and hit, miss, eviction and invalidation counters of the response cache."""
+
+    return cache.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint(settings: ServiceSettings = Depends(get_settings)) -> Response:
+    """Expose the metrics of this process and of the batch jobs in the Prometheus text format."""
+
+    body = REGISTRY.render() + read_job_metrics(Path(settings.job_metrics_dir))
+    return Response(content=body, media_type=CONTENT_TYPE)
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse, include_in_schema=False)
+async def profile_endpoint(reset: bool = Query(default=False)) -> str:
+    """Return the stacks sampled from profiled requests in collapsed (flame graph) format."""
+
+    sampler = get_stack_sampler()
+    if sampler is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set PROFILE_ROUTES to enable it")
+    return sampler.collapsed(reset=reset)
+
+
 @app.get("/catalog", response_model=CatalogResponse)
-async def catalog_endpoint(settings: ServiceSettings = Depends(get_settings)) -> CatalogResponse:
-    """Expose the loaded catalog via HTTP for troubleshooting and integrations."""
+async def catalog_endpoint(cache: CatalogCache = Depends(get_catalog_cache)) -> Response:
+    """Expose the catalog snapshot via HTTP for troubleshooting and integrations."""
 
     try:
-        catalog = load_catalog(settings=settings)
+        body = await cache.get()
     except CatalogLoaderError as exc:
         logger.error("Catalog loading failed: %s", exc)
         raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return _json(body)
 
-    return CatalogResponse(
-        products=catalog.products,
-        total_products=len(catalog.products),
-        source=catalog.source or "unknown",
-    )
 
+def _similar_items(
+    product_id: str,
+    limit: Optional[int],
+    neighbours: RankedLists,
+    index: Optional[LSHIndex],
+) -> List[Dict[str, float]]:
+    candidates = neighbours.get(product_id, limit)
+    if not candidates and index is not None:
+        # Products added after the last full rebuild are only known to the ANN index.
+        return index.query_id(product_id, limit or DEFAULT_TOP_K)
+    return candidates
+
+
+def _item_filter(
+    categories: List[str],
+    brands: List[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    in_stock: bool,
+) -> ItemFilter:
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=422, detail="min_price must not exceed max_price")
+    return ItemFilter(tuple(sorted(set(categories))), min_price, max_price, in_stock, tuple(sorted(set(brands))))
+
+
+def _user_items(
+    user_id: str,
+    limit: Optional[int],
+    recommendations: RankedLists,
+    scorer: Optional[PersonalScorer],
+    item_filter: ItemFilter = NO_FILTER,
+) -> List[Dict[str, float]]:
+    """Return the recommendations of a user known to the model, or an empty list.
+
+    Precomputed lists only cover the hottest users and a fixed length; other
+    users, longer lists and filtered requests are scored on demand.
+    """
+
+    if scorer is None and item_filter:
+        raise HTTPException(status_code=503, detail=FILTERS_UNAVAILABLE)
+    items = [] if item_filter else recommendations.get(user_id, limit)
+    if scorer is None or (items and (limit is None or len(items) >= limit)):
+        return items
+    scored = scorer.recommend(user_id, limit or DEFAULT_TOP_K, item_filter)
+    return items if scored is None else scored
+
+
+def _personalized_items(
+    user_id: str,
+    limit: int,
+    recommendations: RankedLists,
+    popular: PopularRanking,
+    scorer: Optional[PersonalScorer] = None,
+    item_filter: ItemFilter = NO_FILTER,
+) -> List[Dict[str, float]]:
+    items = _user_items(user_id, limit, recommendations, scorer, item_filter)
+    if items:
+        return items
+
+    fallback = scorer.filter_popular(popular, limit, item_filter) if scorer is not None else popular.top(limit)
+    if fallback:
+        logger.info("Fallback recommendations returned for user %s", user_id)
+    return fallback
+
+
+def _merge_candidates(
+    lists: List[List[Dict[str, float]]],
+    limit: int,
+    exclude: Set[str],
+    aggregate: str,
+) -> List[Dict[str, float]]:
+    """Merge several ranked lists into one, deduplicating products.
+
+    A product's merged score is the maximum (or the sum) of its scores in the
+    individual lists; products listed in ``exclude`` are dropped.
+    """
+
+    scores: Dict[str, float] = {}
+    for items in lists:
+        for item in items:
+            product_id = item["product_id"]
+            if product_id in exclude:
+                continue
+            previous = scores.get(product_id)
+            if previous is None:
+                scores[product_id] = item["score"]
+            elif aggregate == "sum":
+                scores[product_id] = previous + item["score"]
+            elif item["score"] > previous:
+                scores[product_id] = item["score"]
+
+    ranked = sorted(scores.items(), key=lambda entry: entry[1], reverse=True)[:limit]
+    return [{"product_id": product_id, "score": round(score, 6)} for product_id, score in ranked]
 
-@app.get("/recs/similar")
+
+def _check_batch_size(size: int, settings: ServiceSettings) -> None:
+    if size > settings.batch_max_ids:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.batch_max_ids} ids can be requested in one batch",
+        )
+
+
+@app.get("/recs/similar", response_model=List[Recommendation])
 async def similar_recommendations(
     product_id: str | None = Query(default=None),
     limit: int = Query(default=20, ge=1),
-    neighbours: Dict[str, List[Dict[str, float]]] = Depends(get_neighbors_map),
-) -> List[Dict[str, float]]:
+) -> Response:
     """Return similar products ranked by cosine similarity."""
 
     if not product_id:
-        return []
+        return _json(b"[]")
+
+    # States are read from one snapshot, so the key's versions always match
+    # the artifacts the response is built from.
+    states = get_artifact_store().snapshot()
+    neighbours = states[NEIGHBOURS]
+    index = states.get(ANN_INDEX)
+    key = ("similar", product_id, limit, neighbours.version, index.version if index else None)
+    return _json(
+        get_response_cache().fetch(key, lambda: _similar_items(product_id, limit, neighbours.value, index.value if index else None))
+    )
 
-    candidates = neighbours.get(str(product_id), [])
-    if not candidates:
-        return []
 
-    return candidates[:limit]
+@app.post("/recs/similar/batch", response_model=BatchRecommendationsResponse)
+async def similar_recommendations_batch(
+    request: SimilarBatchRequest,
+    settings: ServiceSettings = Depends(get_settings),
+    neighbours: RankedLists = Depends(get_neighbors),
+    index: Optional[LSHIndex] = Depends(get_ann_index),
+) -> Dict[str, Any]:
+    """Return similar products for many products in one call.
 
+    With ``merge`` the per-product lists are combined into a single
+    deduplicated ``items`` list, e.g. "similar to everything in the cart";
+    ``exclude_input`` drops the requested products themselves from it.
+    """
 
-@app.get("/recs/personalized")
-async def personalized_recommendations(
-    user_id: str | None = Query(default=None),
+    product_ids = list(dict.fromkeys(str(product_id) for product_id in request.product_ids))
+    _check_batch_size(len(product_ids), settings)
+
+    if not request.merge:
+        return {
+            "results": {
+                product_id: _similar_items(product_id, request.limit, neighbours, index)
+                for product_id in product_ids
+            }
+        }
+
+    lists = [_similar_items(product_id, None, neighbours, index) for product_id in product_ids]
+    exclude = set(product_ids) if request.exclude_input else set()
+    return {"items": _merge_candidates(lists, request.limit, exclude, request.aggregate)}
+
+
+@app.get("/recs/popular", response_model=List[Recommendation])
+async def popular_recommendations(
     limit: int = Query(default=20, ge=1),
-    neighbours: Dict[str, List[Dict[str, float]]] = Depends(get_neighbors_map),
+    popular: PopularRanking = Depends(get_popular),
 ) -> List[Dict[str, float]]:
-    """Return personalized recommendations for a specific user."""
+    """Return the most popular products (ratings blended with content similarity)."""
+
+    return popular.top(limit)
+
 
+@app.get("/recs/personalized", response_model=List[Recommendation])
+async def personalized_recommendations(
+    user_id: str | None = Query(default=None),
+    limit: int = Query(default=20, ge=1),
+    category: List[str] = Query(default=[]),
+    brand: List[str] = Query(default=[]),
+    min_price: float | None = Query(default=None, ge=0),
+    max_price: float | None = Query(default=None, ge=0),
+    in_stock: bool = Query(default=False),
+) -> Response:
+    """Return personalized recommendations for a specific user.
+
+    ``category`` and ``brand`` (repeatable, matching any), the price range
+    and ``in_stock`` restrict the ranked products.
+    """
+
+    item_filter = _item_filter(category, brand, min_price, max_price, in_stock)
     if not user_id:
-        return []
+        return _json(b"[]")
+
+    states = get_artifact_store().snapshot()
+    recommendations = states[RECOMMENDATIONS]
+    popular = states[POPULAR]
+    scorer = states.get(SCORER)
+    key = (
+        "personalized",
+        user_id,
+        limit,
+        item_filter,
+        recommendations.version,
+        popular.version,
+        scorer.version if scorer else None,
+    )
+    return _json(
+        get_response_cache().fetch(
+            key,
+            lambda: _personalized_items(
+                user_id, limit, recommendations.value, popular.value, scorer.value if scorer else None, item_filter
+            ),
+        )
+    )
 
-    recommendations = _load_recommendations()
-    items = recommendations.get(str(user_id))
-    if items:
-        return items[:limit]
 
-    fallback = _build_fallback(neighbours, limit)
-    if fallback:
-        logger.info("Fallback recommendations returned for user %s", user_id)
-    return fallback
+@app.post("/recs/personal", response_model=List[Recommendation])
+async def personal_recommendations(
+    request: PersonalRequest,
+    limit: int = Query(default=20, ge=1),
+    settings: ServiceSettings = Depends(get_settings),
+    neighbours: RankedLists = Depends(get_neighbors),
+    recommendations: RankedLists = Depends(get_recommendations),
+    popular: PopularRanking = Depends(get_popular),
+    index: Optional[LSHIndex] = Depends(get_ann_index),
+    scorer: Optional[PersonalScorer] = Depends(get_scorer),
+) -> List[Dict[str, float]]:
+    """Score recommendations on the fly from the current session.
+
+    Neighbour lists of the viewed, carted and rated products are aggregated
+    and blended with the user's precomputed recommendations, so activity is
+    reflected without waiting for the next training run. The gateway's
+    ``categories``, ``brands`` and ``priceRange`` restrict every part of the
+    list.
+    """
+
+    price_range = request.price_range or (None, None)
+    item_filter = _item_filter(request.categories, request.brands, *price_range, in_stock=False)
+    if item_filter and scorer is None:
+        raise HTTPException(status_code=503, detail=FILTERS_UNAVAILABLE)
+    weights = session_weights(
+        request.viewed,
+        request.carted,
+        {item.product_id: item.rating for item in request.rated},
+    )
+    personal = (
+        _user_items(request.user_id, None, recommendations, scorer, item_filter) if request.user_id else []
+    )
+    items = score_session(weights, neighbours, personal, limit, settings.session_weight, index)
+    if item_filter:
+        items = scorer.filter_items(items, item_filter)
+    if len(items) >= limit:
+        return items
+
+    # Short or empty lists are topped up with popular products.
+    seen = set(weights).union(item["product_id"] for item in items)
+    if item_filter:
+        candidates = scorer.filter_popular(popular, limit + len(seen), item_filter)
+    else:
+        candidates = popular.top(limit + len(seen))
+    fallback = [item for item in candidates if item["product_id"] not in seen]
+    return items + fallback[: limit - len(items)]
+
+
+@app.post("/recs/personalized/batch", response_model=BatchRecommendationsResponse)
+async def personalized_recommendations_batch(
+    request: PersonalizedBatchRequest,
+    settings: ServiceSettings = Depends(get_settings),
+    recommendations: RankedLists = Depends(get_recommendations),
+    popular: PopularRanking = Depends(get_popular),
+    scorer: Optional[PersonalScorer] = Depends(get_scorer),
+) -> Dict[str, Any]:
+    """Return personalized recommendations for many users in one call."""
+
+    user_ids = list(dict.fromkeys(str(user_id) for user_id in request.user_ids))
+    _check_batch_size(len(user_ids), settings)
+
+    return {
+        "results": {
+            user_id: _personalized_items(user_id, request.limit, recommendations, popular, scorer)
+            for user_id in user_ids
+        }
+    }
@@ -0,0 +1,293 @@
+"""Background hot-reload of serving artifacts.
+
+The :class:`ArtifactStore` watches a set of files, loads new versions in a
+worker thread and publishes them by swapping an immutable snapshot. Request
+handlers only read the current snapshot, so they never touch the filesystem
+and never wait for a reload to finish. With a
+:class:`~shared_artifacts.SharedArtifactCache`, derived artifacts registered
+with ``shared_as`` are built once and memory-mapped by every API worker.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Set, Tuple
+
+from shared_artifacts import SharedArtifactCache
+
+logger = logging.getLogger(__name__)
+
+Signature = Tuple[str, int, int]
+
+
+@dataclass(frozen=True)
+class ArtifactState:
+    """Currently published version of a single artifact."""
+
+    name: str
+    value: Any
+    version: int = 0
+    path: Optional[str] = None
+    signature: Optional[Signature] = None
+    loaded_at: Optional[float] = None
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    def describe(self) -> Dict[str, Any]:
+        size = len(self.value) if hasattr(self.value, "__len__") else None
+        return {
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "size": size,
+            "error": self.error,
+        }
+
+
+@dataclass(frozen=True)
+class _Source:
+    locate: Callable[[], Optional[Path]]
+    load: Callable[[Path], Any]
+    empty: Callable[[], Any]
+
+
+@dataclass(frozen=True)
+class _Derived:
+    inputs: Tuple[str, ...]
+    build: Callable[..., Any]
+    shared_as: Optional[type] = None
+    params: Hashable = ()
+
+
+def _signature(path: Path) -> Optional[Signature]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+class ArtifactStore:
+    """Poll artifact files and atomically publish freshly loaded versions."""
+
+    def __init__(self, interval: float = 5.0, shared: Optional[SharedArtifactCache] = None) -> None:
+        self.interval = interval
+        self.shared = shared
+        self._sources: Dict[str, _Source] = {}
+        self._derived: Dict[str, _Derived] = {}
+        self._states: Dict[str, ArtifactState] = {}
+        self._listeners: list[Callable[[ArtifactState], None]] = []
+        self._refresh_lock = threading.Lock()
+        # Derived artifacts waiting for the end of a refresh pass; ``None``
+        # outside one, when they are rebuilt as soon as an input changes.
+        self._pending: Optional[Set[str]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(
+        self,
+        name: str,
+        locate: Callable[[], Optional[Path]],
+        load: Callable[[Path], Any],
+        empty: Callable[[], Any],
+    ) -> None:
+        """Watch the file returned by ``locate`` and publish ``load(path)``.
+
+        ``empty()`` is served until the first successful load and whenever the
+        file disappears.
+        """
+
+        self._sources[name] = _Source(locate=locate, load=load, empty=empty)
+        self._states = {**self._states, name: ArtifactState(name=name, value=empty())}
+
+    def derive(
+        self,
+        name: str,
+        inputs: Sequence[str],
+        build: Callable[..., Any],
+        empty: Callable[[], Any],
+        shared_as: Optional[type] = None,
+        params: Hashable = (),
+    ) -> None:
+        """Publish ``build(*input_values)`` whenever one of ``inputs`` changes.
+
+        Derived values are computed in the reload thread right after their
+        inputs are published, so expensive precomputation stays off the
+        request path as well. With ``shared_as`` and a shared cache, the
+        value for given input files and ``params`` is built by one process
+        only and published as ``shared_as.from_arrays`` of the mapped file.
+        """
+
+        self._derived[name] = _Derived(inputs=tuple(inputs), build=build, shared_as=shared_as, params=params)
+        self._states = {**self._states, name: ArtifactState(name=name, value=empty())}
+
+    def add_listener(self, listener: Callable[[ArtifactState], None]) -> None:
+        """Call ``listener`` with every newly published state."""
+
+        self._listeners.append(listener)
+
+    # ------------------------------------------------------------------
+    # Reads (request path)
+    # ------------------------------------------------------------------
+    def get(self, name: str) -> Any:
+        return self._states[name].value
+
+    def state(self, name: str) -> ArtifactState:
+        return self._states[name]
+
+    def snapshot(self) -> Dict[str, ArtifactState]:
+        return self._states
+
+    def versions(self) -> Dict[str, int]:
+        return {name: state.version for name, state in self._states.items()}
+
+    # ------------------------------------------------------------------
+    # Reloading (background thread)
+    # ------------------------------------------------------------------
+    def _publish(self, state: ArtifactState, notify: bool = True) -> None:
+        # Dicts are replaced rather than mutated, so readers always see a
+        # consistent snapshot without taking a lock.
+        self._states = {**self._states, state.name: state}
+        if not notify:
+            return
+        for listener in self._listeners:
+            try:
+                listener(state)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Artifact listener failed for %s", state.name)
+        for name, derived in self._derived.items():
+            if state.name in derived.inputs:
+                if self._pending is not None:
+                    self._pending.add(name)
+                else:
+                    self._rebuild(name, derived)
+
+    def _key(self, name: str) -> Optional[Hashable]:
+        """Identify the inputs of ``name`` across processes; ``None`` while one is missing."""
+
+        if name in self._sources:
+            return self._states[name].signature
+        derived = self._derived[name]
+        keys = tuple(self._key(input_name) for input_name in derived.inputs)
+        if any(key is None for key in keys):
+            return None
+        return name, derived.params, keys
+
+    def _build(self, name: str, derived: _Derived) -> Any:
+        values = [self._states[input_name].value for input_name in derived.inputs]
+        key = self._key(name) if derived.shared_as is not None and self.shared is not None else None
+        if key is None:
+            return derived.build(*values)
+        arrays, meta = self.shared.open_or_build(name, key, lambda: derived.build(*values).to_arrays())
+        return derived.shared_as.from_arrays(arrays, meta)
+
+    def _rebuild(self, name: str, derived: _Derived) -> None:
+        current = self._states[name]
+        start = time.perf_counter()
+        try:
+            value = self._build(name, derived)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception("Failed to build derived artifact %s", name)
+            self._publish(replace(current, error=str(exc)), notify=False)
+            return
+        elapsed = time.perf_counter() - start
+        logger.info("Built derived artifact %s version %s in %.3f seconds", name, current.version + 1, elapsed)
+        self._publish(
+            ArtifactState(
+                name=name,
+                value=value,
+                version=current.version + 1,
+                loaded_at=time.time(),
+                load_seconds=elapsed,
+            )
+        )
+
+    def _refresh_one(self, name: str, source: _Source) -> bool:
+        current = self._states[name]
+        try:
+            path = source.locate()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Failed to locate artifact %s: %s", name, exc)
+            return False
+
+        signature = _signature(path) if path is not None else None
+        if signature == current.signature:
+            return False
+
+        if signature is None:
+            if current.signature is None:
+                return False
+            logger.warning("Artifact %s disappeared; serving an empty version", name)
+            self._publish(
+                ArtifactState(name=name, value=source.empty(), version=current.version + 1)
+            )
+            return True
+
+        start = time.perf_counter()
+        try:
+            value = source.load(path)  # type: ignore[arg-type]
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Failed to load artifact %s from %s: %s", name, path, exc)
+            # Keep serving the previous version but do not retry the same file.
+            self._publish(replace(current, signature=signature, error=str(exc)), notify=False)
+            return False
+        elapsed = time.perf_counter() - start
+        logger.info("Loaded artifact %s version %s in %.3f seconds", name, current.version + 1, elapsed)
+
+        self._publish(
+            ArtifactState(
+                name=name,
+                value=value,
+                version=current.version + 1,
+                path=signature[0],
+                signature=signature,
+                loaded_at=time.time(),
+                load_seconds=elapsed,
+            )
+        )
+        return True
+
+    def refresh(self) -> bool:
+        """Reload every artifact whose file changed; returns True if any did."""
+
+        with self._refresh_lock:
+            # Rebuild derived artifacts once, after every source of the pass
+            # is published, instead of once per changed input; the first
+            # pass of a worker would otherwise build from half-loaded inputs.
+            self._pending = pending = set()
+            try:
+                changed = False
+                for name, source in self._sources.items():
+                    changed = self._refresh_one(name, source) or changed
+                while pending:
+                    name = next(name for name in self._derived if name in pending)
+                    pending.discard(name)
+                    self._rebuild(name, self._derived[name])
+            finally:
+                self._pending = None
+            return changed
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Artifact refresh failed")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="artifact-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
@@ -0,0 +1,483 @@
+"""Columnar, memory-mapped storage for ranked recommendation lists.
+
+Both the personalised recommendations (user -> products) and the content
+based neighbours (product -> products) are "ranked lists": for every key an
+ordered list of ``(product_id, score)`` pairs. They are stored as
+
+* ``keys``    - sorted, fixed-width UTF-8 keys (``S<n>``)
+* ``offsets`` - ``int32[len(keys) + 1]``; row ``i`` spans ``offsets[i]:offsets[i + 1]``
+* ``indices`` - ``int32`` positions into ``ids``
+* ``scores``  - ``float32`` scores
+* ``ids``     - fixed-width UTF-8 product id dictionary
+
+The binary file starts with an 8 byte magic, the length of a JSON header
+and the header itself, followed by the 64-byte aligned arrays. Opening the
+file maps it with ``np.memmap`` and does not parse any rows, so loading is
+``O(1)``, pages are shared between processes mapping the same file and
+lookups return array views. :func:`write_arrays` and :func:`map_arrays`
+store any other set of arrays in the same layout. The legacy JSON format
+is still readable and can be produced with :func:`export_json`.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RECART01"
+ALIGNMENT = 64
+ARRAY_NAMES = ("keys", "offsets", "indices", "scores", "ids")
+ARTIFACT_FORMATS = ("binary", "json")
+
+
+class ArtifactError(ValueError):
+    """Raised when an artifact file cannot be read."""
+
+
+def _encode(values: Iterable[str]) -> np.ndarray:
+    encoded = [str(value).encode("utf-8") for value in values]
+    width = max((len(value) for value in encoded), default=1) or 1
+    return np.asarray(encoded, dtype=f"S{width}")
+
+
+class RankedLists:
+    """Read-only view over a ranked-list artifact."""
+
+    def __init__(
+        self,
+        keys: np.ndarray,
+        offsets: np.ndarray,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        ids: np.ndarray,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.keys = keys
+        self.offsets = offsets
+        self.indices = indices
+        self.scores = scores
+        self.ids = ids
+        self.meta: Dict[str, Any] = dict(meta or {})
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def empty(cls, meta: Optional[Dict[str, Any]] = None) -> "RankedLists":
+        return cls.from_rows([], [], [], meta=meta)
+
+    @classmethod
+    def from_rows(
+        cls,
+        keys: Sequence[object],
+        rows: Sequence[Tuple[Sequence[int], Sequence[float]]],
+        ids: Sequence[object],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> "RankedLists":
+        """Build an artifact from per-key ``(indices, scores)`` rows.
+
+        ``indices`` refer to positions in ``ids``. Duplicate keys keep their
+        first row.
+        """
+
+        if len(keys) != len(rows):
+            raise ValueError("Number of keys and rows must match")
+
+        encoded_keys = _encode(keys)
+        unique_keys, first = np.unique(encoded_keys, return_index=True)
+        lengths = np.asarray([len(rows[position][0]) for position in first], dtype=np.int64)
+        offsets = np.zeros(len(unique_keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if offsets[-1] > np.iinfo(np.int32).max:
+            raise ValueError("Artifact has too many entries for int32 offsets")
+
+        indices = np.empty(int(offsets[-1]), dtype=np.int32)
+        scores = np.empty(int(offsets[-1]), dtype=np.float32)
+        for slot, position in enumerate(first):
+            row_indices, row_scores = rows[position]
+            indices[offsets[slot]:offsets[slot + 1]] = row_indices
+            scores[offsets[slot]:offsets[slot + 1]] = row_scores
+
+        return cls(unique_keys, offsets.astype(np.int32), indices, scores, _encode(ids), meta)
+
+    @classmethod
+    def from_mapping(
+        cls,
+        mapping: Mapping[object, Iterable[Mapping[str, Any]]],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> "RankedLists":
+        """Build an artifact from ``{key: [{"product_id": ..., "score": ...}]}``.
+
+        Malformed entries are skipped the same way the JSON loaders always did.
+        """
+
+        positions: Dict[str, int] = {}
+        keys: List[str] = []
+        rows: List[Tuple[List[int], List[float]]] = []
+        for key, items in mapping.items():
+            if not isinstance(items, list):
+                continue
+            row_indices: List[int] = []
+            row_scores: List[float] = []
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                product_id = item.get("product_id") or item.get("productId")
+                score = item.get("score")
+                if product_id is None or score is None:
+                    continue
+                try:
+                    numeric = float(score)
+                except (TypeError, ValueError):
+                    continue
+                product_id = str(product_id)
+                row_indices.append(positions.setdefault(product_id, len(positions)))
+                row_scores.append(numeric)
+            keys.append(str(key))
+            rows.append((row_indices, row_scores))
+        return cls.from_rows(keys, rows, list(positions), meta=meta)
+
+    def replace_rows(
+        self,
+        keys: Sequence[object],
+        rows: Sequence[Tuple[Sequence[int], Sequence[float]]],
+        ids: Sequence[object],
+        drop: Iterable[object] = (),
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> "RankedLists":
+        """Return a copy with the rows of ``keys`` replaced (or added) and ``drop`` removed.
+
+        ``ids`` must start with the current id dictionary so that the indices
+        of the untouched rows stay valid; they are copied slice by slice
+        without decoding any row.
+        """
+
+        if len(keys) != len(rows):
+            raise ValueError("Number of keys and rows must match")
+        new_ids = _encode(ids)
+        if len(new_ids) < len(self.ids) or not np.array_equal(new_ids[: len(self.ids)], self.ids):
+            raise ValueError("ids must extend the existing id dictionary")
+
+        replaced = _encode([*map(str, keys), *map(str, drop)])
+        keep = ~np.isin(self.keys, replaced)
+        old_lengths = np.diff(self.offsets.astype(np.int64))
+        new_lengths = np.asarray([len(row_indices) for row_indices, _ in rows], dtype=np.int64)
+
+        # Untouched rows are read from the current arrays, replaced rows from
+        # the new ones appended after them; both are gathered in key order.
+        all_keys = np.concatenate([self.keys[keep], _encode(keys)]) if len(keys) else self.keys[keep]
+        starts = np.concatenate(
+            [self.offsets[:-1][keep].astype(np.int64), len(self.indices) + np.cumsum(new_lengths) - new_lengths]
+        )
+        lengths = np.concatenate([old_lengths[keep], new_lengths])
+        pool_indices = np.concatenate([self.indices, *(np.asarray(row[0], dtype=np.int32) for row in rows)])
+        pool_scores = np.concatenate([self.scores, *(np.asarray(row[1], dtype=np.float32) for row in rows)])
+
+        unique_keys, first = np.unique(all_keys, return_index=True)
+        lengths = lengths[first]
+        offsets = np.zeros(len(unique_keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if offsets[-1] > np.iinfo(np.int32).max:
+            raise ValueError("Artifact has too many entries for int32 offsets")
+        gather = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1] - starts[first], lengths)
+        return type(self)(
+            unique_keys,
+            offsets.astype(np.int32),
+            pool_indices[gather],
+            pool_scores[gather],
+            new_ids,
+            self.meta if meta is None else meta,
+        )
+
+    def reindex(self, ids: Sequence[object]) -> "RankedLists":
+        """Return a copy whose indices refer to ``ids``, which must contain every current id.
+
+        JSON artifacts number products in order of first appearance, so they
+        are reindexed onto the id order of the caller's own state.
+        """
+
+        new_ids = _encode(ids)
+        if np.array_equal(new_ids, self.ids):
+            return self
+        order = np.argsort(new_ids, kind="stable")
+        found = np.minimum(np.searchsorted(new_ids[order], self.ids), max(len(new_ids) - 1, 0))
+        if len(self.ids) and (not len(new_ids) or not np.array_equal(new_ids[order][found], self.ids)):
+            raise ValueError("ids must contain every product of the artifact")
+        mapping = order[found].astype(np.int32)
+        return type(self)(self.keys, self.offsets, mapping[self.indices], self.scores, new_ids, self.meta)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return int(self.keys.shape[0])
+
+    def __contains__(self, key: object) -> bool:
+        return self._position(key) is not None
+
+    def _position(self, key: object) -> Optional[int]:
+        encoded = str(key).encode("utf-8")
+        if not len(self.keys) or len(encoded) > self.keys.dtype.itemsize:
+            return None
+        position = int(np.searchsorted(self.keys, encoded))
+        if position < len(self.keys) and self.keys[position] == encoded:
+            return position
+        return None
+
+    def lookup(self, key: object) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(indices, scores)`` views for ``key`` (empty when unknown)."""
+
+        position = self._position(key)
+        if position is None:
+            return self.indices[:0], self.scores[:0]
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.indices[start:end], self.scores[start:end]
+
+    def product_id(self, index: int) -> str:
+        return self.ids[index].decode("utf-8")
+
+    def get(self, key: object, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return the ranked list of ``key`` in the API response shape."""
+
+        indices, scores = self.lookup(key)
+        if limit is not None:
+            indices, scores = indices[:limit], scores[:limit]
+        # Scores are stored as float32; rounding keeps the JSON output short.
+        return [
+            {"product_id": self.product_id(index), "score": round(score, 6)}
+            for index, score in zip(indices.tolist(), scores.tolist())
+        ]
+
+    def iter_keys(self) -> Iterator[str]:
+        for key in self.keys:
+            yield key.decode("utf-8")
+
+    def to_mapping(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {key: self.get(key) for key in self.iter_keys()}
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in ARRAY_NAMES))
+
+
+# ----------------------------------------------------------------------
+# Binary format
+# ----------------------------------------------------------------------
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _write_atomically(path: Path, write) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique even across containers sharing a volume, where PIDs repeat.
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            write(handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+def write_arrays(
+    path: Path,
+    arrays: Mapping[str, np.ndarray],
+    meta: Mapping[str, Any],
+    magic: bytes = MAGIC,
+) -> int:
+    """Write ``arrays`` and ``meta`` to ``path`` atomically; returns the bytes of arrays.
+
+    The layout is the one of the binary artifact format, so any set of
+    arrays written here can be memory-mapped with :func:`map_arrays`.
+    """
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    def _layout(header_size: int) -> Dict[str, Dict[str, Any]]:
+        layout: Dict[str, Dict[str, Any]] = {}
+        offset = _aligned(len(magic) + 8 + header_size)
+        for name, array in arrays.items():
+            layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _aligned(offset + array.nbytes)
+        return layout
+
+    # The header embeds the array offsets, which depend on its own size.
+    # Size it for offsets of up to 16 digits so a second pass is never needed.
+    probe = json.dumps({"arrays": _layout(10**15), "meta": meta}, ensure_ascii=False, default=str)
+    header_size = len(probe.encode("utf-8")) + 64
+    header = json.dumps({"arrays": _layout(header_size), "meta": meta}, ensure_ascii=False, default=str)
+    header_bytes = header.encode("utf-8").ljust(header_size, b" ")
+
+    def _write(handle) -> None:
+        handle.write(magic)
+        handle.write(np.uint64(len(header_bytes)).tobytes())
+        handle.write(header_bytes)
+        for name, spec in _layout(header_size).items():
+            handle.write(b"\0" * (spec["offset"] - handle.tell()))
+            handle.write(arrays[name].tobytes())
+
+    _write_atomically(path, _write)
+    return int(sum(array.nbytes for array in arrays.values()))
+
+
+def map_arrays(path: Path, magic: bytes = MAGIC) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Memory-map every array of a file written by :func:`write_arrays` without copying."""
+
+    with path.open("rb") as handle:
+        if handle.read(len(magic)) != magic:
+            raise ArtifactError(f"{path} is not a {magic.decode('ascii', 'replace')} file")
+        header_size = int(np.frombuffer(handle.read(8), dtype=np.uint64)[0])
+        try:
+            header = json.loads(handle.read(header_size).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise ArtifactError(f"Corrupted artifact header in {path}") from exc
+
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays: Dict[str, np.ndarray] = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        size = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        start = int(spec["offset"])
+        if start + size > buffer.shape[0]:
+            raise ArtifactError(f"Artifact {path} is truncated")
+        arrays[name] = buffer[start:start + size].view(dtype).reshape(shape)
+    return arrays, header.get("meta") or {}
+
+
+def write_binary(path: Path, artifact: RankedLists) -> None:
+    """Write ``artifact`` to ``path`` atomically in the binary format."""
+
+    nbytes = write_arrays(path, {name: getattr(artifact, name) for name in ARRAY_NAMES}, artifact.meta)
+    logger.info("Saved %s ranked lists (%s bytes of arrays) to %s", len(artifact), nbytes, path)
+
+
+def is_binary(path: Path) -> bool:
+    try:
+        with path.open("rb") as handle:
+            return handle.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def open_binary(path: Path) -> RankedLists:
+    """Memory-map a binary artifact without copying any of its arrays."""
+
+    arrays, meta = map_arrays(path)
+    if any(name not in arrays for name in ARRAY_NAMES):
+        raise ArtifactError(f"{path} is not a binary recommendation artifact")
+    return RankedLists(meta=meta, **{name: arrays[name] for name in ARRAY_NAMES})
+
+
+# ----------------------------------------------------------------------
+# JSON format
+# ----------------------------------------------------------------------
+def read_json(path: Path) -> RankedLists:
+    """Parse a legacy JSON artifact (neighbours mapping or ``{"users": ...}``)."""
+
+    try:
+        with path.open("r", encoding="utf-8") as fp:
+            payload = json.load(fp)
+    except json.JSONDecodeError as exc:
+        raise ArtifactError(f"Invalid JSON artifact {path}: {exc}") from exc
+
+    if not isinstance(payload, dict):
+        return RankedLists.empty()
+    if isinstance(payload.get("users"), dict):
+        meta = {key: value for key, value in payload.items() if key != "users"}
+        return RankedLists.from_mapping(payload["users"], meta=meta)
+    return RankedLists.from_mapping(payload)
+
+
+def export_json(path: Path, artifact: RankedLists, wrap_key: Optional[str] = None) -> None:
+    """Write ``artifact`` in the legacy indented JSON format."""
+
+    mapping: Dict[str, Any] = artifact.to_mapping()
+    payload: Dict[str, Any] = mapping
+    if wrap_key:
+        payload = {**artifact.meta, wrap_key: mapping}
+
+    def _write(handle) -> None:
+        handle.write(json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    _write_atomically(path, _write)
+    logger.info("Exported %s ranked lists to %s", len(artifact), path)
+
+
+# ----------------------------------------------------------------------
+# Helpers used by the writers and the API
+# ----------------------------------------------------------------------
+def artifact_path(path: Path, artifact_format: str) -> Path:
+    """Return the file a writer should use for ``artifact_format``."""
+
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown artifact format {artifact_format!r}; expected one of {ARTIFACT_FORMATS}")
+    return path.with_suffix(".json") if artifact_format == "json" else path
+
+
+def resolve_existing(path: Path) -> Optional[Path]:
+    """Return ``path`` or its legacy ``.json`` sibling, whichever exists."""
+
+    for candidate in (path, path.with_suffix(".json")):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def save_artifact(
+    path: Path,
+    artifact: RankedLists,
+    artifact_format: str = "binary",
+    wrap_key: Optional[str] = None,
+) -> Path:
+    target = artifact_path(path, artifact_format)
+    if artifact_format == "json":
+        export_json(target, artifact, wrap_key=wrap_key)
+    else:
+        write_binary(target, artifact)
+    return target
+
+
+def load_artifact(path: Path) -> RankedLists:
+    """Open ``path`` in whichever format it was written."""
+
+    if is_binary(path):
+        return open_binary(path)
+    return read_json(path)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert recommendation artifacts between formats.")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("target", type=Path)
+    parser.add_argument("--format", choices=ARTIFACT_FORMATS, default="json")
+    parser.add_argument(
+        "--wrap-key",
+        default=None,
+        help="Nest the mapping under this key when exporting JSON (use 'users' for recommendations).",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    artifact = load_artifact(args.source)
+    if args.format == "json":
+        export_json(args.target, artifact, wrap_key=args.wrap_key)
+    else:
+        write_binary(args.target, artifact)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Performance benchmarks for the ML service.
+
+Run the modules from the ``ml_service`` directory, e.g.
+``python -m benchmarks.neighbors_parallel``.
+"""
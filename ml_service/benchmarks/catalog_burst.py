@@ -0,0 +1,144 @@
+"""Upstream calls and latency of bursts of concurrent ``GET /catalog`` calls.
+
+Usage::
+
+    python -m benchmarks.catalog_burst --products 2000 --burst 50 --latency 0.5
+
+Starts the API against the stub gateway of :mod:`benchmarks.catalog_server`
+and sends bursts of concurrent ``/catalog`` calls while the cached catalog
+is missing (``cold``), fresh (``warm``), expired (``expired``), while the
+gateway answers ``503`` (``failing``) and after it came back
+(``recovered``). For every burst the status codes, latency percentiles and
+the number of requests the gateway received are reported. With request
+coalescing a burst costs at most one upstream sync, expired and failing
+bursts are answered from the last good catalog without waiting, and the
+circuit breaker caps the calls to the failing gateway.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.catalog_server import CatalogServer
+from benchmarks.synthetic import make_catalog_items
+
+POLL_SECONDS = 0.05
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _call(client: httpx.AsyncClient, url: str) -> tuple[int, float]:
+    start = time.perf_counter()
+    response = await client.get(url)
+    return response.status_code, time.perf_counter() - start
+
+
+async def _burst(base_url: str, size: int) -> List[tuple[int, float]]:
+    limits = httpx.Limits(max_connections=size)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        return await asyncio.gather(*(_call(client, "/catalog") for _ in range(size)))
+
+
+def _report(name: str, results: List[tuple[int, float]], upstream: int) -> Dict[str, float]:
+    statuses = Counter(status for status, _ in results)
+    p50, p99 = np.percentile([seconds * 1e3 for _, seconds in results], [50, 99])
+    codes = " ".join(f"{status}x{count}" for status, count in sorted(statuses.items()))
+    print(f"{name:>10} {codes:>16} {p50:>9.1f} {p99:>9.1f} {upstream:>9}")
+    return {"p50_ms": p50, "p99_ms": p99, "upstream_requests": upstream}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--bursts", type=int, default=5, help="Bursts sent while the gateway is failing.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the gateway takes per response.")
+    parser.add_argument("--ttl", type=float, default=2.0)
+    parser.add_argument("--breaker-failures", type=int, default=3)
+    parser.add_argument("--breaker-reset", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="catalog-burst-") as directory, CatalogServer(
+        make_catalog_items(args.products), latency=args.latency
+    ) as server:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {
+            **os.environ,
+            "CATALOG_API_BASE_URL": server.base_url,
+            "CATALOG_SNAPSHOT_PATH": str(Path(directory) / "catalog_snapshot.json"),
+            "CATALOG_TTL_SECONDS": str(args.ttl),
+            "CATALOG_MAX_RETRIES": "0",
+            "CATALOG_BREAKER_FAILURES": str(args.breaker_failures),
+            "CATALOG_BREAKER_RESET_SECONDS": str(args.breaker_reset),
+            "MODEL_REGISTRY_DIR": str(Path(directory) / "registry"),
+            "SHARED_ARTIFACTS_DIR": str(Path(directory) / "shared"),
+            "JOB_METRICS_DIR": str(Path(directory) / "metrics"),
+        }
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)]
+        process = subprocess.Popen(
+            command + ["--log-level", "warning"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            started = time.perf_counter()
+            while True:
+                if process.poll() is not None:
+                    raise SystemExit(f"uvicorn exited with code {process.returncode}")
+                try:
+                    httpx.get(f"{base_url}/health", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() - started > args.timeout:
+                    raise SystemExit("Timed out waiting for uvicorn")
+                time.sleep(POLL_SECONDS)
+
+            print(
+                f"{args.burst} concurrent calls per burst, gateway latency {args.latency} s\n"
+                f"{'burst':>10} {'statuses':>16} {'p50 ms':>9} {'p99 ms':>9} {'upstream':>9}"
+            )
+
+            def run(name: str) -> None:
+                before = server.requests
+                results = asyncio.run(_burst(base_url, args.burst))
+                # Background revalidations finish after the burst was answered.
+                time.sleep(args.latency + 0.2)
+                _report(name, results, server.requests - before)
+
+            run("cold")
+            run("warm")
+            time.sleep(args.ttl)
+            run("expired")
+
+            server.failing = True
+            time.sleep(args.ttl)
+            for index in range(args.bursts):
+                run(f"failing-{index + 1}")
+            server.failing = False
+            time.sleep(args.breaker_reset)
+            run("recovered")
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
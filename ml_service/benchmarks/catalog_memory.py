@@ -0,0 +1,80 @@
+"""Compare the per-product Pydantic catalog with the columnar one.
+
+Usage::
+
+    python -m benchmarks.catalog_memory --products 20000 100000
+
+For each catalog size the synthetic upstream items are built first; then
+both loaders turn them into the feature frame used by the neighbour
+builder. ``retained MiB`` is what the catalog object keeps alive after
+loading, ``peak MiB`` the largest allocation while building it plus the
+feature frame, both measured with :mod:`tracemalloc`. Timings come from a
+separate run without tracing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from benchmarks.synthetic import make_catalog_items
+from catalog_columns import ColumnarCatalog
+from models import build_catalog, parse_product
+
+
+def _pydantic_load(items: List[Dict[str, Any]]) -> Tuple[Any, pd.DataFrame]:
+    # The loader before the columnar catalog: one model per product plus the raw payload.
+    catalog = build_catalog([parse_product(item) for item in items], raw_payload=items, source="all")
+    frame = pd.DataFrame([product.model_dump() for product in catalog.products])
+    return catalog, frame
+
+
+def _columnar_load(items: List[Dict[str, Any]]) -> Tuple[Any, pd.DataFrame]:
+    catalog = ColumnarCatalog.from_items(items, source="all")
+    return catalog, catalog.to_frame()
+
+
+LOADERS: Dict[str, Callable[[List[Dict[str, Any]]], Tuple[Any, pd.DataFrame]]] = {
+    "pydantic": _pydantic_load,
+    "columnar": _columnar_load,
+}
+
+
+def _measure(loader: Callable, items: List[Dict[str, Any]]) -> Tuple[float, float, float]:
+    gc.collect()
+    start = time.perf_counter()
+    loader(items)
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    catalog, frame = loader(items)
+    _, peak = tracemalloc.get_traced_memory()
+    del frame
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalog
+    return seconds, retained / 2**20, peak / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[20_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'products':>9} {'loader':>9} {'seconds':>8} {'retained MiB':>12} {'peak MiB':>9}")
+    for n_products in args.products:
+        items = make_catalog_items(n_products)
+        for name, loader in LOADERS.items():
+            seconds, retained, peak = _measure(loader, items)
+            print(f"{n_products:>9} {name:>9} {seconds:>8.2f} {retained:>12.1f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
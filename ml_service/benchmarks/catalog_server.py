@@ -0,0 +1,191 @@
+"""Stub of the gateway endpoints the ML service reads, for benchmarks and local runs.
+
+Usage::
+
+    python -m benchmarks.catalog_server --products 100000 --ratings 1000000 --port 8080
+
+Serves a synthetic catalog on ``/api/products/all`` and, like the gateway,
+page by page on ``/api/products?page=&pageSize=``, plus a ratings export on
+``/ratings/export``. Every response carries an ``ETag`` and answers
+conditional requests with ``304``, so catalog snapshot syncs behave as
+against the real gateway. Point ``CATALOG_API_BASE_URL`` and
+``RATINGS_API_BASE_URL`` of the service at it. ``--paginated`` answers
+``404`` on ``/api/products/all`` (the gateway has no such endpoint) and
+``--latency`` delays every response. Setting ``failing`` makes the server
+answer ``503`` to everything, like an unavailable gateway.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from benchmarks.synthetic import make_catalog_items, make_ratings_frame
+
+DEFAULT_PAGE_SIZE = 100
+EXPORT_CHUNK = 100_000
+
+
+def write_ratings_export(path: Path, frame: pd.DataFrame) -> None:
+    """Write ``frame`` shaped like the gateway's ``/ratings/export`` response."""
+
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write("[")
+        for start in range(0, len(frame), EXPORT_CHUNK):
+            chunk = frame.iloc[start : start + EXPORT_CHUNK]
+            records = [
+                {
+                    "id": start + offset,
+                    "userId": int(user),
+                    "productId": product,
+                    "rating": int(rating),
+                    "createdAt": "2024-01-01T00:00:00.000Z",
+                    "updatedAt": "2024-01-01T00:00:00.000Z",
+                }
+                for offset, (user, product, rating) in enumerate(
+                    zip(chunk["user_id"], chunk["product_id"], chunk["rating"])
+                )
+            ]
+            handle.write(("," if start else "") + json.dumps(records)[1:-1])
+        handle.write("]")
+
+
+class CatalogServer:
+    """Serve ``items`` and an optional ratings export file from a background thread.
+
+    Use as a context manager; ``base_url`` is valid inside the block.
+    """
+
+    def __init__(
+        self,
+        items: List[dict],
+        ratings_path: Optional[Path] = None,
+        paginated: bool = False,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.items = items
+        self.ratings_path = ratings_path
+        self.paginated = paginated
+        self.latency = latency
+        self.failing = False
+        self.requests = 0
+        self._body = json.dumps(items).encode("utf-8")
+        self._etag = f'"{hashlib.sha256(self._body).hexdigest()[:32]}"'
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+                pass
+
+            def _send(self, status: int, body: bytes = b"", etag: Optional[str] = None) -> None:
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, body: bytes, etag: str) -> None:
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, etag=etag)
+                else:
+                    self._send(200, body, etag)
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                if server.failing:
+                    self._send(503, b'{"error":"unavailable"}')
+                elif url.path == "/api/products/all" and not server.paginated:
+                    self._send_json(server._body, server._etag)
+                elif url.path == "/api/products":
+                    page = int(query.get("page", ["1"])[0])
+                    size = int((query.get("pageSize") or query.get("limit") or [DEFAULT_PAGE_SIZE])[0])
+                    body = json.dumps(server.items[(page - 1) * size : page * size]).encode("utf-8")
+                    self._send_json(body, f'"{server._etag[1:17]}-{page}-{size}"')
+                elif url.path == "/ratings/export" and server.ratings_path is not None:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(server.ratings_path.stat().st_size))
+                    self.end_headers()
+                    with server.ratings_path.open("rb") as handle:
+                        shutil.copyfileobj(handle, self.wfile)
+                else:
+                    self._send(404, b'{"error":"not found"}')
+
+        return Handler
+
+    def __enter__(self) -> "CatalogServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="catalog-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--ratings", type=int, default=0, help="Ratings in the export; 0 serves none.")
+    parser.add_argument("--users", type=int, default=0, help="Users in the export (default: ratings / 20).")
+    parser.add_argument("--paginated", action="store_true", help="Answer 404 on /api/products/all.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="catalog-server-") as directory:
+        ratings_path = None
+        if args.ratings:
+            ratings_path = Path(directory) / "export.json"
+            users = args.users or max(1, args.ratings // 20)
+            write_ratings_export(ratings_path, make_ratings_frame(args.ratings, users, args.products))
+        server = CatalogServer(
+            make_catalog_items(args.products),
+            ratings_path,
+            paginated=args.paginated,
+            latency=args.latency,
+            host=args.host,
+            port=args.port,
+        )
+        with server:
+            print(f"Serving {args.products} products on {server.base_url}; press Ctrl+C to stop")
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
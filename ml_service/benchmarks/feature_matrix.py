@@ -0,0 +1,132 @@
+"""Benchmark the product feature pipeline on a synthetic catalog.
+
+Usage::
+
+    python -m benchmarks.feature_matrix --products 200000 --vocabulary 50000
+
+``legacy`` is the previous pipeline (row-wise text assembly with
+``DataFrame.apply`` and an unbounded ``float64`` TF-IDF); the other rows
+are :class:`features.ProductFeaturizer` configurations. ``cached`` reuses
+a pipeline saved by an earlier fit on the same catalog. Every description
+gets ``--words`` random terms drawn from ``--vocabulary`` distinct words,
+so the vocabulary is as diverse as a real catalog.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import pickle
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from benchmarks.synthetic import make_catalog_frame
+from features import (  # pylint: disable=protected-access
+    CATEGORICAL_COLUMNS,
+    ProductFeaturizer,
+    _assign_price_bins,
+    _make_one_hot_encoder,
+    _numeric_prices,
+    load_fitted,
+)
+
+
+def _legacy_text(row: pd.Series) -> str:
+    parts = [
+        row.get("name") or row.get("title") or "",
+        row.get("description") or "",
+        row.get("brand") or "",
+        row.get("category") or row.get("category_id") or row.get("categoryId") or row.get("gender") or "",
+    ]
+    return " ".join(str(part) for part in parts if part)
+
+
+def _legacy(frame: pd.DataFrame) -> Tuple[sparse.csr_matrix, object]:
+    tfidf = TfidfVectorizer(min_df=1, ngram_range=(1, 2))
+    text_matrix = tfidf.fit_transform(frame.apply(_legacy_text, axis=1))
+    price_bins, _ = _assign_price_bins(_numeric_prices(frame))
+    categorical = frame.reindex(columns=CATEGORICAL_COLUMNS[:-1]).copy()
+    categorical["price_bin"] = price_bins
+    encoder = _make_one_hot_encoder()
+    categorical_matrix = encoder.fit_transform(categorical.fillna("unknown"))
+    matrix = normalize(sparse.hstack([text_matrix, categorical_matrix]).tocsr(), norm="l2")
+    return matrix, (tfidf, encoder)
+
+
+def _featurizer(**options) -> Callable[[pd.DataFrame], Tuple[sparse.csr_matrix, object]]:
+    def _run(frame: pd.DataFrame) -> Tuple[sparse.csr_matrix, object]:
+        featurizer = ProductFeaturizer(**options)
+        return featurizer.fit_transform(frame), featurizer
+
+    return _run
+
+
+def _add_vocabulary(frame: pd.DataFrame, vocabulary: int, words: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    terms = np.char.add("w", rng.integers(0, vocabulary, (len(frame), words)).astype(str))
+    extra = pd.Series([" ".join(row) for row in terms.tolist()], index=frame.index)
+    frame = frame.copy()
+    frame["description"] = frame["description"] + " " + extra
+    return frame
+
+
+def _matrix_mib(matrix: sparse.csr_matrix) -> float:
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=5)
+    parser.add_argument("--max-features", type=int, default=1 << 16)
+    parser.add_argument("--hash-bits", type=int, default=18)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    frame = _add_vocabulary(make_catalog_frame(args.products), args.vocabulary, args.words)
+
+    runs: Dict[str, Callable[[pd.DataFrame], Tuple[sparse.csr_matrix, object]]] = {
+        "legacy": _legacy,
+        "tfidf": _featurizer(),
+        f"tfidf max {args.max_features}": _featurizer(max_features=args.max_features),
+        f"hashing 2^{args.hash_bits}": _featurizer(vectorizer="hashing", hash_bits=args.hash_bits),
+    }
+
+    print(f"{'pipeline':>22} {'seconds':>8} {'columns':>9} {'dtype':>8} {'matrix MiB':>10} {'pipeline MiB':>12}")
+    with tempfile.TemporaryDirectory(prefix="features-") as directory:
+        cache_path = Path(directory) / "features.pkl"
+        for name, run in runs.items():
+            start = time.perf_counter()
+            matrix, fitted = run(frame)
+            seconds = time.perf_counter() - start
+            pipeline_mib = len(pickle.dumps(fitted, protocol=pickle.HIGHEST_PROTOCOL)) / 2**20
+            if name == "tfidf":
+                fitted.save(cache_path)
+            print(
+                f"{name:>22} {seconds:>8.2f} {matrix.shape[1]:>9} {matrix.dtype.name:>8} "
+                f"{_matrix_mib(matrix):>10.1f} {pipeline_mib:>12.1f}"
+            )
+
+        start = time.perf_counter()
+        cached = load_fitted(cache_path, frame, ProductFeaturizer().options)
+        if cached is None:
+            raise SystemExit("The cached pipeline was not reused")
+        matrix = cached.transform(frame)
+        seconds = time.perf_counter() - start
+        print(
+            f"{'cached tfidf':>22} {seconds:>8.2f} {matrix.shape[1]:>9} {matrix.dtype.name:>8} "
+            f"{_matrix_mib(matrix):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
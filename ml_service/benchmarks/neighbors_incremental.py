@@ -0,0 +1,86 @@
+"""Compare a full neighbour rebuild with an incremental update.
+
+Usage::
+
+    python -m benchmarks.neighbors_incremental --products 20000 100000 --new 300
+
+For each catalog size the exact backend builds the neighbours once; then
+``--new`` products are added, ``--changed`` renamed and ``--removed``
+dropped, and ``update_product_neighbors`` patches the artifact. All files
+are written to a temporary directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.synthetic import make_catalog_items
+from catalog_columns import ColumnarCatalog
+
+
+def _mutate(items: List[Dict[str, Any]], new: int, changed: int, removed: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    items = copy.deepcopy(items)
+    picked = rng.choice(len(items), changed + removed, replace=False)
+    for position in picked[:changed].tolist():
+        items[position]["name"] += " limited edition"
+    dropped = set(picked[changed:].tolist())
+    items = [item for position, item in enumerate(items) if position not in dropped]
+    for position, item in enumerate(make_catalog_items(new, seed=seed)):
+        item["id"] = f"new-{position:07d}"
+        items.append(item)
+    return items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--new", type=int, default=300)
+    parser.add_argument("--changed", type=int, default=50)
+    parser.add_argument("--removed", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="neighbors-incremental-") as directory:
+        path = Path(directory)
+        os.environ["FEATURE_MATRIX_PATH"] = str(path / "features.npz")
+        os.environ["FEATURE_PIPELINE_PATH"] = str(path / "features.pkl")
+        os.environ["NEIGHBORS_BACKEND"] = "exact"
+
+        # Imported after the environment points every artifact at the temporary directory.
+        from neighbor_builder import build_product_neighbors, update_product_neighbors  # pylint: disable=import-outside-toplevel
+
+        print(f"{'products':>9} {'full s':>8} {'update s':>9} {'recomputed':>10} {'patched':>8}")
+        for n_products in args.products:
+            items = make_catalog_items(n_products)
+            output = path / f"neighbors-{n_products}.bin"
+
+            start = time.perf_counter()
+            build_product_neighbors(top_k=args.top_k, output_path=output, catalog=ColumnarCatalog.from_items(items))
+            full_seconds = time.perf_counter() - start
+
+            catalog = ColumnarCatalog.from_items(_mutate(items, args.new, args.changed, args.removed))
+            start = time.perf_counter()
+            stats = update_product_neighbors(top_k=args.top_k, output_path=output, catalog=catalog)
+            update_seconds = time.perf_counter() - start
+            if stats["full_rebuild"]:
+                raise SystemExit("The update fell back to a full rebuild; lower --new/--changed/--removed")
+
+            print(
+                f"{n_products:>9} {full_seconds:>8.2f} {update_seconds:>9.2f} "
+                f"{stats['recomputed']:>10} {stats['patched']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
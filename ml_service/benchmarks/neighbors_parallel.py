@@ -0,0 +1,58 @@
+"""Benchmark the parallel neighbour computation at several worker counts.
+
+Usage::
+
+    python -m benchmarks.neighbors_parallel --products 50000 --workers 1 2 4 8 16
+
+The single-process run is used as the reference: every parallel run must
+produce byte-identical serialised output, otherwise the benchmark fails.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from typing import List
+
+from benchmarks.synthetic import make_catalog_frame
+from neighbor_builder import DEFAULT_BLOCK_SIZE, DEFAULT_TOP_K, build_feature_matrix, compute_neighbors
+
+
+def _serialise(neighbors: List[List[dict]]) -> bytes:
+    return json.dumps(neighbors, ensure_ascii=False).encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    feature_matrix = build_feature_matrix(make_catalog_frame(args.products))
+
+    reference: bytes | None = None
+    baseline: float | None = None
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    for workers in sorted(set([1, *args.workers])):
+        start = time.perf_counter()
+        neighbors = compute_neighbors(
+            feature_matrix, top_k=args.top_k, block_size=args.block_size, workers=workers
+        )
+        elapsed = time.perf_counter() - start
+
+        serialised = _serialise(neighbors)
+        if reference is None:
+            reference, baseline = serialised, elapsed
+        elif serialised != reference:
+            raise SystemExit(f"Output with {workers} workers differs from the single-process path")
+
+        print(f"{workers:>8} {elapsed:>10.2f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Per-request latency of on-demand personalised scoring.
+
+Usage::
+
+    python -m benchmarks.personal_scoring --products 50000 --users 20000 --ratings 1000000
+
+Builds a :class:`~scoring.PersonalScorer` from a synthetic catalog and
+random factors of the users and products in a synthetic ratings table, then
+times ``recommend`` for random users with and without filters and several
+limits. The lookup of a precomputed top-20 list is timed for comparison.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_catalog_items, make_ratings_frame
+from catalog_columns import ColumnarCatalog
+from factor_model import FactorModel
+from scoring import ItemFilter, PersonalScorer
+from train_model import TOP_N, _compute_user_recommendations
+
+
+def _percentiles(samples: list[float]) -> str:
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1e6, [50, 95, 99])
+    return f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--factors", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--limit", type=int, nargs="+", default=[20, 100, 1000])
+    args = parser.parse_args()
+
+    catalog = ColumnarCatalog.from_items(make_catalog_items(args.products))
+    frame = make_ratings_frame(args.ratings, args.users, args.products)
+    rng = np.random.default_rng(0)
+    user_ids = frame["user_id"].unique().astype(object)
+    item_ids = frame["product_id"].unique().astype(object)
+    model = FactorModel(
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=rng.normal(0.0, 0.1, (user_ids.size, args.factors)),
+        item_factors=rng.normal(0.0, 0.1, (item_ids.size, args.factors)),
+        user_biases=rng.normal(0.0, 0.3, user_ids.size),
+        item_biases=rng.normal(0.0, 0.3, item_ids.size),
+        global_mean=3.5,
+        rating_scale=(1.0, 5.0),
+    )
+    model.remember(frame)
+
+    start = time.perf_counter()
+    scorer = PersonalScorer.build(model, catalog)
+    print(
+        f"{len(scorer)} users, {scorer.n_items} products, {args.factors} factors, "
+        f"{frame.shape[0]} ratings; scorer built in {time.perf_counter() - start:.2f} s"
+    )
+
+    users = rng.choice(user_ids, args.requests).tolist()
+    sample = users[: min(len(users), 1_000)]
+    product_ids = [product_id.decode("utf-8") for product_id in scorer.product_ids.tolist()]
+    precomputed = _compute_user_recommendations(model, frame[frame["user_id"].isin(sample)], product_ids)
+    filters = {
+        "none": ItemFilter(),
+        "category": ItemFilter(categories=("cat-1",)),
+        "category+price+stock": ItemFilter(categories=("cat-1", "cat-2"), min_price=20.0, max_price=60.0, in_stock=True),
+    }
+
+    print(f"{'path':>22} {'limit':>6} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9}")
+    timings = []
+    for user_id in users:
+        start = time.perf_counter()
+        precomputed.get(user_id, TOP_N)
+        timings.append(time.perf_counter() - start)
+    print(f"{'precomputed':>22} {TOP_N:>6} {_percentiles(timings)}")
+    for name, item_filter in filters.items():
+        for limit in args.limit:
+            timings = []
+            for user_id in users:
+                start = time.perf_counter()
+                scorer.recommend(user_id, limit, item_filter)
+                timings.append(time.perf_counter() - start)
+            print(f"{name:>22} {limit:>6} {_percentiles(timings)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare peak memory of the buffered and the streaming ratings export loader.
+
+Usage::
+
+    python -m benchmarks.ratings_streaming --rows 1000000 2000000 4000000
+
+A synthetic ``/ratings/export`` body is written to a temporary directory and
+served over HTTP from a local thread. Every loader run happens in a fresh
+subprocess so that its peak RSS is measured in isolation;
+the RSS after imports is reported separately as the baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+try:  # ``resource`` is only available on POSIX platforms.
+    import resource
+except ImportError:  # pragma: no cover - exercised on Windows only
+    resource = None  # type: ignore[assignment]
+
+MODES = ("buffered", "streaming")
+
+
+def _peak_rss_mib() -> float:
+    # ``VmHWM`` is reset by exec, whereas Linux carries ``ru_maxrss`` over
+    # from the parent process.
+    try:
+        with open("/proc/self/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_export(path: Path, rows: int, n_users: int, n_products: int, seed: int = 0) -> None:
+    """Write a ratings export shaped like the gateway's ``/ratings/export`` response."""
+
+    rng = np.random.default_rng(seed)
+    chunk = 20_000
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write("[")
+        for start in range(0, rows, chunk):
+            size = min(chunk, rows - start)
+            users = rng.integers(1, n_users + 1, size)
+            products = rng.integers(0, n_products, size)
+            ratings = rng.integers(1, 6, size)
+            records = [
+                {
+                    "id": start + offset,
+                    "userId": int(user),
+                    "productId": f"prod-{product:07d}",
+                    "rating": int(rating),
+                    "createdAt": "2024-01-01T00:00:00.000Z",
+                    "updatedAt": "2024-01-01T00:00:00.000Z",
+                }
+                for offset, (user, product, rating) in enumerate(zip(users, products, ratings))
+            ]
+            body = json.dumps(records)[1:-1]
+            handle.write(("," if start else "") + body)
+        handle.write("]")
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+        pass
+
+
+def _serve(directory: Path) -> ThreadingHTTPServer:
+    handler = functools.partial(_QuietHandler, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _run_child(mode: str, base_url: str) -> None:
+    from ratings_loader import _load_from_api  # pylint: disable=import-outside-toplevel
+
+    baseline = _peak_rss_mib()
+    start = time.perf_counter()
+    frame = _load_from_api(base_url, None, timeout=600, streaming=mode == "streaming")
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"rows": len(frame), "seconds": elapsed, "baseline_mib": baseline, "peak_mib": _peak_rss_mib()}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[250_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.child, args.url)
+        return
+
+    print(f"{'rows':>10} {'export MiB':>10} {'mode':>10} {'seconds':>8} {'baseline MiB':>12} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        (directory / "ratings").mkdir()
+        server = _serve(directory)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            for rows in args.rows:
+                export = directory / "ratings" / "export"
+                write_export(export, rows, args.users, args.products)
+                size_mib = export.stat().st_size / 2**20
+                for mode in MODES:
+                    output = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.ratings_streaming", "--child", mode, "--url", base_url],
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    ).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    if result["rows"] != rows:
+                        raise SystemExit(f"{mode} loader returned {result['rows']} rows instead of {rows}")
+                    print(
+                        f"{rows:>10} {size_mib:>10.1f} {mode:>10} {result['seconds']:>8.2f} "
+                        f"{result['baseline_mib']:>12.1f} {result['peak_mib']:>9.1f}"
+                    )
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
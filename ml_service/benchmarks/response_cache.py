@@ -0,0 +1,128 @@
+"""Measure /recs/similar and /recs/personalized with and without the response cache.
+
+Usage::
+
+    python -m benchmarks.response_cache --products 50000 --requests 20000
+
+Synthetic neighbour and recommendation artifacts are served by calling the
+ASGI app directly, so the numbers cover routing, parameter parsing, the
+handler and serialisation but neither the network nor an HTTP client.
+Requested ids follow a Zipf distribution, like the skewed production
+traffic; the cache counters (also served on ``GET /cache``) are reported
+after every run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from artifacts import RankedLists, save_artifact
+
+TOP_K = 50
+
+
+def _write_artifact(path: Path, keys, n_products: int, rng: np.random.Generator) -> None:
+    rows = [
+        (rng.choice(n_products, TOP_K, replace=False), np.sort(rng.random(TOP_K))[::-1])
+        for _ in range(len(keys))
+    ]
+    save_artifact(path, RankedLists.from_rows(keys, rows, [f"prod-{idx:07d}" for idx in range(n_products)]))
+
+
+async def _run(app, urls) -> float:
+    """Call the ASGI app directly; an HTTP client would dominate the timings."""
+
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    start = time.perf_counter()
+    for url in urls:
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 1),
+            "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    if any(code != 200 for code in status):
+        raise SystemExit(f"Unexpected status codes: {sorted(set(status))}")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent of the requested ids.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1_000, 10_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory(prefix="response-cache-") as directory:
+        path = Path(directory)
+        products = [f"prod-{idx:07d}" for idx in range(args.products)]
+        users = [str(idx) for idx in range(1, args.users + 1)]
+        _write_artifact(path / "product_neighbors.bin", products, args.products, rng)
+        _write_artifact(path / "user_recommendations.bin", users, args.products, rng)
+        os.environ.update(
+            {
+                "NEIGHBORS_PATH": str(path / "product_neighbors.bin"),
+                "RECOMMENDATIONS_OUTPUT_PATH": str(path / "user_recommendations.bin"),
+                "POPULARITY_PATH": str(path / "product_popularity.bin"),
+                "MODEL_REGISTRY_DIR": str(path / "registry"),
+            }
+        )
+        import app as app_module  # pylint: disable=import-outside-toplevel
+
+        app_module.get_artifact_store().refresh()
+        workloads = {
+            "similar": [
+                f"/recs/similar?product_id={products[(idx - 1) % args.products]}&limit=20"
+                for idx in rng.zipf(args.zipf, args.requests)
+            ],
+            "personalized": [
+                f"/recs/personalized?user_id={users[(idx - 1) % args.users]}&limit=20"
+                for idx in rng.zipf(args.zipf, args.requests)
+            ],
+        }
+
+        print(f"{'endpoint':>13} {'cache size':>10} {'req/s':>8} {'mean us':>8} {'hit ratio':>9} {'evictions':>9}")
+        for size in args.sizes:
+            os.environ["RESPONSE_CACHE_SIZE"] = str(size)
+            for endpoint, urls in workloads.items():
+                app_module.get_settings.cache_clear()
+                app_module.get_response_cache.cache_clear()
+                seconds = asyncio.run(_run(app_module.app, urls))
+                stats = app_module.get_response_cache().stats()
+                print(
+                    f"{endpoint:>13} {size:>10} {len(urls) / seconds:>8.0f} {seconds / len(urls) * 1e6:>8.0f} "
+                    f"{stats['hit_ratio'] or 0.0:>9.3f} {stats['evictions']:>9}"
+                )
+
+
+if __name__ == "__main__":
+    main()
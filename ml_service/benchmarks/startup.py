@@ -0,0 +1,140 @@
+"""Measure the time from process start to the first served request.
+
+Usage::
+
+    python -m benchmarks.startup --ratings 200000 --products 5000
+
+A synthetic ratings export and catalog are served from a local HTTP
+server. ``train-on-start`` reproduces the previous ``start.sh``, which ran
+``train_model.py`` before ``uvicorn``; ``registry`` starts ``uvicorn``
+straight away from a version published beforehand by ``trainer.py --once``.
+For both, the time until ``/health`` answers and until personalised
+recommendations are served is reported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, Tuple
+
+from benchmarks.ratings_streaming import _serve, write_export
+from benchmarks.synthetic import make_catalog_items
+
+POLL_SECONDS = 0.05
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def _wait(process: subprocess.Popen, port: int, started: float, timeout: float) -> Tuple[float, float]:
+    base = f"http://127.0.0.1:{port}"
+    health = None
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        if health is None and _get(f"{base}/health") is not None:
+            health = time.perf_counter() - started
+        if health is not None:
+            artifacts = _get(f"{base}/artifacts") or {}
+            if (artifacts.get("recommendations") or {}).get("size"):
+                return health, time.perf_counter() - started
+        time.sleep(POLL_SECONDS)
+    raise SystemExit("Timed out waiting for the server")
+
+
+def _serve_app(command: str, env: Dict[str, str], timeout: float) -> Tuple[float, float]:
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        ["sh", "-c", command.format(port=port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        return _wait(process, port, started, timeout)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratings", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--timeout", type=float, default=900.0)
+    args = parser.parse_args()
+
+    uvicorn = f"{sys.executable} -m uvicorn app:app --host 127.0.0.1 --port {{port}}"
+    with tempfile.TemporaryDirectory(prefix="startup-") as directory:
+        path = Path(directory)
+        (path / "ratings").mkdir()
+        write_export(path / "ratings" / "export", args.ratings, args.users, args.products)
+        (path / "api" / "products").mkdir(parents=True)
+        (path / "api" / "products" / "all").write_text(json.dumps(make_catalog_items(args.products)))
+        server = _serve(path)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        env = {
+            **os.environ,
+            "CATALOG_API_BASE_URL": base_url,
+            "RATINGS_API_BASE_URL": base_url,
+            "CATALOG_SNAPSHOT_PATH": str(path / "catalog_snapshot.json"),
+            "RECOMMENDATIONS_OUTPUT_PATH": str(path / "legacy" / "user_recommendations.bin"),
+            "POPULARITY_PATH": str(path / "legacy" / "product_popularity.bin"),
+            "NEIGHBORS_PATH": str(path / "product_neighbors.bin"),
+            "MODEL_REGISTRY_DIR": str(path / "registry"),
+        }
+        env.pop("DATABASE_URL", None)
+
+        try:
+            print(f"{'mode':>15} {'health s':>9} {'serving s':>10}")
+            # The previous start.sh: train in the foreground, then start the API.
+            health, serving = _serve_app(
+                f"{sys.executable} train_model.py; exec {uvicorn}",
+                {**env, "MODEL_REGISTRY_DIR": str(path / "unused-registry")},
+                args.timeout,
+            )
+            print(f"{'train-on-start':>15} {health:>9.2f} {serving:>10.2f}")
+
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "trainer.py", "--once"],
+                env=env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            trainer_seconds = time.perf_counter() - start
+
+            health, serving = _serve_app(f"exec {uvicorn}", env, args.timeout)
+            print(f"{'registry':>15} {health:>9.2f} {serving:>10.2f}")
+            print(f"(trainer.py --once, off the startup path: {trainer_seconds:.2f} s)")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
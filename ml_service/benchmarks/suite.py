@@ -0,0 +1,480 @@
+"""Reproducible benchmark suite of the batch pipeline and the serving endpoints.
+
+Usage::
+
+    python -m benchmarks.suite --scale small --output before.json
+    python -m benchmarks.suite --scale small --output after.json --compare before.json
+    python -m benchmarks.suite --products 200000 --ratings 2000000 --stages feature_matrix neighbors
+
+A synthetic catalog and ratings are served by the stub gateway of
+:mod:`benchmarks.catalog_server`, and the pipeline runs against it stage by
+stage, each in a fresh subprocess so that its time and peak RSS are measured
+in isolation (``rss_mib`` is the RSS after imports and loading the inputs,
+``peak_mib`` the peak of the stage; with ``--repeat`` the fastest run of
+every timing is kept):
+
+``catalog_fetch``   ``load_catalog_snapshot`` from the stub
+``ratings_fetch``   ``load_ratings`` of the stub's ``/ratings/export``
+``feature_matrix``  ``build_feature_matrix``
+``neighbors``       ``compute_neighbor_rows`` (``compute_neighbors`` without
+                    formatting every pair as a dict) and saving the artifact
+``recommendations`` fitting ``TRAINING_ENGINE`` and ``_compute_user_recommendations``
+``artifact_load``   ``load_artifact`` of both artifacts and a lookup per key
+``serving``         ``/recs/*`` throughput and latency percentiles of a local
+                    uvicorn serving the artifacts, plus its RSS
+
+Every stage reads what the previous ones wrote, so ``--stages`` may only
+skip stages at the end. Results are written as JSON together with the
+commit, parameters and machine; ``--compare`` prints the relative change
+of every metric against an earlier result and ``--fail-above`` turns a
+slowdown of the timings beyond that fraction into a non-zero exit code.
+Numbers are only comparable between runs on the same machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from benchmarks.catalog_server import CatalogServer, write_ratings_export
+from benchmarks.ratings_streaming import _peak_rss_mib
+from benchmarks.synthetic import make_catalog_items, make_ratings_frame
+
+SCALES = {
+    "small": {"products": 1_000, "users": 5_000, "ratings": 100_000},
+    "medium": {"products": 50_000, "users": 20_000, "ratings": 1_000_000},
+    "large": {"products": 1_000_000, "users": 100_000, "ratings": 10_000_000},
+}
+STAGES = (
+    "catalog_fetch",
+    "ratings_fetch",
+    "feature_matrix",
+    "neighbors",
+    "recommendations",
+    "artifact_load",
+    "serving",
+)
+ENDPOINTS = ("similar", "personalized", "popular", "personal")
+# Users rate the best liked of this many products, see ``make_ratings_frame``.
+CANDIDATES = 5
+ZIPF_EXPONENT = 1.2
+POLL_SECONDS = 0.05
+# Metrics where a larger value is better; any other metric regresses when it grows.
+HIGHER_IS_BETTER = ("requests_per_second",)
+
+
+def _rss_mib(pid: int | str = "self", field: str = "VmRSS") -> float:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+# ----------------------------------------------------------------------
+# Pipeline stages, each run in its own subprocess
+# ----------------------------------------------------------------------
+class _Stage:
+    """Collect the metrics of one stage: ``with stage.timed("name"):`` records ``name_seconds``."""
+
+    def __init__(self) -> None:
+        self.result: Dict[str, Any] = {}
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        yield
+        self.result[f"{name}_seconds"] = round(time.perf_counter() - start, 4)
+
+    def start(self) -> None:
+        self.result["rss_mib"] = round(_rss_mib(), 1)
+
+    def finish(self) -> Dict[str, Any]:
+        self.result["peak_mib"] = round(_peak_rss_mib(), 1)
+        return self.result
+
+
+def _run_stage(name: str, workdir: Path) -> Dict[str, Any]:
+    # pylint: disable=import-outside-toplevel
+    import pandas as pd
+    from scipy import sparse
+
+    from artifacts import load_artifact
+    from catalog_loader import load_catalog_snapshot
+    from models import ServiceSettings
+    from neighbor_builder import build_feature_matrix, compute_neighbor_rows, save_neighbors
+    from ratings_loader import load_ratings
+    from train_model import _compute_user_recommendations, _prepare_ratings, _train_model, _write_payload
+
+    settings = ServiceSettings()
+    stage = _Stage()
+
+    if name == "catalog_fetch":
+        stage.start()
+        with stage.timed("fetch"):
+            catalog = load_catalog_snapshot(settings)
+        stage.finish()
+        catalog.to_frame().to_pickle(workdir / "catalog.pkl")
+        stage.result["products"] = len(catalog)
+
+    elif name == "ratings_fetch":
+        stage.start()
+        with stage.timed("fetch"):
+            ratings = load_ratings(settings)
+        stage.finish()
+        ratings.to_pickle(workdir / "ratings.pkl")
+        stage.result["ratings"] = len(ratings)
+
+    elif name == "feature_matrix":
+        frame = pd.read_pickle(workdir / "catalog.pkl")
+        stage.start()
+        with stage.timed("build"):
+            matrix = build_feature_matrix(frame)
+        stage.finish()
+        sparse.save_npz(workdir / "features.npz", matrix, compressed=False)
+        stage.result.update(rows=matrix.shape[0], columns=matrix.shape[1], nnz=int(matrix.nnz))
+
+    elif name == "neighbors":
+        ids = pd.read_pickle(workdir / "catalog.pkl")["id"].astype(str).tolist()
+        matrix = sparse.load_npz(workdir / "features.npz").tocsr()
+        stage.start()
+        with stage.timed("compute"):
+            rows = compute_neighbor_rows(
+                matrix, block_size=settings.neighbors_block_size, workers=settings.neighbors_workers
+            )
+        with stage.timed("save"):
+            save_neighbors(ids, rows, Path(settings.fallback_neighbors_path))
+        stage.finish()
+
+    elif name == "recommendations":
+        ratings = pd.read_pickle(workdir / "ratings.pkl")
+        product_ids = sorted(pd.read_pickle(workdir / "catalog.pkl")["id"].astype(str).unique())
+        stage.start()
+        with stage.timed("fit"):
+            model = _train_model(_prepare_ratings(ratings), settings)
+        with stage.timed("score"):
+            recommendations = _compute_user_recommendations(model, ratings, product_ids)
+        with stage.timed("save"):
+            _write_payload(Path(settings.recommendations_output_path), recommendations, "svd", "binary")
+        stage.finish()
+        stage.result.update(engine=settings.training_engine, users=len(recommendations))
+
+    elif name == "artifact_load":
+        stage.start()
+        for artifact, path in (
+            ("neighbors", settings.fallback_neighbors_path),
+            ("recommendations", settings.recommendations_output_path),
+        ):
+            with stage.timed(f"{artifact}_load"):
+                loaded = load_artifact(Path(path))
+            keys = [key.decode("utf-8") for key in loaded.keys[: 10_000].tolist()]
+            with stage.timed(f"{artifact}_lookup_10k"):
+                for key in keys:
+                    loaded.get(key, 20)
+        stage.finish()
+
+    else:
+        raise SystemExit(f"Unknown stage {name!r}")
+    return stage.result
+
+
+def _run_child(stage: str, workdir: Path, env: Dict[str, str]) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--child", stage, "--workdir", str(workdir)],
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# ----------------------------------------------------------------------
+# Serving
+# ----------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _requests(endpoint: str, count: int, products: List[str], users: List[str], rng) -> List[Dict[str, Any]]:
+    def pick(ids: List[str], size: int) -> List[str]:
+        return [ids[(idx - 1) % len(ids)] for idx in rng.zipf(ZIPF_EXPONENT, size)]
+
+    if endpoint == "similar":
+        return [{"url": f"/recs/similar?product_id={pid}&limit=20"} for pid in pick(products, count)]
+    if endpoint == "personalized":
+        return [{"url": f"/recs/personalized?user_id={uid}&limit=20"} for uid in pick(users, count)]
+    if endpoint == "popular":
+        return [{"url": "/recs/popular?limit=20"}] * count
+    viewed = pick(products, count * 3)
+    return [
+        {"url": "/recs/personal?limit=20", "json": {"user_id": uid, "viewed": viewed[3 * idx : 3 * idx + 3]}}
+        for idx, uid in enumerate(pick(users, count))
+    ]
+
+
+async def _drive(base_url: str, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    import httpx  # pylint: disable=import-outside-toplevel
+
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(requests)
+
+    async def worker(client) -> None:
+        nonlocal errors
+        for request in pending:
+            start = time.perf_counter()
+            if "json" in request:
+                response = await client.post(request["url"], json=request["json"])
+            else:
+                response = await client.get(request["url"])
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    milliseconds = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 3),
+        "p95_ms": round(float(np.percentile(milliseconds, 95)), 3),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 3),
+    }
+
+
+def _serve(env: Dict[str, str], workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx  # pylint: disable=import-outside-toplevel
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    products = pd.read_pickle(workdir / "catalog.pkl")["id"].astype(str).tolist()
+    users = sorted(pd.read_pickle(workdir / "ratings.pkl")["user_id"].astype(str).unique())
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f"uvicorn exited with code {process.returncode}")
+            try:
+                artifacts = httpx.get(f"{base_url}/artifacts", timeout=1).json()
+                if (artifacts.get("recommendations") or {}).get("size"):
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() - started > args.timeout:
+                raise SystemExit("Timed out waiting for uvicorn")
+            time.sleep(POLL_SECONDS)
+        result: Dict[str, Any] = {"startup_seconds": round(time.perf_counter() - started, 3)}
+        result["rss_mib"] = round(_rss_mib(process.pid), 1)
+        rng = np.random.default_rng(args.seed)
+        for endpoint in ENDPOINTS:
+            requests = _requests(endpoint, args.requests, products, users, rng)
+            # A short warm-up so that the first requests do not pay for imports and page faults.
+            asyncio.run(_drive(base_url, requests[: max(1, len(requests) // 20)], args.concurrency))
+            result[endpoint] = asyncio.run(_drive(base_url, requests, args.concurrency))
+        result["peak_mib"] = round(_rss_mib(process.pid, "VmHWM"), 1)
+        return result
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+# ----------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------
+def _git(*command: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *command], check=True, capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    import scipy  # pylint: disable=import-outside-toplevel
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Relative change of every numeric metric present in both results."""
+
+    before, after = _flatten(baseline["results"]), _flatten(current["results"])
+    rows = []
+    for name in before.keys() & after.keys():
+        if not before[name]:
+            continue
+        change = (after[name] - before[name]) / abs(before[name])
+        better = change > 0 if name.endswith(HIGHER_IS_BETTER) else change < 0
+        rows.append({"metric": name, "baseline": before[name], "current": after[name], "change": change, "better": better})
+    return sorted(rows, key=lambda row: row["metric"])
+
+
+def _regressed(row: Dict[str, Any], threshold: float) -> bool:
+    timing = row["metric"].endswith(("_seconds", "_ms", *HIGHER_IS_BETTER))
+    return timing and not row["better"] and abs(row["change"]) > threshold
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--products", type=int, help="Override the products of --scale.")
+    parser.add_argument("--users", type=int, help="Override the users of --scale.")
+    parser.add_argument("--ratings", type=int, help="Override the ratings of --scale.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--requests", type=int, default=2_000, help="Requests per endpoint in the serving stage.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per pipeline stage; the fastest is kept.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", type=Path, help="Earlier results to compare against.")
+    parser.add_argument(
+        "--fail-above",
+        type=float,
+        help="With --compare, exit with 1 when a timing got worse by more than this fraction.",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_stage(args.child, args.workdir)))
+        return
+
+    parameters = {**SCALES[args.scale], "scale": args.scale}
+    for key in ("products", "users", "ratings"):
+        if getattr(args, key) is not None:
+            parameters[key] = getattr(args, key)
+    parameters.update(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        candidates=CANDIDATES,
+    )
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="suite-") as directory:
+        workdir = Path(directory)
+        start = time.perf_counter()
+        items = make_catalog_items(parameters["products"], seed=args.seed)
+        ratings = make_ratings_frame(
+            parameters["ratings"], parameters["users"], parameters["products"], candidates=CANDIDATES, seed=args.seed
+        )
+        write_ratings_export(workdir / "export.json", ratings)
+        del ratings
+        print(f"Generated the synthetic data in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+        with CatalogServer(items, workdir / "export.json") as server:
+            del items
+            env = {
+                **os.environ,
+                "CATALOG_API_BASE_URL": server.base_url,
+                "RATINGS_API_BASE_URL": server.base_url,
+                "CATALOG_SNAPSHOT_PATH": str(workdir / "catalog_snapshot.json"),
+                "NEIGHBORS_PATH": str(workdir / "product_neighbors.bin"),
+                "RECOMMENDATIONS_OUTPUT_PATH": str(workdir / "user_recommendations.bin"),
+                "POPULARITY_PATH": str(workdir / "product_popularity.bin"),
+                "MODEL_REGISTRY_DIR": str(workdir / "registry"),
+                "JOB_METRICS_DIR": str(workdir / "metrics"),
+            }
+            env.pop("DATABASE_URL", None)
+            for stage in STAGES:
+                if stage not in args.stages:
+                    continue
+                print(f"Running {stage}...", file=sys.stderr)
+                if stage == "serving":
+                    results[stage] = _serve(env, workdir, args)
+                    continue
+                runs = [_run_child(stage, workdir, env) for _ in range(args.repeat)]
+                # The fastest of the repeats is the least disturbed by the rest of the machine.
+                results[stage] = {
+                    key: min(run[key] for run in runs) if key.endswith("_seconds") else value
+                    for key, value in runs[-1].items()
+                }
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--", ".")),
+        "environment": _environment(),
+        "parameters": parameters,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(body + "\n", encoding="utf-8")
+    else:
+        print(body)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if baseline.get("parameters") != parameters:
+            print("Warning: the baseline was run with different parameters", file=sys.stderr)
+        rows = compare(baseline, report)
+        print(f"{'metric':<48} {'baseline':>12} {'current':>12} {'change':>8}", file=sys.stderr)
+        for row in rows:
+            marker = "" if row["better"] or abs(row["change"]) < 0.05 else "  <-"
+            print(
+                f"{row['metric']:<48} {row['baseline']:>12.4g} {row['current']:>12.4g} {row['change']:>+8.1%}{marker}",
+                file=sys.stderr,
+            )
+        if args.fail_above is not None and any(_regressed(row, args.fail_above) for row in rows):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare a full SVD refit with a warm-start update after new ratings arrive.
+
+Usage::
+
+    python -m benchmarks.svd_incremental --ratings 1000000 --delta 0.01 0.05
+
+Synthetic latent-factor ratings are split into a base set and a delta that
+contains new ratings of existing users, new users and new products. A model
+fitted on the base set is then brought up to date once with a full refit and
+once with an incremental run (``SVD_INCREMENTAL``). Both are evaluated on the
+same held-out split; ``stale`` is the base model without any update.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import make_ratings_frame
+from factor_model import holdout_mask
+from models import ServiceSettings
+from train_model import _fit_factors, _previous_factors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--delta", type=float, nargs="+", default=[0.01, 0.05])
+    args = parser.parse_args()
+
+    settings = ServiceSettings()
+    frame = make_ratings_frame(args.ratings, args.users, args.products)
+    held_out = holdout_mask(frame, settings.svd_holdout_fraction)
+    train_frame, test_frame = frame[~held_out], frame[held_out]
+    rng = np.random.default_rng(1)
+
+    print(
+        f"{len(train_frame)} training and {len(test_frame)} held-out ratings, "
+        f"{settings.svd_factors} factors, {settings.svd_incremental_epochs} incremental epochs"
+    )
+    print(f"{'delta':>6} {'new ratings':>11} {'mode':>12} {'fit s':>8} {'RMSE':>7} {'RMSE new users':>15}")
+    for delta in args.delta:
+        # A share of the users and products only appear in the delta, the rest
+        # of the delta are new ratings of known users and products.
+        new_users = frame["user_id"].isin(
+            frame["user_id"].drop_duplicates().sample(frac=delta / 2, random_state=2)
+        ).to_numpy()
+        new_products = frame["product_id"].isin(
+            frame["product_id"].drop_duplicates().sample(frac=delta / 2, random_state=3)
+        ).to_numpy()
+        in_delta = new_users | new_products | (rng.random(len(frame)) < delta / 2)
+        base = train_frame[~in_delta[~held_out]]
+        new_user_test = test_frame[new_users[held_out]]
+
+        with tempfile.TemporaryDirectory(prefix="svd-") as directory:
+            path = Path(directory) / "svd_factors.npz"
+            stale, _ = _fit_factors(base, settings, None, "stale baseline")
+            stale.save(path)
+
+            results = [("stale", 0.0, stale)]
+            start = time.perf_counter()
+            full, _ = _fit_factors(train_frame, settings, None, "benchmark")
+            results.append(("full", time.perf_counter() - start, full))
+            start = time.perf_counter()
+            warm, _ = _fit_factors(train_frame, settings, *_previous_factors(settings, path, incremental=True))
+            results.append(("incremental", time.perf_counter() - start, warm))
+
+        for mode, seconds, model in results:
+            print(
+                f"{delta:>6.2f} {len(train_frame) - len(base):>11} {mode:>12} {seconds:>8.2f} "
+                f"{model.rmse(test_frame):>7.4f} {model.rmse(new_user_test):>15.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
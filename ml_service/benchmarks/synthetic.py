@@ -0,0 +1,131 @@
+"""Synthetic catalog generators shared by the benchmarks."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+_ADJECTIVES = [
+    "classic", "slim", "relaxed", "cropped", "oversized", "vintage", "organic",
+    "striped", "quilted", "waterproof", "linen", "wool", "denim", "leather",
+    "knitted", "padded", "casual", "formal", "sport", "summer",
+]
+_ITEMS = [
+    "shirt", "jacket", "dress", "skirt", "jeans", "hoodie", "sweater", "coat",
+    "shorts", "blazer", "t-shirt", "trousers", "cardigan", "parka", "polo",
+]
+_COLORS = ["black", "white", "navy", "beige", "olive", "red", "grey", "blue", "pink"]
+
+
+def make_catalog_frame(
+    n_products: int,
+    n_brands: int = 200,
+    n_categories: int = 40,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Build a catalog DataFrame shaped like the upstream product payload."""
+
+    rng = np.random.default_rng(seed)
+    adjectives = np.asarray(_ADJECTIVES, dtype=object)
+    items = np.asarray(_ITEMS, dtype=object)
+    colors = np.asarray(_COLORS, dtype=object)
+
+    adjective = adjectives[rng.integers(0, adjectives.size, n_products)]
+    item = items[rng.integers(0, items.size, n_products)]
+    color = colors[rng.integers(0, colors.size, n_products)]
+    extra = adjectives[rng.integers(0, adjectives.size, n_products)]
+
+    names = adjective + " " + color + " " + item
+    descriptions = names + " made of " + extra + " fabric"
+
+    return pd.DataFrame(
+        {
+            "id": [f"prod-{idx:07d}" for idx in range(n_products)],
+            "name": names,
+            "description": descriptions,
+            "brand": [f"brand-{idx}" for idx in rng.integers(0, n_brands, n_products)],
+            "category_id": [f"cat-{idx}" for idx in rng.integers(0, n_categories, n_products)],
+            "price": np.round(rng.lognormal(mean=3.5, sigma=0.6, size=n_products), 2),
+        }
+    )
+
+
+def make_catalog_items(n_products: int, seed: int = 0) -> list[dict]:
+    """Build product dicts with the full field set returned by the gateway's ``/products``."""
+
+    frame = make_catalog_frame(n_products, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    genders = np.asarray(["men", "women", "unisex"], dtype=object)[rng.integers(0, 3, n_products)]
+    ratings = rng.integers(1, 6, (n_products, 2))
+    items = []
+    for position, row in enumerate(frame.itertuples(index=False)):
+        items.append(
+            {
+                "id": row.id,
+                "article": f"A{position:08d}",
+                "category_id": row.category_id,
+                "name": row.name,
+                "description": row.description,
+                "price": float(row.price),
+                "price_string": f"{row.price:.2f} EUR",
+                "is_bestseller": bool(position % 7 == 0),
+                "imageUrls": [f"/images/{row.id}-{idx}.jpg" for idx in range(3)],
+                "composition": [{"material": "cotton", "percentage": 80}, {"material": "elastane", "percentage": 20}],
+                "careInstructions": ["Machine wash at 30C", "Do not tumble dry"],
+                "features": [{"key": "fit", "value": "regular"}],
+                "reviews": [
+                    {"userId": int(user), "rating": int(rating), "text": row.name}
+                    for user, rating in enumerate(ratings[position], start=1)
+                ],
+                "gender": genders[position],
+                "brand": row.brand,
+            }
+        )
+    return items
+
+
+def make_ratings_frame(
+    n_ratings: int,
+    n_users: int,
+    n_products: int,
+    n_factors: int = 10,
+    candidates: int = 1,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Build 1-5 star ratings generated from latent user and product factors.
+
+    Unlike uniformly random ratings they can be predicted, so the RMSE of a
+    trained model is meaningful. With ``candidates > 1`` every rating goes to
+    the product the user likes best out of that many popularity-sampled
+    ones, so users rate what they like and ranking metrics such as
+    precision@k become meaningful too. Duplicate ``(user, product)`` pairs
+    are dropped, so the frame may be slightly shorter than ``n_ratings``.
+    """
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0.0, 1.0 / np.sqrt(n_factors), (n_users, n_factors))
+    product_factors = rng.normal(0.0, 1.0 / np.sqrt(n_factors), (n_products, n_factors))
+    user_biases = rng.normal(0.0, 0.4, n_users)
+    product_biases = rng.normal(0.0, 0.4, n_products)
+
+    users = rng.integers(0, n_users, n_ratings)
+    # Popular products get most of the ratings, as in a real shop.
+    popularity = 1.0 / np.arange(1, n_products + 1) ** 0.7
+    products = rng.choice(rng.permutation(n_products), (n_ratings, candidates), p=popularity / popularity.sum())
+    affinity = product_biases[products] + np.einsum("ijk,ik->ij", product_factors[products], user_factors[users])
+    best = np.argmax(affinity, axis=1)
+    products = products[np.arange(n_ratings), best]
+    values = (
+        3.5
+        + user_biases[users]
+        + affinity[np.arange(n_ratings), best]
+        + rng.normal(0.0, 0.5, n_ratings)
+    )
+    frame = pd.DataFrame(
+        {
+            "user_id": [str(user) for user in users + 1],
+            "product_id": [f"prod-{product:07d}" for product in products],
+            "rating": np.clip(np.round(values), 1, 5),
+        }
+    )
+    return frame.drop_duplicates(["user_id", "product_id"], keep="last").reset_index(drop=True)
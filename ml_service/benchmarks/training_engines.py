@@ -0,0 +1,116 @@
+"""Compare the training engines on fit time, memory, RMSE and precision@20.
+
+Usage::
+
+    python -m benchmarks.training_engines --ratings 1000000 --engines surprise als
+
+Every engine fits the same synthetic latent-factor ratings, where users
+rate the products they like, in a fresh
+subprocess, so its peak RSS is measured in isolation; ``fit MiB`` is the
+peak minus the RSS before fitting. RMSE is measured on the
+``SVD_HOLDOUT_FRACTION`` split. precision@20 counts held-out ratings of 4 or
+more among the top 20 products recommended to a user, out of the products
+the user has not rated in the training split, averaged over the users with
+such a rating. ``--workers`` sets ``ALS_WORKERS`` for the als engine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.ratings_streaming import _peak_rss_mib
+from benchmarks.synthetic import make_ratings_frame
+
+TOP_N = 20
+RELEVANT_RATING = 4
+# Users rate the best liked of this many products, see ``make_ratings_frame``.
+CANDIDATES = 10
+
+
+def _run_child(engine: str, ratings_path: str) -> None:
+    # pylint: disable=import-outside-toplevel
+    import pandas as pd
+
+    from factor_model import holdout_mask
+    from models import ServiceSettings
+    from train_model import TRAINING_ENGINES, _compute_user_recommendations
+
+    settings = ServiceSettings(training_engine=engine)
+    frame = pd.read_pickle(ratings_path)
+    held_out = holdout_mask(frame, settings.svd_holdout_fraction)
+    train_frame, test_frame = frame[~held_out], frame[held_out]
+
+    baseline = _peak_rss_mib()
+    start = time.perf_counter()
+    model = TRAINING_ENGINES[engine](train_frame, settings)
+    seconds = time.perf_counter() - start
+    peak = _peak_rss_mib()
+
+    product_ids = sorted(frame["product_id"].unique())
+    recommendations = _compute_user_recommendations(model, train_frame, product_ids)
+    relevant = test_frame[test_frame["rating"] >= RELEVANT_RATING].groupby("user_id")["product_id"].agg(set)
+    precisions = []
+    for user_id, products_rated in relevant.items():
+        indices, _ = recommendations.lookup(user_id)
+        recommended = {product_ids[index] for index in indices[:TOP_N].tolist()}
+        precisions.append(len(recommended & products_rated) / TOP_N)
+
+    print(
+        json.dumps(
+            {
+                "seconds": seconds,
+                "fit_mib": peak - baseline,
+                "rmse": model.rmse(test_frame),
+                "precision": float(np.mean(precisions)) if precisions else 0.0,
+            }
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--engines", nargs="+", default=["surprise", "als"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.child, args.path)
+        return
+
+    print(f"{'engine':>10} {'workers':>7} {'fit s':>8} {'fit MiB':>8} {'RMSE':>7} {'precision@20':>12}")
+    with tempfile.TemporaryDirectory(prefix="engines-") as directory:
+        # Generated once in the parent: the generator's peak would hide the fit's.
+        path = Path(directory) / "ratings.pkl"
+        make_ratings_frame(args.ratings, args.users, args.products, candidates=CANDIDATES).to_pickle(path)
+        for engine in args.engines:
+            for workers in args.workers if engine == "als" else [0]:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.training_engines", "--child", engine, "--path", str(path)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                    env={**os.environ, "ALS_WORKERS": str(workers)},
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(
+                    f"{engine:>10} {workers or os.cpu_count():>7} {result['seconds']:>8.2f} "
+                    f"{result['fit_mib']:>8.1f} {result['rmse']:>7.4f} {result['precision']:>12.4f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Private memory of each API worker as the served artifacts grow.
+
+Usage::
+
+    python -m benchmarks.worker_memory --workers 4 --products 5000 50000 200000
+    python -m benchmarks.worker_memory --workers 4 --private
+
+For every catalog size, writes a synthetic catalog snapshot, popularity
+artifact and factor model, starts ``uvicorn --workers N`` on them, sends
+popular and filtered personalised requests until every worker has served
+some, and reads ``/proc/<pid>/smaps_rollup`` of each worker: ``rss`` counts
+the mapped artifact pages, ``pss`` splits shared pages between the processes
+mapping them, ``uss`` also counts mapped file pages only this worker has
+touched as private, and ``anon`` is the heap memory nothing can share. With
+shared artifacts ``anon`` should stay flat while the artifacts grow;
+``--private`` disables ``SHARED_ARTIFACTS_DIR`` for comparison.
+``--max-growth`` exits with 1 when the mean ``anon`` of the largest size
+exceeds that of the smallest by more than the given fraction.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from artifacts import save_artifact
+from benchmarks.synthetic import make_catalog_items, make_ratings_frame
+from catalog_loader import ALL_PAGE, CatalogSnapshot
+from factor_model import FactorModel
+from popularity import compute_rating_popularity
+
+POLL_SECONDS = 0.2
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str):
+    # A new connection per request, so that the requests spread over the workers.
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, ConnectionError, TimeoutError, ValueError):
+        return None
+
+
+def _children(pid: int) -> List[int]:
+    pids = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children = (task / "children").read_text(encoding="ascii").split()
+        pids.extend(int(child) for child in children)
+    return pids
+
+
+def _workers(pid: int) -> List[int]:
+    # uvicorn spawns its workers with multiprocessing; skip its helper processes.
+    workers = []
+    for child in _children(pid):
+        try:
+            command = Path(f"/proc/{child}/cmdline").read_bytes()
+        except OSError:
+            continue
+        if b"spawn_main" in command:
+            workers.append(child)
+    return workers or [pid]
+
+
+def _memory_mib(pid: int) -> Dict[str, float]:
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0) / 1024,
+        "pss": fields.get("Pss", 0) / 1024,
+        "uss": (fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024,
+        "anon": fields.get("Anonymous", 0) / 1024,
+    }
+
+
+def _write_artifacts(directory: Path, products: int, users: int, ratings: int, factors: int) -> List[str]:
+    items = make_catalog_items(products)
+    CatalogSnapshot(source=ALL_PAGE, pages={ALL_PAGE: {"items": items}}, version=1).save(
+        directory / "catalog_snapshot.json"
+    )
+    frame = make_ratings_frame(ratings, users, products)
+    save_artifact(directory / "product_popularity.bin", compute_rating_popularity(frame), "binary")
+    rng = np.random.default_rng(0)
+    user_ids = frame["user_id"].unique().astype(object)
+    item_ids = np.asarray([item["id"] for item in items], dtype=object)
+    model = FactorModel(
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=rng.normal(0.0, 0.1, (user_ids.size, factors)),
+        item_factors=rng.normal(0.0, 0.1, (item_ids.size, factors)),
+        user_biases=rng.normal(0.0, 0.3, user_ids.size),
+        item_biases=rng.normal(0.0, 0.3, item_ids.size),
+        global_mean=3.5,
+        rating_scale=(1.0, 5.0),
+    )
+    model.remember(frame)
+    model.save(directory / "svd_factors.npz")
+    return user_ids[: min(user_ids.size, 1_000)].tolist()
+
+
+def _measure(directory: Path, users: List[str], args: argparse.Namespace) -> Dict[str, float]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {
+        # As in start.sh.
+        "MALLOC_ARENA_MAX": "1",
+        **os.environ,
+        "CATALOG_SNAPSHOT_PATH": str(directory / "catalog_snapshot.json"),
+        "POPULARITY_PATH": str(directory / "product_popularity.bin"),
+        "FACTOR_MODEL_PATH": str(directory / "svd_factors.npz"),
+        "NEIGHBORS_PATH": str(directory / "product_neighbors.bin"),
+        "RECOMMENDATIONS_OUTPUT_PATH": str(directory / "user_recommendations.bin"),
+        "MODEL_REGISTRY_DIR": str(directory / "registry"),
+        "JOB_METRICS_DIR": str(directory / "metrics"),
+        "SHARED_ARTIFACTS_DIR": "" if args.private else str(directory / "shared"),
+        "CATALOG_API_BASE_URL": "http://127.0.0.1:9",
+    }
+    env.pop("DATABASE_URL", None)
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)]
+    command += ["--workers", str(args.workers), "--log-level", "warning"]
+    process = subprocess.Popen(
+        command, env=env, cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        started = time.perf_counter()
+        ready = 0
+        # Requests land on arbitrary workers: wait until enough in a row
+        # report loaded artifacts that every worker has most likely loaded them.
+        while ready < 10 * args.workers:
+            if process.poll() is not None:
+                raise SystemExit(f"uvicorn exited with code {process.returncode}")
+            if time.perf_counter() - started > args.timeout:
+                raise SystemExit("Timed out waiting for the workers to load the artifacts")
+            artifacts = _get(f"{base}/artifacts") or {}
+            if all((artifacts.get(name) or {}).get("size") for name in ("popular", "scorer")):
+                ready += 1
+            else:
+                ready = 0
+                time.sleep(POLL_SECONDS)
+        startup = time.perf_counter() - started
+
+        rng = np.random.default_rng(0)
+        for user_id in rng.choice(users, args.requests):
+            _get(f"{base}/recs/popular?limit=20")
+            _get(f"{base}/recs/personalized?user_id={user_id}&limit=20&category=cat-1&in_stock=true")
+        workers = _workers(process.pid)
+        if len(workers) != args.workers:
+            print(f"Warning: found {len(workers)} workers instead of {args.workers}", file=sys.stderr)
+        memory = [_memory_mib(pid) for pid in workers]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    result = {key: float(np.mean([entry[key] for entry in memory])) for key in ("rss", "pss", "uss", "anon")}
+    result["anon_max"] = max(entry["anon"] for entry in memory)
+    result["startup_seconds"] = startup
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--products", type=int, nargs="+", default=[5_000, 50_000, 200_000])
+    parser.add_argument("--users-per-product", type=float, default=0.4)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--factors", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--private", action="store_true", help="Build the derived artifacts in every worker.")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument(
+        "--max-growth",
+        type=float,
+        help="Exit with 1 when the mean worker heap memory grows by more than this fraction from the smallest size.",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{args.workers} workers, {'private' if args.private else 'shared'} artifacts\n"
+        f"{'products':>9} {'users':>8} {'artifacts MiB':>14} {'rss MiB':>8} {'pss MiB':>8} "
+        f"{'uss MiB':>8} {'anon MiB':>9} {'anon max':>9} {'startup s':>10}"
+    )
+    results = []
+    for products in args.products:
+        users = max(1, int(products * args.users_per_product))
+        with tempfile.TemporaryDirectory(prefix="worker-memory-") as name:
+            directory = Path(name)
+            sample = _write_artifacts(directory, products, users, users * args.ratings_per_user, args.factors)
+            result = _measure(directory, sample, args)
+            shared = directory / "shared"
+            files = [directory / "svd_factors.npz", directory / "product_popularity.bin"]
+            files += list(shared.glob("*.bin")) if shared.exists() else []
+            size = sum(path.stat().st_size for path in files) / 2**20
+        results.append(result)
+        print(
+            f"{products:>9} {users:>8} {size:>14.1f} {result['rss']:>8.1f} {result['pss']:>8.1f} "
+            f"{result['uss']:>8.1f} {result['anon']:>9.1f} {result['anon_max']:>9.1f} {result['startup_seconds']:>10.1f}"
+        )
+
+    growth = results[-1]["anon"] / results[0]["anon"] - 1.0
+    print(f"Mean worker heap memory grew by {growth:+.1%} from {args.products[0]} to {args.products[-1]} products")
+    if args.max_growth is not None and growth > args.max_growth:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
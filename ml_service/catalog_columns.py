@@ -0,0 +1,252 @@
+"""Columnar in-memory representation of the product catalog.
+
+The loader, the neighbour builder and the trainer only need a handful of
+product attributes, so instead of one Pydantic model per product the
+catalog is kept as parallel arrays:
+
+* ``ids``, ``names``, ``descriptions`` - object arrays of ``str``
+* ``brand``, ``category_id``, ``category`` - ``int32`` codes into interned
+  value arrays (``-1`` when missing)
+* ``prices`` - ``float64`` with ``NaN`` for missing or non-numeric prices
+* ``in_stock`` - ``bool``; products without stock information count as in
+  stock
+* every other upstream field is kept as one compact JSON blob per product
+  and only decoded when :class:`~models.Product` models are built at the
+  API boundary. Fields a column reproduces exactly are left out of the blob
+  and restored from the column.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from models import Product, parse_product
+
+logger = logging.getLogger(__name__)
+
+
+def _first(item: Dict[str, Any], keys: Sequence[str]) -> Any:
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return None
+
+
+def _in_stock(item: Dict[str, Any]) -> bool:
+    for key in ("in_stock", "inStock", "available"):
+        if item.get(key) is not None:
+            return bool(item[key])
+    for key in ("stock", "quantity"):
+        value = item.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value > 0
+    return True
+
+
+def _column_fields(item: Dict[str, Any]) -> Set[str]:
+    """Fields of ``item`` that its columns hold exactly, so its JSON blob can omit them.
+
+    :meth:`ColumnarCatalog.to_products` restores a field only when it is
+    missing from the blob, which these rules keep unambiguous: ``name`` is
+    only dropped without a ``title`` that could have filled the column, and
+    empty strings stay in the blob.
+    """
+
+    fields = {key for key in ("id", "brand", "category_id") if isinstance(item.get(key), str)}
+    if "title" not in item and isinstance(item.get("name"), str) and item["name"]:
+        fields.add("name")
+    if isinstance(item.get("description"), str) and item["description"]:
+        fields.add("description")
+    price = item.get("price")
+    if isinstance(price, (int, float)) and not isinstance(price, bool) and math.isfinite(price):
+        fields.add("price")
+    return fields
+
+
+class InternedColumn:
+    """Dictionary-encoded column: ``values[codes[i]]`` or ``None`` where ``codes[i] == -1``."""
+
+    def __init__(self, codes: np.ndarray, values: np.ndarray) -> None:
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def from_values(cls, raw: Sequence[Any]) -> "InternedColumn":
+        codes, uniques = pd.factorize(pd.Series(raw, dtype=object), use_na_sentinel=True)
+        values = np.asarray([str(value) for value in uniques], dtype=object)
+        return cls(codes.astype(np.int32), values)
+
+    def take(self, positions: np.ndarray) -> "InternedColumn":
+        return InternedColumn(self.codes[positions], self.values)
+
+    def decode(self) -> np.ndarray:
+        decoded = np.empty(self.codes.size, dtype=object)
+        present = self.codes >= 0
+        decoded[present] = self.values[self.codes[present]]
+        return decoded
+
+
+class ColumnarCatalog:
+    """Read-only, array-backed product catalog."""
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        names: np.ndarray,
+        descriptions: np.ndarray,
+        brand: InternedColumn,
+        category_id: InternedColumn,
+        category: InternedColumn,
+        prices: np.ndarray,
+        extras: List[bytes],
+        source: Optional[str] = None,
+        in_stock: Optional[np.ndarray] = None,
+    ) -> None:
+        self.ids = ids
+        self.names = names
+        self.descriptions = descriptions
+        self.brand = brand
+        self.category_id = category_id
+        self.category = category
+        self.prices = prices
+        self.extras = extras
+        self.source = source
+        self.in_stock = in_stock if in_stock is not None else np.ones(ids.size, dtype=bool)
+
+    @classmethod
+    def from_items(cls, items: Iterable[Dict[str, Any]], source: Optional[str] = None) -> "ColumnarCatalog":
+        """Build the catalog from upstream product dicts; items without an id are skipped."""
+
+        builder = CatalogBuilder()
+        builder.extend(items)
+        return builder.build(source)
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
+
+    def take(self, positions: np.ndarray) -> "ColumnarCatalog":
+        """Return the products at ``positions`` as a new catalog."""
+
+        positions = np.asarray(positions, dtype=np.intp)
+        return ColumnarCatalog(
+            ids=self.ids[positions],
+            names=self.names[positions],
+            descriptions=self.descriptions[positions],
+            brand=self.brand.take(positions),
+            category_id=self.category_id.take(positions),
+            category=self.category.take(positions),
+            prices=self.prices[positions],
+            extras=[self.extras[position] for position in positions.tolist()],
+            source=self.source,
+            in_stock=self.in_stock[positions],
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Columns consumed by :class:`~features.ProductFeaturizer`."""
+
+        frame = pd.DataFrame(
+            {
+                "id": self.ids,
+                "name": self.names,
+                "description": self.descriptions,
+                "brand": self.brand.decode(),
+                "category": self.category.decode(),
+                "category_id": self.category_id.decode(),
+                "price": self.prices,
+            }
+        )
+        if frame.empty:
+            raise ValueError("No products available for feature generation")
+        return frame
+
+    def to_products(self) -> List[Product]:
+        """Materialise Pydantic models; only meant for the HTTP layer."""
+
+        brands = self.brand.decode()
+        category_ids = self.category_id.decode()
+        products: List[Product] = []
+        for row, blob in enumerate(self.extras):
+            item = json.loads(blob)
+            restored: Dict[str, Any] = {}
+            if "id" not in item:
+                restored["id"] = self.ids[row]
+            if "name" not in item and "title" not in item and self.names[row]:
+                restored["name"] = self.names[row]
+            if "description" not in item and self.descriptions[row]:
+                restored["description"] = self.descriptions[row]
+            if "brand" not in item and brands[row] is not None:
+                restored["brand"] = brands[row]
+            if "category_id" not in item and category_ids[row] is not None:
+                restored["category_id"] = category_ids[row]
+            if "price" not in item and not math.isnan(self.prices[row]):
+                restored["price"] = float(self.prices[row])
+            products.append(parse_product({**restored, **item}))
+        return products
+
+
+class CatalogBuilder:
+    """Append upstream product dicts one at a time and build a :class:`ColumnarCatalog`.
+
+    Only the column values are kept per item, so a streamed catalog never
+    exists as a list of dicts.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.brands: List[Any] = []
+        self.category_ids: List[Any] = []
+        self.categories: List[Any] = []
+        self.prices: List[Any] = []
+        self.in_stock: List[bool] = []
+        self.extras: List[bytes] = []
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, item: Any) -> None:
+        if not isinstance(item, dict) or item.get("id") is None:
+            self.skipped += 1
+            return
+        self.ids.append(str(item["id"]))
+        self.names.append(str(_first(item, ("name", "title")) or ""))
+        self.descriptions.append(str(item.get("description") or ""))
+        self.brands.append(item.get("brand"))
+        self.category_ids.append(item.get("category_id"))
+        # Text features describe the category by the first available field.
+        self.categories.append(_first(item, ("category", "category_id", "categoryId", "gender")))
+        self.prices.append(item.get("price"))
+        self.in_stock.append(_in_stock(item))
+        held = _column_fields(item)
+        extra = {key: value for key, value in item.items() if key not in held}
+        self.extras.append(json.dumps(extra, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+
+    def extend(self, items: Iterable[Any]) -> None:
+        for item in items:
+            self.add(item)
+
+    def build(self, source: Optional[str] = None) -> ColumnarCatalog:
+        if self.skipped:
+            logger.warning("Skipped %s catalog items without an id", self.skipped)
+
+        return ColumnarCatalog(
+            ids=np.asarray(self.ids, dtype=object),
+            names=np.asarray(self.names, dtype=object),
+            descriptions=np.asarray(self.descriptions, dtype=object),
+            brand=InternedColumn.from_values(self.brands),
+            category_id=InternedColumn.from_values(self.category_ids),
+            category=InternedColumn.from_values(self.categories),
+            prices=pd.to_numeric(pd.Series(self.prices, dtype=object), errors="coerce").to_numpy(dtype=np.float64),
+            extras=self.extras,
+            source=source,
+            in_stock=np.asarray(self.in_stock, dtype=bool),
+        )
@@ -1,24 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Iterable, List, Optional, Sequence, Tuple
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
-import requests
-from requests import Session
+import httpx
 
-from models import Catalog, Product, ServiceSettings, build_catalog, parse_product
+from catalog_columns import CatalogBuilder, ColumnarCatalog
+from metrics import time_catalog_fetch
+from models import ServiceSettings
+from streaming import iter_catalog_items
 
 logger = logging.getLogger(__name__)
 
+ALL_PAGE = "all"
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_BACKOFF_SECONDS = 0.5
+
 
 class CatalogLoaderError(RuntimeError):
     """Raised when the catalog cannot be retrieved from the upstream API."""
 
 
-def _ensure_session(session: Optional[Session] = None) -> Session:
-    return session or requests.Session()
-
-
 def _normalize_payload(payload: object) -> Iterable[dict]:
     if isinstance(payload, dict):
         products_obj = payload.get("products")
@@ -30,99 +40,531 @@ def _normalize_payload(payload: object) -> Iterable[dict]:
     raise CatalogLoaderError("Unexpected response format received from catalog API")
 
 
-def _fetch_all_endpoint(session: Session, base_url: str, timeout: float) -> Tuple[List[Product], Optional[object]]:
+def _total_pages(payload: object) -> Optional[object]:
+    if isinstance(payload, dict):
+        return payload.get("totalPages") or payload.get("total_pages")
+    return None
+
+
+def _conditional_headers(cached: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+
+def _page_entry(response: httpx.Response, items: List[dict], total_pages: Optional[object]) -> Dict[str, Any]:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "total_pages": total_pages,
+        "items": items,
+    }
+
+
+def _make_client(settings: ServiceSettings) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.catalog_concurrency,
+        max_keepalive_connections=settings.catalog_concurrency,
+    )
+    return httpx.AsyncClient(timeout=settings.request_timeout, limits=limits)
+
+
+async def _get_with_retry(
+    client: httpx.AsyncClient,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    max_retries: int,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    stream: bool = False,
+) -> httpx.Response:
+    """GET ``url``, retrying 5xx/429 responses and transport errors with exponential backoff.
+
+    With ``stream`` the body is not read; the caller must close the response.
+    """
+
+    attempt = 0
+    while True:
+        error: Optional[httpx.TransportError] = None
+        response: Optional[httpx.Response] = None
+        async with semaphore:
+            try:
+                request = client.build_request("GET", url, params=params, headers=headers)
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as exc:
+                error = exc
+
+        if response is not None and (response.status_code not in RETRY_STATUSES or attempt >= max_retries):
+            return response
+        if response is not None:
+            await response.aclose()
+        if error is not None and attempt >= max_retries:
+            raise error
+
+        # The slot is released while sleeping so other pages keep downloading.
+        delay = RETRY_BACKOFF_SECONDS * 2**attempt + random.uniform(0, RETRY_BACKOFF_SECONDS)
+        reason = error if error is not None else f"status {response.status_code}"  # type: ignore[union-attr]
+        logger.warning("Request to %s (params %s) failed (%s); retrying in %.2f seconds", url, params, reason, delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _fetch_all_endpoint(
+    client: httpx.AsyncClient,
+    base_url: str,
+    settings: ServiceSettings,
+    semaphore: asyncio.Semaphore,
+    cached: Optional[Dict[str, Any]] = None,
+    builder: Optional[CatalogBuilder] = None,
+) -> Optional[Dict[str, Any]]:
+    """Fetch ``/api/products/all``; returns ``None`` when the endpoint does not exist.
+
+    A ``304`` answer to the conditional request returns ``cached`` itself.
+    With ``builder`` the products are added to it as they are parsed and the
+    returned entry carries no items.
+    """
+
     url = f"{base_url}/api/products/all"
     logger.debug("Attempting to load catalog from %s", url)
-    response = session.get(url, timeout=timeout)
+    response = await _get_with_retry(
+        client,
+        url,
+        semaphore,
+        settings.catalog_max_retries,
+        headers=_conditional_headers(cached),
+        stream=settings.json_streaming,
+    )
 
-    if response.status_code == 404:
-        logger.info("Endpoint %s returned 404, falling back to paginated loading", url)
-        return [], None
+    try:
+        if response.status_code == 304 and cached:
+            return cached
+        if response.status_code == 404:
+            logger.info("Endpoint %s returned 404, falling back to paginated loading", url)
+            return None
 
-    response.raise_for_status()
-    payload = response.json()
-    products = [parse_product(item) for item in _normalize_payload(payload)]
-    return products, payload
+        response.raise_for_status()
+        items: List[dict] = []
+        add = builder.add if builder is not None else items.append
+        if settings.json_streaming:
+            # The full catalog can be large: parse it while it downloads
+            # instead of holding the body and the decoded tree at once.
+            try:
+                async for item in iter_catalog_items(response):
+                    add(item)
+            except ValueError as exc:
+                raise CatalogLoaderError("Unexpected response format received from catalog API") from exc
+        else:
+            for item in _normalize_payload(response.json()):
+                add(item)
+        return _page_entry(response, items, None)
+    finally:
+        await response.aclose()
 
 
-def _fetch_paginated(
-    session: Session,
+async def _fetch_page(
+    client: httpx.AsyncClient,
     base_url: str,
-    timeout: float,
-    page_size: int,
-) -> Tuple[List[Product], Optional[object]]:
-    page = 1
-    all_products: List[Product] = []
-    last_payload: Optional[object] = None
-
-    while True:
-        params = {"page": page, "pageSize": page_size}
-        url = f"{base_url}/api/products"
-        logger.debug("Requesting page %s from %s with params %s", page, url, params)
-        response = session.get(url, params=params, timeout=timeout)
-
-        if response.status_code == 404 and page == 1:
-            raise CatalogLoaderError(
-                "The paginated products endpoint '/api/products' was not found."
-            )
-
-        response.raise_for_status()
-        payload = response.json()
-        items = _normalize_payload(payload)
-        batch = [parse_product(item) for item in items]
+    page: int,
+    settings: ServiceSettings,
+    semaphore: asyncio.Semaphore,
+    cached: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    params = {"page": page, "pageSize": settings.page_size}
+    url = f"{base_url}/api/products"
+    logger.debug("Requesting page %s from %s with params %s", page, url, params)
+    response = await _get_with_retry(
+        client, url, semaphore, settings.catalog_max_retries, params=params, headers=_conditional_headers(cached)
+    )
+
+    if response.status_code == 304 and cached:
+        return cached
+    if response.status_code == 404 and page == 1:
+        raise CatalogLoaderError(
+            "The paginated products endpoint '/api/products' was not found."
+        )
 
-        if not batch:
-            logger.info("No products returned on page %s; assuming end of catalog", page)
-            break
-
-        all_products.extend(batch)
-        last_payload = payload
+    response.raise_for_status()
+    payload = response.json()
+    return _page_entry(response, list(_normalize_payload(payload)), _total_pages(payload))
 
-        total_pages = None
-        if isinstance(payload, dict):
-            total_pages = payload.get("totalPages") or payload.get("total_pages")
 
-        if total_pages is not None and page >= int(total_pages):
+def _complete_pages(results: List[Dict[str, Any]], page_size: int) -> List[Dict[str, Any]]:
+    # The catalog ends at the first empty page or right after the first short one.
+    pages: List[Dict[str, Any]] = []
+    for entry in results:
+        items = entry["items"]
+        if not items:
+            logger.info("No products returned on page %s; assuming end of catalog", len(pages) + 1)
             break
-
-        if len(batch) < page_size:
+        pages.append(entry)
+        if len(items) < page_size:
             break
+    return pages
 
-        page += 1
 
-    return all_products, last_payload
-
-
-def load_catalog(
-    settings: Optional[ServiceSettings] = None,
-    session: Optional[Session] = None,
-) -> Catalog:
+async def _fetch_paginated(
+    client: httpx.AsyncClient,
+    base_url: str,
+    settings: ServiceSettings,
+    semaphore: asyncio.Semaphore,
+    cached_pages: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Fetch every page, returning the pages in order and the number of requests made.
+
+    Page 1 is fetched first to learn ``totalPages``; the remaining pages are
+    then requested concurrently, bounded by ``semaphore``. Without
+    ``totalPages`` pages are walked one by one until a short page.
+    """
+
+    cached_pages = cached_pages or {}
+
+    def fetch(page: int) -> Any:
+        return _fetch_page(client, base_url, page, settings, semaphore, cached_pages.get(str(page)))
+
+    results = [await fetch(1)]
+    total_pages = results[0].get("total_pages")
+
+    if total_pages is not None:
+        # TaskGroup cancels the outstanding pages as soon as one of them fails.
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(fetch(page)) for page in range(2, int(total_pages) + 1)]
+        results.extend(task.result() for task in tasks)
+    else:
+        while results[-1]["items"] and len(results[-1]["items"]) >= settings.page_size:
+            results.append(await fetch(len(results) + 1))
+
+    return _complete_pages(results, settings.page_size), len(results)
+
+
+def _loader_error(exc: BaseException) -> BaseException:
+    # Failures inside the page TaskGroup arrive wrapped in an exception group.
+    while isinstance(exc, BaseExceptionGroup) and exc.exceptions:
+        exc = exc.exceptions[0]
+    if isinstance(exc, CatalogLoaderError):
+        return exc
+    if isinstance(exc, httpx.HTTPError):
+        logger.error("Failed to load catalog: %s", exc)
+        return CatalogLoaderError(str(exc))
+    return exc
+
+
+async def load_catalog_async(settings: Optional[ServiceSettings] = None) -> ColumnarCatalog:
     """Load the catalog from the upstream API using the provided settings."""
 
     settings = settings or ServiceSettings()
-    session = _ensure_session(session)
     base_url = settings.catalog_api_base_url.rstrip("/")
-
-    try:
-        products, raw_payload = _fetch_all_endpoint(session, base_url, settings.request_timeout)
-
-        if products:
-            source = "all"
-        else:
-            products, raw_payload = _fetch_paginated(
-                session,
-                base_url,
-                timeout=settings.request_timeout,
-                page_size=settings.page_size,
+    semaphore = asyncio.Semaphore(settings.catalog_concurrency)
+
+    with time_catalog_fetch("load"):
+        try:
+            async with _make_client(settings) as client:
+                builder = CatalogBuilder()
+                result = await _fetch_all_endpoint(client, base_url, settings, semaphore, builder=builder)
+
+                if result is not None and len(builder):
+                    source = "all"
+                else:
+                    results, _ = await _fetch_paginated(client, base_url, settings, semaphore)
+                    for entry in results:
+                        builder.extend(entry["items"])
+                    source = "paginated"
+        except (BaseExceptionGroup, httpx.HTTPError) as exc:
+            raise _loader_error(exc) from exc
+
+    catalog = builder.build(source)
+    if not len(catalog):
+        raise CatalogLoaderError("Catalog API returned an empty dataset")
+
+    logger.info("Loaded %s products from the catalog API using %s strategy", len(catalog), source)
+    return catalog
+
+
+def load_catalog(settings: Optional[ServiceSettings] = None) -> ColumnarCatalog:
+    """Synchronous wrapper around :func:`load_catalog_async` for scripts and threads."""
+
+    return asyncio.run(load_catalog_async(settings))
+
+
+# ----------------------------------------------------------------------
+# On-disk snapshot with conditional (ETag / Last-Modified) sync
+# ----------------------------------------------------------------------
+class CatalogSnapshot:
+    """Versioned local copy of the catalog together with HTTP validators.
+
+    ``pages`` maps ``"all"`` (for ``/api/products/all``) or a page number to
+    ``{"etag", "last_modified", "total_pages", "items"}`` so that every page
+    can be revalidated with a conditional request and reused on ``304``.
+    """
+
+    def __init__(
+        self,
+        source: Optional[str] = None,
+        pages: Optional[Dict[str, Dict[str, Any]]] = None,
+        version: int = 0,
+        checksum: Optional[str] = None,
+        synced_at: Optional[float] = None,
+    ) -> None:
+        self.source = source
+        self.pages: Dict[str, Dict[str, Any]] = pages or {}
+        self.version = version
+        self.checksum = checksum
+        self.synced_at = synced_at
+
+    def items(self) -> List[dict]:
+        ordered = sorted(self.pages.items(), key=lambda entry: (entry[0] != ALL_PAGE, entry[0].zfill(12)))
+        return [item for _, page in ordered for item in page["items"]]
+
+    def to_catalog(self) -> ColumnarCatalog:
+        return ColumnarCatalog.from_items(self.items(), source=self.source)
+
+    def content_checksum(self) -> str:
+        digest = hashlib.sha256()
+        for item in self.items():
+            digest.update(json.dumps(item, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    @classmethod
+    def load(cls, path: Path) -> "CatalogSnapshot":
+        if not path.exists():
+            return cls()
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+            return cls(
+                source=payload.get("source"),
+                pages=payload.get("pages") or {},
+                version=int(payload.get("version") or 0),
+                checksum=payload.get("checksum"),
+                synced_at=payload.get("synced_at"),
             )
-            source = "paginated"
-
-        if not products:
-            raise CatalogLoaderError("Catalog API returned an empty dataset")
+        except (OSError, ValueError, TypeError) as exc:
+            logger.warning("Ignoring unreadable catalog snapshot %s: %s", path, exc)
+            return cls()
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "version": self.version,
+            "checksum": self.checksum,
+            "synced_at": self.synced_at,
+            "source": self.source,
+            "pages": self.pages,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The API and the trainer share one snapshot file and may both run as
+        # PID 1 of their containers, so the temporary name must be unique.
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle, ensure_ascii=False)
+            os.replace(tmp_name, path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+
+async def sync_catalog_async(settings: Optional[ServiceSettings] = None) -> CatalogSnapshot:
+    """Bring the on-disk catalog snapshot up to date with the upstream API.
+
+    Each endpoint is requested with the ``ETag``/``Last-Modified`` validators
+    of the previous sync, so an unchanged catalog costs a single ``304``
+    response. The snapshot version is only bumped when the content changes.
+    """
 
-        catalog = build_catalog(products=products, raw_payload=raw_payload, source=source)
-        logger.info("Loaded %s products from the catalog API using %s strategy", len(products), source)
+    settings = settings or ServiceSettings()
+    base_url = settings.catalog_api_base_url.rstrip("/")
+    path = Path(settings.catalog_snapshot_path)
+    snapshot = CatalogSnapshot.load(path)
+    semaphore = asyncio.Semaphore(settings.catalog_concurrency)
+    start = time.perf_counter()
+
+    with time_catalog_fetch("sync"):
+        try:
+            async with _make_client(settings) as client:
+                result, requests_made = None, 0
+                # Upstreams without ``/api/products/all`` are not probed again on every sync.
+                if snapshot.source != "paginated":
+                    result = await _fetch_all_endpoint(
+                        client, base_url, settings, semaphore, snapshot.pages.get(ALL_PAGE)
+                    )
+                    requests_made = 1
+                if result is not None and result["items"]:
+                    source, pages = "all", {ALL_PAGE: result}
+                else:
+                    cached_pages = {key: value for key, value in snapshot.pages.items() if key != ALL_PAGE}
+                    results, page_requests = await _fetch_paginated(
+                        client, base_url, settings, semaphore, cached_pages
+                    )
+                    pages = {str(page): entry for page, entry in enumerate(results, start=1)}
+                    source, requests_made = "paginated", requests_made + page_requests
+        except (BaseExceptionGroup, httpx.HTTPError) as exc:
+            raise _loader_error(exc) from exc
+
+    updated = CatalogSnapshot(source=source, pages=pages, version=snapshot.version, synced_at=time.time())
+    updated.checksum = updated.content_checksum()
+    if not updated.items():
+        raise CatalogLoaderError("Catalog API returned an empty dataset")
+
+    changed = updated.checksum != snapshot.checksum
+    if changed:
+        updated.version += 1
+    updated.save(path)
+    logger.info(
+        "Catalog snapshot %s (version %s, %s products) after %s requests in %.2f seconds",
+        "updated" if changed else "unchanged",
+        updated.version,
+        len(updated.items()),
+        requests_made,
+        time.perf_counter() - start,
+    )
+    return updated
+
+
+def sync_catalog(settings: Optional[ServiceSettings] = None) -> CatalogSnapshot:
+    """Synchronous wrapper around :func:`sync_catalog_async`."""
+
+    return asyncio.run(sync_catalog_async(settings))
+
+
+def load_catalog_snapshot(settings: Optional[ServiceSettings] = None) -> ColumnarCatalog:
+    """Sync the local snapshot and return its catalog."""
+
+    catalog = sync_catalog(settings=settings).to_catalog()
+    logger.info("Loaded %s products from the catalog snapshot", len(catalog))
+    return catalog
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after ``failures`` consecutive errors.
+
+    The breaker stays open for ``reset_seconds``; the first call after that
+    is let through as a trial (half-open) and closes it again on success.
+    ``failures=0`` disables the breaker.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float) -> None:
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self.retry_in() == 0.0 else "open"
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial call through."""
+
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self._consecutive = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._consecutive += 1
+        if self.failures and (self._opened_at is not None or self._consecutive >= self.failures):
+            # A failed trial call reopens the breaker for another period.
+            if self._opened_at is None:
+                logger.warning(
+                    "Catalog API failed %s times in a row; pausing calls for %.0f seconds",
+                    self._consecutive,
+                    self.reset_seconds,
+                )
+            self._opened_at = time.monotonic()
+
+
+class CatalogCache:
+    """Serve the catalog snapshot from memory, revalidating it after ``ttl`` seconds.
+
+    Concurrent callers share a single in-flight refresh, which syncs the
+    snapshot in a worker thread. Once a catalog has been loaded, callers are
+    never made to wait: an expired catalog is returned immediately while the
+    refresh runs (stale-while-revalidate), and is kept when the refresh
+    fails. After repeated failures the :class:`CircuitBreaker` stops the
+    refreshes until the upstream had time to recover.
+
+    ``get()`` returns ``render(catalog)``, computed in the refresh thread
+    once per catalog version, so callers can cache a serialised response.
+    """
+
+    def __init__(
+        self,
+        settings: ServiceSettings,
+        ttl: float,
+        breaker: Optional[CircuitBreaker] = None,
+        render: Callable[[ColumnarCatalog], Any] = lambda catalog: catalog,
+    ) -> None:
+        self.settings = settings
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker(0, 0.0)
+        self.render = render
+        self._catalog: Any = None
+        self._version: Optional[int] = None
+        self._expires_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        self._stats = {"fresh": 0, "stale": 0, "coalesced": 0, "rejected": 0, "refreshed": 0, "failures": 0}
+
+    async def get(self) -> Any:
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() < self._expires_at:
+            self._stats["fresh"] += 1
+            return catalog
+
+        refresh = self._refresh
+        if refresh is None:
+            if not self.breaker.allow():
+                if catalog is not None:
+                    self._stats["stale"] += 1
+                    return catalog
+                self._stats["rejected"] += 1
+                raise CatalogLoaderError(
+                    f"Catalog API is failing; retrying in {self.breaker.retry_in():.0f} seconds"
+                )
+            refresh = self._refresh = asyncio.get_running_loop().create_task(self._revalidate())
+            # The outcome is logged by ``_revalidate``; nobody may await a background refresh.
+            refresh.add_done_callback(lambda task: task.cancelled() or task.exception())
+        elif catalog is None:
+            self._stats["coalesced"] += 1
+
+        if catalog is not None:
+            self._stats["stale"] += 1
+            return catalog
+        # Shielded, so a disconnecting caller does not cancel the fetch others wait for.
+        return await asyncio.shield(refresh)
+
+    async def _revalidate(self) -> Any:
+        try:
+            snapshot, catalog = await asyncio.to_thread(self._sync)
+        except Exception as exc:
+            self._stats["failures"] += 1
+            self.breaker.record_failure()
+            logger.error("Catalog refresh failed: %s", exc)
+            raise
+        finally:
+            self._refresh = None
+        self._stats["refreshed"] += 1
+        self.breaker.record_success()
+        self._catalog, self._version = catalog, snapshot.version
+        self._expires_at = time.monotonic() + self.ttl
         return catalog
-    except requests.RequestException as exc:
-        logger.exception("Failed to load catalog: %s", exc)
-        raise CatalogLoaderError(str(exc)) from exc
+
+    def _sync(self) -> Tuple[CatalogSnapshot, Any]:
+        snapshot = sync_catalog(settings=self.settings)
+        if self._catalog is not None and snapshot.version == self._version:
+            # Products are only re-parsed when the content actually changed.
+            return snapshot, self._catalog
+        return snapshot, self.render(snapshot.to_catalog())
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "breaker": self.breaker.state, "in_flight": self._refresh is not None}
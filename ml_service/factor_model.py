@@ -0,0 +1,371 @@
+"""Matrix factorisation model shared by full and warm-start training.
+
+A full training run fits ``surprise.SVD`` and copies its factors into a
+:class:`FactorModel`; an incremental run loads the previous model and only
+re-solves the users and items whose ratings were added, changed or removed
+since then (see :meth:`FactorModel.fold_in`). Scoring and evaluation work on
+the :class:`FactorModel` in both cases.
+
+Alongside the factors the model keeps a digest of every rating it was
+trained on, which is how the next incremental run finds the touched users
+and items without relying on the ratings source being able to filter by
+date. The ratings themselves are kept as well, together with the
+``updated_at`` watermark they cover when they came from the database, so
+the next run can read only the rows written since (see
+:func:`ratings_loader.load_ratings_since`).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RATING_COLUMNS = ["user_id", "product_id", "rating"]
+HOLDOUT_BUCKETS = 10_000
+# Standard deviation of the initial factors of new users and items, as in ``surprise.SVD``.
+INIT_STD = 0.1
+
+
+def rating_digests(frame: pd.DataFrame) -> np.ndarray:
+    """Hash every ``(user_id, product_id, rating)`` row."""
+
+    return pd.util.hash_pandas_object(frame[RATING_COLUMNS], index=False).to_numpy(dtype=np.uint64, copy=True)
+
+
+def holdout_mask(frame: pd.DataFrame, fraction: float) -> np.ndarray:
+    """Select about ``fraction`` of the ratings for evaluation.
+
+    The split hashes the ``(user_id, product_id)`` pair, so a rating stays
+    on the same side of the split across runs and when its value changes;
+    full and incremental runs are therefore evaluated on the same ratings.
+    """
+
+    if fraction <= 0:
+        return np.zeros(len(frame), dtype=bool)
+    buckets = pd.util.hash_pandas_object(frame[["user_id", "product_id"]], index=False).to_numpy() % HOLDOUT_BUCKETS
+    return buckets < int(round(fraction * HOLDOUT_BUCKETS))
+
+
+def _solve_side(
+    codes: np.ndarray,
+    other_codes: np.ndarray,
+    residuals: np.ndarray,
+    other_factors: np.ndarray,
+    reg: float,
+    reg_base: float = 0.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Ridge-regress ``[bias, factors]`` of every entity in ``codes`` on its ratings.
+
+    ``residuals`` are the ratings minus the global mean and the bias of the
+    other side. The penalty grows with the number of ratings like the one
+    ``surprise.SVD`` applies with every SGD step; as the exact solution is
+    not damped by early stopping, it needs a larger ``reg`` than the SGD fit,
+    and ``reg_base`` on top keeps entities with very few ratings near zero.
+    """
+
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    other_codes = other_codes[order]
+    residuals = residuals[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], codes.size]
+
+    design = np.hstack([np.ones((other_factors.shape[0], 1)), other_factors])
+    identity = np.eye(design.shape[1])
+    solutions = np.empty((starts.size, design.shape[1]))
+    for position, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        rows = design[other_codes[start:end]]
+        gram = rows.T @ rows + (reg * (end - start) + reg_base) * identity
+        solutions[position] = np.linalg.solve(gram, rows.T @ residuals[start:end])
+    return codes[starts], solutions[:, 0], solutions[:, 1:]
+
+
+class FactorModel:
+    """Biased matrix factorisation: ``mean + b_u + b_i + p_u . q_i``.
+
+    ``digests`` and ``rating_users``/``rating_items`` describe the ratings
+    the model was trained on (codes index ``user_ids`` and ``item_ids``), so
+    that on-demand scoring can exclude every product a user rated;
+    ``rating_values`` are their values and ``watermark`` the ISO ``updated_at``
+    of the newest one read from the database, if any. ``updates`` counts
+    incremental runs since the last full fit.
+    """
+
+    def __init__(
+        self,
+        user_ids: np.ndarray,
+        item_ids: np.ndarray,
+        user_factors: np.ndarray,
+        item_factors: np.ndarray,
+        user_biases: np.ndarray,
+        item_biases: np.ndarray,
+        global_mean: float,
+        rating_scale: Tuple[float, float],
+        digests: Optional[np.ndarray] = None,
+        rating_users: Optional[np.ndarray] = None,
+        rating_items: Optional[np.ndarray] = None,
+        rating_values: Optional[np.ndarray] = None,
+        watermark: Optional[str] = None,
+        updates: int = 0,
+    ) -> None:
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_biases = user_biases
+        self.item_biases = item_biases
+        self.global_mean = global_mean
+        self.rating_scale = rating_scale
+        self.digests = digests if digests is not None else np.empty(0, dtype=np.uint64)
+        self.rating_users = rating_users if rating_users is not None else np.empty(0, dtype=np.int32)
+        self.rating_items = rating_items if rating_items is not None else np.empty(0, dtype=np.int32)
+        self.rating_values = rating_values if rating_values is not None else np.empty(0, dtype=np.float32)
+        self.watermark = watermark
+        self.updates = updates
+        self._user_index: Optional[pd.Index] = None
+        self._item_index: Optional[pd.Index] = None
+
+    @property
+    def n_factors(self) -> int:
+        return int(self.user_factors.shape[1])
+
+    @property
+    def user_index(self) -> pd.Index:
+        if self._user_index is None:
+            self._user_index = pd.Index(self.user_ids)
+        return self._user_index
+
+    @property
+    def item_index(self) -> pd.Index:
+        if self._item_index is None:
+            self._item_index = pd.Index(self.item_ids)
+        return self._item_index
+
+    @classmethod
+    def from_svd(cls, algorithm, frame: pd.DataFrame) -> "FactorModel":
+        """Copy the factors of a fitted ``surprise.SVD`` trained on ``frame``."""
+
+        trainset = algorithm.trainset
+        user_ids = np.asarray([trainset.to_raw_uid(inner) for inner in range(trainset.n_users)], dtype=object)
+        item_ids = np.asarray([trainset.to_raw_iid(inner) for inner in range(trainset.n_items)], dtype=object)
+        model = cls(
+            user_ids=user_ids,
+            item_ids=item_ids,
+            user_factors=np.asarray(algorithm.pu, dtype=np.float64),
+            item_factors=np.asarray(algorithm.qi, dtype=np.float64),
+            user_biases=np.asarray(algorithm.bu, dtype=np.float64),
+            item_biases=np.asarray(algorithm.bi, dtype=np.float64),
+            global_mean=float(trainset.global_mean),
+            rating_scale=tuple(float(value) for value in trainset.rating_scale),
+        )
+        model.remember(frame)
+        return model
+
+    def remember(self, frame: pd.DataFrame) -> None:
+        """Record ``frame`` as the ratings the current factors were trained on."""
+
+        self.digests = rating_digests(frame)
+        self.rating_users = self.user_index.get_indexer(frame["user_id"]).astype(np.int32)
+        self.rating_items = self.item_index.get_indexer(frame["product_id"]).astype(np.int32)
+        self.rating_values = frame["rating"].to_numpy(dtype=np.float32)
+
+    def ratings(self) -> pd.DataFrame:
+        """The ratings the model was last trained on, as recorded by :meth:`remember`."""
+
+        return pd.DataFrame(
+            {
+                "user_id": self.user_ids[self.rating_users],
+                "product_id": self.item_ids[self.rating_items],
+                "rating": self.rating_values.astype(np.float64),
+            }
+        )
+
+    # ------------------------------------------------------------------
+    # Lookup and scoring
+    # ------------------------------------------------------------------
+    def gather(self, raw_ids, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Factors and biases of ``raw_ids``; unknown ids get zeros.
+
+        Zeros reproduce how ``SVD.estimate`` ignores the unknown side of a
+        prediction.
+        """
+
+        index = self.user_index if kind == "user" else self.item_index
+        factors = self.user_factors if kind == "user" else self.item_factors
+        biases = self.user_biases if kind == "user" else self.item_biases
+
+        positions = index.get_indexer(pd.Index(raw_ids, dtype=object))
+        known = positions >= 0
+        gathered = np.zeros((positions.size, self.n_factors), dtype=np.float64)
+        gathered[known] = factors[positions[known]]
+        gathered_biases = np.zeros(positions.size, dtype=np.float64)
+        gathered_biases[known] = biases[positions[known]]
+        return gathered, gathered_biases
+
+    def predict(self, frame: pd.DataFrame) -> np.ndarray:
+        """Clipped estimates for the ``(user_id, product_id)`` rows of ``frame``."""
+
+        user_factors, user_biases = self.gather(frame["user_id"], "user")
+        item_factors, item_biases = self.gather(frame["product_id"], "item")
+        estimates = self.global_mean + user_biases + item_biases + np.einsum("ij,ij->i", user_factors, item_factors)
+        return np.clip(estimates, *self.rating_scale)
+
+    def rmse(self, frame: pd.DataFrame) -> Optional[float]:
+        if frame.empty:
+            return None
+        errors = self.predict(frame) - frame["rating"].to_numpy(dtype=np.float64)
+        return float(np.sqrt(np.mean(errors * errors)))
+
+    # ------------------------------------------------------------------
+    # Warm start
+    # ------------------------------------------------------------------
+    def touched(self, frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+        """Users and items with ratings added, changed or removed since the model was trained."""
+
+        digests = rating_digests(frame)
+        added = ~np.isin(digests, self.digests)
+        removed = ~np.isin(self.digests, digests)
+        users = pd.unique(
+            np.concatenate([frame["user_id"].to_numpy(dtype=object)[added], self.user_ids[self.rating_users[removed]]])
+        )
+        items = pd.unique(
+            np.concatenate([frame["product_id"].to_numpy(dtype=object)[added], self.item_ids[self.rating_items[removed]]])
+        )
+        stats = {"added_ratings": int(added.sum()), "removed_ratings": int(removed.sum())}
+        return users, items, stats
+
+    def fold_in(
+        self,
+        frame: pd.DataFrame,
+        users: np.ndarray,
+        items: np.ndarray,
+        epochs: int,
+        reg: float,
+        reg_base: float = 0.0,
+        seed: int = 0,
+    ) -> "FactorModel":
+        """Return a model with ``users`` and ``items`` re-fitted on ``frame``.
+
+        Every epoch solves the biases and factors of the touched users with
+        the item factors fixed, then those of the touched items with the user
+        factors fixed (alternating least squares). Only the ratings of
+        touched users and items are read; every other row keeps its factors,
+        and so does the global mean the biases are relative to. New users and
+        items start from small random factors.
+        """
+
+        start = time.perf_counter()
+        rng = np.random.default_rng(seed)
+        user_ids = np.concatenate([self.user_ids, users[self.user_index.get_indexer(users) < 0]])
+        item_ids = np.concatenate([self.item_ids, items[self.item_index.get_indexer(items) < 0]])
+        new_users = user_ids.size - self.user_ids.size
+        new_items = item_ids.size - self.item_ids.size
+        model = FactorModel(
+            user_ids=user_ids,
+            item_ids=item_ids,
+            user_factors=np.vstack([self.user_factors, rng.normal(0.0, INIT_STD, (new_users, self.n_factors))]),
+            item_factors=np.vstack([self.item_factors, rng.normal(0.0, INIT_STD, (new_items, self.n_factors))]),
+            user_biases=np.concatenate([self.user_biases, np.zeros(new_users)]),
+            item_biases=np.concatenate([self.item_biases, np.zeros(new_items)]),
+            global_mean=self.global_mean,
+            rating_scale=self.rating_scale,
+            updates=self.updates + 1,
+        )
+
+        user_codes = model.user_index.get_indexer(frame["user_id"])
+        item_codes = model.item_index.get_indexer(frame["product_id"])
+        ratings = frame["rating"].to_numpy(dtype=np.float64) - model.global_mean
+        of_users = np.isin(user_codes, model.user_index.get_indexer(users))
+        of_items = np.isin(item_codes, model.item_index.get_indexer(items))
+
+        for _ in range(epochs):
+            if of_users.any():
+                codes, biases, factors = _solve_side(
+                    user_codes[of_users],
+                    item_codes[of_users],
+                    ratings[of_users] - model.item_biases[item_codes[of_users]],
+                    model.item_factors,
+                    reg,
+                    reg_base,
+                )
+                model.user_biases[codes] = biases
+                model.user_factors[codes] = factors
+            if of_items.any():
+                codes, biases, factors = _solve_side(
+                    item_codes[of_items],
+                    user_codes[of_items],
+                    ratings[of_items] - model.user_biases[user_codes[of_items]],
+                    model.user_factors,
+                    reg,
+                    reg_base,
+                )
+                model.item_biases[codes] = biases
+                model.item_factors[codes] = factors
+
+        model.remember(frame)
+        logger.info(
+            "Folded in %s users (%s new) and %s items (%s new) from %s ratings in %.2f seconds",
+            len(users),
+            new_users,
+            len(items),
+            new_items,
+            int((of_users | of_items).sum()),
+            time.perf_counter() - start,
+        )
+        return model
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        """Persist the model atomically as an uncompressed ``.npz`` archive."""
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("wb") as handle:
+            np.savez(
+                handle,
+                user_ids=np.asarray(self.user_ids, dtype=str),
+                item_ids=np.asarray(self.item_ids, dtype=str),
+                user_factors=self.user_factors,
+                item_factors=self.item_factors,
+                user_biases=self.user_biases,
+                item_biases=self.item_biases,
+                digests=self.digests,
+                rating_users=self.rating_users,
+                rating_items=self.rating_items,
+                rating_values=self.rating_values,
+                watermark=np.asarray(self.watermark or ""),
+                params=np.asarray([self.global_mean, *self.rating_scale, self.updates], dtype=np.float64),
+            )
+            handle.flush()
+        tmp_path.replace(path)
+        logger.info("Saved factors of %s users and %s items to %s", len(self.user_ids), len(self.item_ids), path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FactorModel":
+        with np.load(path, allow_pickle=False) as archive:
+            global_mean, lower, upper, updates = archive["params"].tolist()
+            return cls(
+                user_ids=archive["user_ids"].astype(object),
+                item_ids=archive["item_ids"].astype(object),
+                user_factors=archive["user_factors"],
+                item_factors=archive["item_factors"],
+                user_biases=archive["user_biases"],
+                item_biases=archive["item_biases"],
+                global_mean=global_mean,
+                rating_scale=(lower, upper),
+                digests=archive["digests"],
+                rating_users=archive["rating_users"],
+                rating_items=archive["rating_items"],
+                rating_values=archive["rating_values"],
+                watermark=str(archive["watermark"]) or None,
+                updates=int(updates),
+            )
@@ -0,0 +1,269 @@
+"""Product feature construction shared by the neighbour builder and the ANN index.
+
+The :class:`ProductFeaturizer` keeps the fitted TF-IDF vectorizer, one-hot
+encoder and price bin edges so that products added after a full rebuild can
+be projected into the same feature space without refitting.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import pickle
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, normalize
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLUMNS = ["brand", "category_id", "price_bin"]
+# Every text part uses the first non-empty column of its group.
+TEXT_COLUMNS = (
+    ("name", "title"),
+    ("description",),
+    ("brand",),
+    ("category", "category_id", "categoryId", "gender"),
+)
+TEXT_VECTORIZERS = ("tfidf", "hashing")
+FEATURE_DTYPE = np.float32
+
+
+def _text_part(frame: pd.DataFrame, columns: Tuple[str, ...]) -> pd.Series:
+    part = pd.Series("", index=frame.index, dtype=object)
+    for column in reversed(columns):
+        if column not in frame:
+            continue
+        values = frame[column].astype(object)
+        text = values.astype(str)
+        part = part.mask(values.notna() & (text != ""), text)
+    return part
+
+
+def compose_text(frame: pd.DataFrame) -> pd.Series:
+    """Name, description, brand and category of every product as one string.
+
+    Empty parts only leave extra spaces behind, which the tokenizer ignores.
+    """
+
+    first, *rest = (_text_part(frame, columns) for columns in TEXT_COLUMNS)
+    return first.str.cat(rest, sep=" ")
+
+
+def frame_fingerprint(frame: pd.DataFrame) -> str:
+    """Content hash of ``frame`` used to recognise an unchanged catalog."""
+
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def _numeric_prices(frame: pd.DataFrame) -> pd.Series:
+    if "price" not in frame:
+        return pd.Series(np.nan, index=frame.index, dtype=float)
+    return pd.to_numeric(frame["price"], errors="coerce")
+
+
+def _assign_price_bins(prices: pd.Series, n_bins: int = 5) -> tuple[pd.Series, Optional[np.ndarray]]:
+    """Bin ``prices`` into quantiles, returning the labels and the bin edges."""
+
+    numeric = pd.to_numeric(prices, errors="coerce")
+    if numeric.notna().sum() < 2:
+        # All values identical or missing.
+        return _single_bin_labels(numeric), None
+
+    try:
+        bins, edges = pd.qcut(
+            numeric, q=min(n_bins, numeric.nunique()), duplicates="drop", retbins=True
+        )
+    except ValueError:
+        bins, edges = pd.cut(numeric, bins=n_bins, retbins=True)
+
+    labels = bins.astype(str)
+    labels = labels.fillna("missing")
+    labels[numeric.isna()] = "missing"
+    return labels, np.asarray(edges, dtype=float)
+
+
+def _single_bin_labels(numeric: pd.Series) -> pd.Series:
+    return pd.Series(
+        ["bin_single" if not np.isnan(value) else "missing" for value in numeric],
+        index=numeric.index,
+    )
+
+
+def _make_one_hot_encoder() -> OneHotEncoder:
+    # scikit-learn 1.2 renamed ``sparse`` to ``sparse_output`` and 1.4 removed it.
+    try:
+        return OneHotEncoder(sparse_output=True, handle_unknown="ignore", dtype=np.float32)
+    except TypeError:
+        return OneHotEncoder(sparse=True, handle_unknown="ignore", dtype=np.float32)
+
+
+class ProductFeaturizer:
+    """Fit and apply the TF-IDF + one-hot product feature pipeline.
+
+    ``vectorizer="tfidf"`` learns a vocabulary of unigrams and bigrams,
+    optionally capped at the ``max_features`` most frequent terms;
+    ``"hashing"`` hashes the terms into ``2 ** hash_bits`` columns, so memory
+    does not grow with the vocabulary. All matrices are ``float32``.
+    """
+
+    def __init__(
+        self,
+        n_price_bins: int = 5,
+        vectorizer: str = "tfidf",
+        max_features: Optional[int] = None,
+        hash_bits: int = 20,
+    ) -> None:
+        if vectorizer not in TEXT_VECTORIZERS:
+            raise ValueError(f"Unknown text vectorizer {vectorizer!r}; expected one of {TEXT_VECTORIZERS}")
+        self.n_price_bins = n_price_bins
+        self.vectorizer = vectorizer
+        self.max_features = max_features or None
+        self.hash_bits = hash_bits
+        self.tfidf: Optional[TfidfVectorizer | Pipeline] = None
+        self.encoder: Optional[OneHotEncoder] = None
+        self.price_edges: Optional[np.ndarray] = None
+        self.fingerprint: Optional[str] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.tfidf is not None and self.encoder is not None
+
+    @property
+    def options(self) -> Tuple[object, ...]:
+        # Pipelines pickled before these options existed used the defaults.
+        return (
+            self.n_price_bins,
+            getattr(self, "vectorizer", "tfidf"),
+            getattr(self, "max_features", None),
+            getattr(self, "hash_bits", 20),
+        )
+
+    def _make_text_vectorizer(self) -> TfidfVectorizer | Pipeline:
+        if self.vectorizer == "hashing":
+            return Pipeline(
+                [
+                    (
+                        "hashing",
+                        HashingVectorizer(
+                            n_features=2**self.hash_bits,
+                            ngram_range=(1, 2),
+                            alternate_sign=False,
+                            norm=None,
+                            dtype=FEATURE_DTYPE,
+                        ),
+                    ),
+                    ("idf", TfidfTransformer()),
+                ]
+            )
+        return TfidfVectorizer(min_df=1, ngram_range=(1, 2), max_features=self.max_features, dtype=FEATURE_DTYPE)
+
+    def _categorical_frame(self, frame: pd.DataFrame, price_bins: pd.Series) -> pd.DataFrame:
+        categorical = frame.reindex(columns=CATEGORICAL_COLUMNS[:-1]).copy()
+        categorical["price_bin"] = price_bins
+        return categorical.fillna("unknown")
+
+    def _transform_prices(self, frame: pd.DataFrame) -> pd.Series:
+        numeric = _numeric_prices(frame)
+        if self.price_edges is None:
+            return _single_bin_labels(numeric)
+
+        # Prices outside of the fitted range fall into the outermost bins.
+        clipped = numeric.clip(self.price_edges[0], self.price_edges[-1])
+        labels = pd.cut(clipped, bins=self.price_edges, include_lowest=True).astype(str)
+        labels[numeric.isna()] = "missing"
+        return labels
+
+    def _combine(self, tfidf_matrix: sparse.spmatrix, categorical_matrix: sparse.spmatrix) -> sparse.csr_matrix:
+        feature_matrix = sparse.hstack([tfidf_matrix, categorical_matrix], format="csr", dtype=FEATURE_DTYPE)
+        return normalize(feature_matrix, norm="l2", copy=False)
+
+    def fit_transform(self, frame: pd.DataFrame) -> sparse.csr_matrix:
+        self.fingerprint = frame_fingerprint(frame)
+        start = time.perf_counter()
+
+        text_corpus = compose_text(frame)
+        text_done = time.perf_counter()
+
+        self.tfidf = self._make_text_vectorizer()
+        tfidf_matrix = self.tfidf.fit_transform(text_corpus)
+        tfidf_done = time.perf_counter()
+        logger.info("TF-IDF matrix shape: %s", tfidf_matrix.shape)
+
+        price_bins, self.price_edges = _assign_price_bins(_numeric_prices(frame), self.n_price_bins)
+        self.encoder = _make_one_hot_encoder()
+        categorical_matrix = self.encoder.fit_transform(self._categorical_frame(frame, price_bins))
+        categorical_done = time.perf_counter()
+        logger.info("Categorical matrix shape: %s", categorical_matrix.shape)
+
+        feature_matrix = self._combine(tfidf_matrix, categorical_matrix)
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Feature matrix built with shape %s and %s non-zero values in %.2f seconds "
+            "(text %.2f s, %s %.2f s, categorical %.2f s, combine %.2f s)",
+            feature_matrix.shape,
+            feature_matrix.nnz,
+            elapsed,
+            text_done - start,
+            self.vectorizer,
+            tfidf_done - text_done,
+            categorical_done - tfidf_done,
+            time.perf_counter() - categorical_done,
+        )
+        return feature_matrix
+
+    def transform(self, frame: pd.DataFrame) -> sparse.csr_matrix:
+        """Project new products into the feature space learnt by :meth:`fit_transform`."""
+
+        if not self.is_fitted:
+            raise RuntimeError("ProductFeaturizer must be fitted before calling transform")
+
+        text_corpus = compose_text(frame)
+        tfidf_matrix = self.tfidf.transform(text_corpus)  # type: ignore[union-attr]
+        categorical = self._categorical_frame(frame, self._transform_prices(frame))
+        categorical_matrix = self.encoder.transform(categorical)  # type: ignore[union-attr]
+        return self._combine(tfidf_matrix, categorical_matrix)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+        logger.info("Saved feature pipeline to %s", path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ProductFeaturizer":
+        with path.open("rb") as handle:
+            featurizer = pickle.load(handle)
+        if not isinstance(featurizer, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}")
+        return featurizer
+
+
+def load_fitted(path: Path, frame: pd.DataFrame, options: Tuple[object, ...]) -> Optional[ProductFeaturizer]:
+    """Return the pipeline saved at ``path`` if it was fitted on ``frame`` with ``options``.
+
+    Refitting on an unchanged catalog would learn the same vocabulary, so
+    the cached pipeline only has to transform the frame.
+    """
+
+    if not path.exists():
+        return None
+    try:
+        featurizer = ProductFeaturizer.load(path)
+    except (OSError, EOFError, pickle.UnpicklingError, TypeError, AttributeError) as exc:
+        logger.warning("Ignoring unreadable feature pipeline %s: %s", path, exc)
+        return None
+    if featurizer.options != options or getattr(featurizer, "fingerprint", None) != frame_fingerprint(frame):
+        return None
+    logger.info("Reusing the feature pipeline fitted on the same catalog from %s", path)
+    return featurizer
@@ -0,0 +1,368 @@
+"""Prometheus metrics of the API and of the batch jobs.
+
+The API serves every metric of its process on ``GET /metrics`` in the
+Prometheus text format. :class:`MetricsMiddleware` records request latency
+per route and the number of requests in flight; artifact, cache and model
+metrics are read from their owners by collectors when the endpoint is
+scraped, so serving requests never pays for them.
+
+Batch jobs (``trainer.py``, ``train_model.py`` and ``neighbor_builder.py``)
+are not running when Prometheus scrapes, so :class:`JobMetrics` times their
+stages and writes them to ``<JOB_METRICS_DIR>/<job>.prom`` at the end of a
+run. The API appends those files to its own output; they can also be read
+by the node exporter's textfile collector.
+
+The metric types are implemented here rather than with ``prometheus_client``:
+only a few are needed and the format is plain text.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from profiling import StackSampler
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Request latencies from a cache hit (~0.1 ms) to a slow batch request.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Catalog fetches range from a single ``304`` to paging through the whole catalog.
+FETCH_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+JOB_FILE_SUFFIX = ".prom"
+# Route label of requests that matched no route, so that scanners probing
+# random paths cannot create unbounded label values.
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+
+class _Value(_Metric):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield "", self.labelnames, labels, value
+
+
+class Counter(_Value):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+
+class Gauge(_Value):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def dec(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        self.inc(-amount, labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed ``buckets`` (upper bounds, in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: observations per bucket (the last one is +Inf), sum.
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items())
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, observed in zip(self.buckets + (math.inf,), counts):
+                cumulative += observed
+                yield "_bucket", names, labels + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, labels, total
+            yield "_count", self.labelnames, labels, cumulative
+
+
+class MetricsRegistry:
+    """Metrics of one process plus collectors that build metrics when scraped."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Module reloads and lru_cache'd factories may ask for a metric twice.
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception:  # pylint: disable=broad-except
+                # A failing collector must not take the other metrics down with it.
+                logger.exception("Metrics collector %r failed", collector)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_IN_FLIGHT = REGISTRY.gauge("ml_http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_REQUESTS = REGISTRY.counter(
+    "ml_http_requests_total", "HTTP requests served, by route and status code.", ("method", "route", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "ml_http_request_duration_seconds", "Time to serve an HTTP request, by route.", ("method", "route")
+)
+CATALOG_FETCH = REGISTRY.histogram(
+    "ml_catalog_fetch_seconds",
+    "Time to load or sync the catalog from the upstream API, by operation and outcome.",
+    ("operation", "outcome"),
+    FETCH_BUCKETS,
+)
+
+
+@contextmanager
+def time_catalog_fetch(operation: str) -> Iterator[None]:
+    """Observe the duration of a catalog ``load`` or ``sync`` in :data:`CATALOG_FETCH`."""
+
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        CATALOG_FETCH.observe(time.perf_counter() - start, (operation, outcome))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight requests per route.
+
+    Requests are labelled with the route template (``/recs/similar``) rather
+    than the raw path. When ``sampler`` returns a :class:`StackSampler`, a
+    share of the requests to its paths is profiled as well; it is resolved on
+    every request so the settings are only read once the app is serving.
+    """
+
+    def __init__(self, app, sampler: Callable[[], Optional[StackSampler]] = lambda: None) -> None:
+        self.app = app
+        self.sampler = sampler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        sampler = self.sampler()
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            if sampler is not None and sampler.should_profile(scope["path"]):
+                with sampler.profile(scope["path"]):
+                    await self.app(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", UNMATCHED_ROUTE))
+            HTTP_LATENCY.observe(time.perf_counter() - start, labels)
+            HTTP_REQUESTS.inc(labels=labels + (str(status[0]),))
+
+
+def read_job_metrics(directory: Path) -> str:
+    """Merge the ``*.prom`` files written by the batch jobs into ``directory``.
+
+    Every job writes the same metric families, and the text format allows a
+    family only once per exposition, so samples are regrouped by family.
+    """
+
+    if not directory.is_dir():
+        return ""
+    families: Dict[str, List[str]] = {}
+    for path in sorted(directory.glob(f"*{JOB_FILE_SUFFIX}")):
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError as exc:
+            logger.warning("Skipping unreadable job metrics %s: %s", path, exc)
+            continue
+        family: Optional[List[str]] = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split(" ", 3)[2]
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = [line]
+            elif line and not line.startswith("#") and family is not None:
+                family.append(line)
+            elif line.startswith("# TYPE ") and family is not None and len(family) == 1:
+                family.append(line)
+    return "".join(line + "\n" for lines in families.values() for line in lines)
+
+
+class JobMetrics:
+    """Stage timings of one batch job run, written as a Prometheus text file.
+
+    ``with job.stage("fit"):`` adds the duration of the block to the stage
+    (a stage entered twice, e.g. by an incremental run falling back to a
+    full rebuild, accumulates). :meth:`write` replaces
+    ``<directory>/<job>.prom`` atomically, so a scrape never sees a partly
+    written file.
+    """
+
+    def __init__(self, job: str) -> None:
+        self.job = job
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def summary(self) -> Dict[str, float]:
+        return {name: round(seconds, 3) for name, seconds in self.stages.items()}
+
+    def render(self, success: bool) -> str:
+        registry = MetricsRegistry()
+        stages = registry.gauge(
+            "ml_job_stage_seconds", "Duration of each stage of the last run of a batch job.", ("job", "stage")
+        )
+        for name, seconds in self.stages.items():
+            stages.set(seconds, (self.job, name))
+        registry.gauge("ml_job_duration_seconds", "Duration of the last run of a batch job.", ("job",)).set(
+            time.perf_counter() - self._start, (self.job,)
+        )
+        registry.gauge("ml_job_success", "1 if the last run of a batch job succeeded, else 0.", ("job",)).set(
+            1.0 if success else 0.0, (self.job,)
+        )
+        registry.gauge(
+            "ml_job_finished_timestamp_seconds", "Unix time the last run of a batch job finished.", ("job",)
+        ).set(time.time(), (self.job,))
+        return registry.render()
+
+    def write(self, directory: Path, success: bool = True) -> None:
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{self.job}{JOB_FILE_SUFFIX}"
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_text(self.render(success), encoding="utf-8")
+            tmp_path.replace(path)
+        except OSError as exc:
+            # Metrics are best effort; they must not fail a finished job.
+            logger.warning("Could not write metrics of job %s to %s: %s", self.job, directory, exc)
+            return
+        logger.info("Job %s stages: %s", self.job, self.summary())
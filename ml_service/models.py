@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Literal, Optional, Tuple, Union
 
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, AliasChoices, BaseModel, Field
 from pydantic_settings import BaseSettings
 
 
@@ -42,19 +42,60 @@ class ServiceSettings(BaseSettings):
     )
     request_timeout: float = Field(
         default=10.0,
-        env="CATALOG_REQUEST_TIMEOUT",
+        # pydantic-settings ignores ``env=``; these variables differ from the field names.
+        validation_alias=AliasChoices("CATALOG_REQUEST_TIMEOUT", "request_timeout"),
         description="Timeout (in seconds) used for outbound HTTP requests.",
     )
     page_size: int = Field(
         default=100,
-        env="CATALOG_PAGE_SIZE",
+        validation_alias=AliasChoices("CATALOG_PAGE_SIZE", "page_size"),
         description="Number of items fetched per page when pagination is required.",
     )
+    catalog_concurrency: int = Field(
+        default=8,
+        ge=1,
+        env="CATALOG_CONCURRENCY",
+        description="Maximum number of catalog pages fetched in parallel.",
+    )
+    catalog_max_retries: int = Field(
+        default=3,
+        ge=0,
+        env="CATALOG_MAX_RETRIES",
+        description="Retries with exponential backoff for 5xx/429 responses and connection errors.",
+    )
+    catalog_snapshot_path: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("catalog_snapshot.json")),
+        env="CATALOG_SNAPSHOT_PATH",
+        description="Local catalog copy synced with conditional requests.",
+    )
+    catalog_ttl_seconds: float = Field(
+        default=300.0,
+        ge=0.0,
+        env="CATALOG_TTL_SECONDS",
+        description="How long /catalog serves the snapshot before revalidating it upstream.",
+    )
+    catalog_breaker_failures: int = Field(
+        default=3,
+        ge=0,
+        env="CATALOG_BREAKER_FAILURES",
+        description="Consecutive failed catalog refreshes that open the circuit breaker; 0 disables it.",
+    )
+    catalog_breaker_reset_seconds: float = Field(
+        default=30.0,
+        ge=0.0,
+        env="CATALOG_BREAKER_RESET_SECONDS",
+        description="How long an open circuit breaker keeps /catalog from calling the upstream API.",
+    )
     database_url: Optional[str] = Field(
         default=None,
         env="DATABASE_URL",
         description="PostgreSQL connection string used for loading ratings.",
     )
+    ratings_db_method: Literal["copy", "cursor"] = Field(
+        default="copy",
+        env="RATINGS_DB_METHOD",
+        description="Read ratings with COPY ... TO STDOUT or with a chunked server-side cursor.",
+    )
     ratings_api_base_url: Optional[str] = Field(
         default=None,
         env="RATINGS_API_BASE_URL",
@@ -70,15 +111,287 @@ class ServiceSettings(BaseSettings):
         env="RATINGS_REQUEST_TIMEOUT",
         description="Timeout (in seconds) used for ratings HTTP requests.",
     )
+    json_streaming: bool = Field(
+        default=True,
+        env="JSON_STREAMING",
+        description="Parse the full catalog and the ratings export incrementally instead of buffering them.",
+    )
     recommendations_output_path: str = Field(
-        default_factory=lambda: str(Path(__file__).with_name("user_recommendations.json")),
+        default_factory=lambda: str(Path(__file__).with_name("user_recommendations.bin")),
         env="RECOMMENDATIONS_OUTPUT_PATH",
-        description="Path to the JSON file containing cached personalized recommendations.",
+        description="Path to the artifact containing cached personalized recommendations.",
     )
     fallback_neighbors_path: str = Field(
-        default_factory=lambda: str(Path(__file__).with_name("product_neighbors.json")),
-        env="NEIGHBORS_PATH",
-        description="Path to the JSON file with content-based neighbours used as fallback.",
+        default_factory=lambda: str(Path(__file__).with_name("product_neighbors.bin")),
+        validation_alias=AliasChoices("NEIGHBORS_PATH", "fallback_neighbors_path"),
+        description="Path to the artifact with content-based neighbours used as fallback.",
+    )
+    model_registry_dir: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("registry")),
+        env="MODEL_REGISTRY_DIR",
+        description="Directory with the versioned models published by trainer.py and served by the API.",
+    )
+    registry_keep_versions: int = Field(
+        default=5,
+        ge=1,
+        env="REGISTRY_KEEP_VERSIONS",
+        description="Number of published model versions kept in the registry.",
+    )
+    trainer_interval_seconds: float = Field(
+        default=3600.0,
+        ge=0.0,
+        env="TRAINER_INTERVAL_SECONDS",
+        description="Seconds between scheduled trainer runs; 0 trains once and exits.",
+    )
+    shared_artifacts_dir: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("registry") / "shared"),
+        env="SHARED_ARTIFACTS_DIR",
+        description=(
+            "Directory of artifacts the API derives once and memory-maps into every worker; "
+            "empty builds them on the heap of each worker."
+        ),
+    )
+    job_metrics_dir: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("registry") / "metrics"),
+        env="JOB_METRICS_DIR",
+        description="Directory the batch jobs write their stage timings to; appended to GET /metrics.",
+    )
+    profile_routes: str = Field(
+        default="",
+        env="PROFILE_ROUTES",
+        description="Comma-separated request paths to profile ('*' for every path); empty disables profiling.",
+    )
+    profile_sample_rate: float = Field(
+        default=0.01,
+        ge=0.0,
+        le=1.0,
+        env="PROFILE_SAMPLE_RATE",
+        description="Share of the requests to PROFILE_ROUTES that are profiled.",
+    )
+    profile_interval_ms: float = Field(
+        default=5.0,
+        gt=0.0,
+        env="PROFILE_INTERVAL_MS",
+        description="Milliseconds between two stack samples of a profiled request.",
+    )
+    popularity_path: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("product_popularity.bin")),
+        env="POPULARITY_PATH",
+        description="Path to the ratings-based product popularity artifact written by the trainer.",
+    )
+    popularity_weight: float = Field(
+        default=0.5,
+        ge=0.0,
+        le=1.0,
+        env="POPULARITY_WEIGHT",
+        description="Share of ratings popularity in the fallback ranking; the rest is content similarity.",
+    )
+    factor_model_path: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("svd_factors.npz")),
+        env="FACTOR_MODEL_PATH",
+        description="User and item factors of the last training run, the start point of incremental training.",
+    )
+    on_demand_scoring: bool = Field(
+        default=True,
+        env="ON_DEMAND_SCORING",
+        description="Score /recs/personalized per request from the factors, so any limit and filters can be served.",
+    )
+    precompute_top_users: int = Field(
+        default=0,
+        ge=0,
+        env="PRECOMPUTE_TOP_USERS",
+        description="Precompute recommendations only for this many users with the most ratings; 0 precomputes every user.",
+    )
+    training_engine: Literal["surprise", "als"] = Field(
+        default="surprise",
+        env="TRAINING_ENGINE",
+        description="Full fits use surprise.SVD (SGD, single-threaded) or the multi-threaded numpy ALS engine.",
+    )
+    svd_factors: int = Field(
+        default=100,
+        ge=1,
+        env="SVD_FACTORS",
+        description="Number of latent factors of the model, whichever engine fits it.",
+    )
+    svd_epochs: int = Field(
+        default=20,
+        ge=1,
+        env="SVD_EPOCHS",
+        description="SGD epochs of a full SVD fit.",
+    )
+    svd_lr: float = Field(
+        default=0.005,
+        gt=0.0,
+        env="SVD_LR",
+        description="SGD learning rate of a full SVD fit.",
+    )
+    svd_reg: float = Field(
+        default=0.02,
+        ge=0.0,
+        env="SVD_REG",
+        description="SGD regularisation of factors and biases in a full SVD fit.",
+    )
+    als_epochs: int = Field(
+        default=6,
+        ge=1,
+        env="ALS_EPOCHS",
+        description="Alternating least squares epochs of a full fit with the als engine.",
+    )
+    als_reg: float = Field(
+        default=0.1,
+        ge=0.0,
+        env="ALS_REG",
+        description="Per-rating regularisation of the als engine.",
+    )
+    als_reg_base: float = Field(
+        default=5.0,
+        ge=0.0,
+        env="ALS_REG_BASE",
+        description="Constant regularisation per user and item of the als engine and of incremental runs.",
+    )
+    als_cg_steps: int = Field(
+        default=2,
+        ge=1,
+        env="ALS_CG_STEPS",
+        description="Conjugate gradient steps per row and half-epoch of the als engine.",
+    )
+    als_workers: int = Field(
+        default=0,
+        ge=0,
+        env="ALS_WORKERS",
+        description="Threads solving row blocks in parallel; 0 uses every CPU.",
+    )
+    svd_incremental: bool = Field(
+        default=False,
+        env="SVD_INCREMENTAL",
+        description="Warm-start from the previous factors and re-fit only users and items with new ratings.",
+    )
+    svd_incremental_epochs: int = Field(
+        default=2,
+        ge=1,
+        env="SVD_INCREMENTAL_EPOCHS",
+        description="Alternating least squares epochs over the touched users and items.",
+    )
+    svd_fold_in_reg: float = Field(
+        default=0.1,
+        ge=0.0,
+        env="SVD_FOLD_IN_REG",
+        description="Per-rating regularisation of the least squares solves of an incremental run.",
+    )
+    svd_full_retrain_every: int = Field(
+        default=10,
+        ge=1,
+        env="SVD_FULL_RETRAIN_EVERY",
+        description="Incremental runs after which the model is fitted from scratch again.",
+    )
+    svd_holdout_fraction: float = Field(
+        default=0.05,
+        ge=0.0,
+        lt=1.0,
+        env="SVD_HOLDOUT_FRACTION",
+        description=(
+            "Share of ratings folded out of a copy of the published model to report RMSE; "
+            "the published model is trained on every rating, 0 skips the evaluation."
+        ),
+    )
+    artifact_format: Literal["binary", "json"] = Field(
+        default="binary",
+        env="ARTIFACT_FORMAT",
+        description="Format of written artifacts; 'json' exports to a .json sibling of the path.",
+    )
+    session_weight: float = Field(
+        default=0.7,
+        ge=0.0,
+        le=1.0,
+        env="SESSION_WEIGHT",
+        description="Share of the session signal in POST /recs/personal scores.",
+    )
+    batch_max_ids: int = Field(
+        default=200,
+        env="BATCH_MAX_IDS",
+        description="Maximum number of ids accepted by the batch recommendation endpoints.",
+    )
+    response_cache_size: int = Field(
+        default=10_000,
+        ge=0,
+        env="RESPONSE_CACHE_SIZE",
+        description="Serialised /recs/similar and /recs/personalized responses kept in an LRU cache; 0 disables it.",
+    )
+    artifact_reload_interval: float = Field(
+        default=5.0,
+        env="ARTIFACT_RELOAD_INTERVAL",
+        description="Seconds between checks for new artifact versions in the API process.",
+    )
+    neighbors_block_size: int = Field(
+        default=1024,
+        env="NEIGHBORS_BLOCK_SIZE",
+        description="Number of catalog rows scored per block when computing neighbours.",
+    )
+    neighbors_workers: int = Field(
+        default=1,
+        env="NEIGHBORS_WORKERS",
+        description="Number of worker processes used to compute neighbours in parallel.",
+    )
+    neighbors_backend: Literal["exact", "lsh"] = Field(
+        default="exact",
+        env="NEIGHBORS_BACKEND",
+        description="Similarity backend: exact all-pairs cosine or the approximate LSH index.",
+    )
+    ann_index_path: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("product_ann_index.npz")),
+        env="ANN_INDEX_PATH",
+        description="Path to the persisted approximate nearest-neighbour index.",
+    )
+    ann_num_tables: int = Field(
+        default=16,
+        env="ANN_NUM_TABLES",
+        description="Number of LSH hash tables; more tables raise recall and memory usage.",
+    )
+    ann_num_bits: int = Field(
+        default=0,
+        env="ANN_NUM_BITS",
+        description="Signature length per LSH table; 0 derives it from the catalog size.",
+    )
+    feature_pipeline_path: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("product_features.pkl")),
+        env="FEATURE_PIPELINE_PATH",
+        description="Path to the fitted product feature pipeline reused for new products.",
+    )
+    feature_vectorizer: Literal["tfidf", "hashing"] = Field(
+        default="tfidf",
+        env="FEATURE_VECTORIZER",
+        description="Text features: a learnt TF-IDF vocabulary or hashed terms with constant memory.",
+    )
+    feature_max_features: int = Field(
+        default=0,
+        ge=0,
+        env="FEATURE_MAX_FEATURES",
+        description="Keep only the most frequent TF-IDF terms; 0 keeps the whole vocabulary.",
+    )
+    feature_hash_bits: int = Field(
+        default=20,
+        ge=10,
+        le=28,
+        env="FEATURE_HASH_BITS",
+        description="The hashing vectorizer uses 2 ** FEATURE_HASH_BITS text columns.",
+    )
+    feature_matrix_path: str = Field(
+        default_factory=lambda: str(Path(__file__).with_name("product_feature_matrix.npz")),
+        env="FEATURE_MATRIX_PATH",
+        description="Feature matrix and row digests kept for incremental neighbour updates.",
+    )
+    neighbors_full_rebuild_every: int = Field(
+        default=20,
+        ge=1,
+        env="NEIGHBORS_FULL_REBUILD_EVERY",
+        description="Incremental neighbour updates after which a full rebuild refits the vocabulary.",
+    )
+    neighbors_max_delta_fraction: float = Field(
+        default=0.1,
+        ge=0.0,
+        le=1.0,
+        env="NEIGHBORS_MAX_DELTA_FRACTION",
+        description="Share of changed products above which an incremental update runs a full rebuild.",
     )
 
     class Config:
@@ -86,6 +399,74 @@ class ServiceSettings(BaseSettings):
         env_file_encoding = "utf-8"
 
 
+# User ids are INTEGER in the gateway's database, so JSON bodies carry numbers;
+# the artifacts key users by their string form.
+UserId = Annotated[Union[int, str], AfterValidator(str)]
+
+
+class Recommendation(BaseModel):
+    """Single ranked product returned by the recommendation endpoints."""
+
+    product_id: str
+    score: float
+
+
+class SessionRating(BaseModel):
+    """A rating the user gave during the current session."""
+
+    product_id: str
+    rating: float
+
+
+class PersonalRequest(BaseModel):
+    """Request body of ``POST /recs/personal``, forwarded unchanged by the gateway."""
+
+    user_id: Optional[UserId] = Field(default=None, description="User to blend precomputed recommendations for.")
+    viewed: List[str] = Field(default_factory=list, description="Recently viewed product ids, oldest first.")
+    carted: List[str] = Field(default_factory=list, description="Product ids added to the cart, oldest first.")
+    rated: List[SessionRating] = Field(default_factory=list, description="Ratings given in this session, oldest first.")
+    categories: List[str] = Field(default_factory=list, description="Only products of any of these categories.")
+    brands: List[str] = Field(default_factory=list, description="Only products of any of these brands.")
+    price_range: Optional[Tuple[float, float]] = Field(
+        default=None,
+        validation_alias=AliasChoices("priceRange", "price_range"),
+        description="Only products priced within [min, max].",
+    )
+
+
+class SimilarBatchRequest(BaseModel):
+    """Request body of ``POST /recs/similar/batch``."""
+
+    product_ids: List[str] = Field(min_length=1, description="Products to find similar items for.")
+    limit: int = Field(default=20, ge=1, description="Maximum number of items per list.")
+    merge: bool = Field(
+        default=False,
+        description="Combine all lists into a single deduplicated list returned as 'items'.",
+    )
+    exclude_input: bool = Field(
+        default=True,
+        description="When merging, drop the requested products from the merged list.",
+    )
+    aggregate: Literal["max", "sum"] = Field(
+        default="max",
+        description="How scores of a product appearing in several lists are combined.",
+    )
+
+
+class PersonalizedBatchRequest(BaseModel):
+    """Request body of ``POST /recs/personalized/batch``."""
+
+    user_ids: List[UserId] = Field(min_length=1, description="Users to recommend products for.")
+    limit: int = Field(default=20, ge=1, description="Maximum number of items per user.")
+
+
+class BatchRecommendationsResponse(BaseModel):
+    """Per-id recommendation lists, or a single merged list in ``items``."""
+
+    results: Dict[str, List[Recommendation]] = Field(default_factory=dict)
+    items: List[Recommendation] = Field(default_factory=list)
+
+
 class CatalogResponse(BaseModel):
     """Response shape returned by the API layer when exposing the catalog endpoint."""
 
@@ -6,179 +6,819 @@ creates a feature matrix composed of:
 * TF-IDF features built from the product title, description, brand and category
 * One-hot encoded categorical features for category, brand and price bin
 
-After building and normalising the features, cosine similarity is computed and
-for each product the top-N neighbours are stored in ``product_neighbors.json``.
+After building and normalising the features, cosine similarity is computed block
+by block (so the full similarity matrix is never held in memory) and for each
+product the top-N neighbours are stored in the columnar ``product_neighbors.bin``
+artifact (see :mod:`artifacts`).
+
+With the ``lsh`` backend the neighbours are approximated through the
+:mod:`ann_index` instead; the index and the fitted feature pipeline are
+persisted so that ``--add-new`` can index products added after the rebuild.
+The exact backend persists its feature matrix instead, and ``--incremental``
+only scores products added, changed or removed since the last build.
 """
 
 from __future__ import annotations
 
+import argparse
 import json
 import logging
+import sys
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy import sparse
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import OneHotEncoder, normalize
 
-from catalog_loader import CatalogLoaderError, load_catalog
-from models import Product, ServiceSettings
+from ann_index import LSHIndex, recall_at_k
+from artifacts import RankedLists, load_artifact, resolve_existing, save_artifact
+from catalog_columns import ColumnarCatalog
+from catalog_loader import CatalogLoaderError, load_catalog_snapshot
+from features import ProductFeaturizer, load_fitted
+from metrics import JobMetrics
+from models import ServiceSettings
+
+try:  # ``resource`` is only available on POSIX platforms.
+    import resource
+except ImportError:  # pragma: no cover - exercised on Windows only
+    resource = None  # type: ignore[assignment]
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_TOP_K = 50
-NEIGHBORS_FILE = Path(__file__).with_name("product_neighbors.json")
+DEFAULT_BLOCK_SIZE = 1024
+PROGRESS_REPORT_ROWS = 50_000
+NEIGHBOR_BACKENDS = ("exact", "lsh")
+# Digest of products removed since the last full rebuild.
+REMOVED_DIGEST = 0
+# Name of the stage timings written to JOB_METRICS_DIR (see :mod:`metrics`).
+NEIGHBORS_JOB = "neighbor_builder"
+
+
+def build_feature_matrix(frame: pd.DataFrame) -> sparse.csr_matrix:
+    return ProductFeaturizer().fit_transform(frame)
+
 
+def _peak_rss_mib() -> float | None:
+    """Return the peak resident set size of the current process in MiB."""
 
-def _products_to_dataframe(products: Iterable[Product]) -> pd.DataFrame:
-    """Convert raw product models into a pandas DataFrame."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ``ru_maxrss`` is reported in kilobytes on Linux and in bytes on macOS.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return peak / divisor
 
-    records: List[Dict[str, Any]] = []
-    for product in products:
-        data = product.model_dump() if hasattr(product, "model_dump") else product.dict()
-        records.append(data)
 
-    frame = pd.DataFrame(records)
-    if frame.empty:
-        raise ValueError("No products available for feature generation")
-    return frame
+def _log_progress(processed: int, total: int, started: float) -> None:
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    peak_rss = _peak_rss_mib()
+    logger.info(
+        "Processed %s/%s rows (%.0f rows/sec, peak RSS %s)",
+        processed,
+        total,
+        processed / elapsed,
+        f"{peak_rss:.1f} MiB" if peak_rss is not None else "n/a",
+    )
 
 
-def _compose_text_features(row: pd.Series) -> str:
-    parts = [
-        row.get("name") or row.get("title") or "",
-        row.get("description") or "",
-        row.get("brand") or "",
-        row.get("category")
-        or row.get("category_id")
-        or row.get("categoryId")
-        or row.get("gender")
-        or "",
+RowNeighbors = Tuple[np.ndarray, np.ndarray]
+
+
+def _top_k_block(
+    block: sparse.csr_matrix,
+    row_offset: int,
+    top_k: int,
+    self_columns: Optional[np.ndarray] = None,
+) -> List[RowNeighbors]:
+    """Select the ``top_k`` highest scoring columns of every row in ``block``.
+
+    ``block`` holds the similarities of rows ``row_offset .. row_offset + n``
+    (or of the rows listed in ``self_columns``) against the full catalog.
+    Self-similarity is skipped and ties are broken by the lower column index
+    so that the result does not depend on how the catalog was split into
+    blocks.
+    """
+
+    block.sort_indices()
+    indptr, indices, data = block.indptr, block.indices, block.data
+
+    rows: List[RowNeighbors] = []
+    for local_idx in range(block.shape[0]):
+        start, end = indptr[local_idx], indptr[local_idx + 1]
+        row_indices = indices[start:end]
+        row_scores = data[start:end]
+
+        self_column = row_offset + local_idx if self_columns is None else self_columns[local_idx]
+        keep = (row_indices != self_column) & (row_scores > 0)
+        row_indices = row_indices[keep]
+        row_scores = row_scores[keep]
+
+        if row_scores.size > top_k:
+            candidates = np.argpartition(-row_scores, top_k - 1)[:top_k]
+            row_indices = row_indices[candidates]
+            row_scores = row_scores[candidates]
+
+        order = np.lexsort((row_indices, -row_scores))
+        rows.append((row_indices[order], row_scores[order]))
+    return rows
+
+
+def _score_block(
+    matrix: sparse.csr_matrix,
+    transposed: sparse.csr_matrix,
+    row_start: int,
+    row_end: int,
+    top_k: int,
+) -> List[RowNeighbors]:
+    similarity = (matrix[row_start:row_end] @ transposed).tocsr()
+    return _top_k_block(similarity, row_start, top_k)
+
+
+def _format_rows(rows: Iterable[RowNeighbors]) -> List[List[Dict[str, float]]]:
+    return [
+        [
+            {"index": int(neighbor_idx), "score": float(score)}
+            for neighbor_idx, score in zip(row_indices, row_scores)
+        ]
+        for row_indices, row_scores in rows
     ]
-    return " ".join(str(part) for part in parts if part)
 
 
-def _assign_price_bins(prices: pd.Series, n_bins: int = 5) -> pd.Series:
-    numeric = pd.to_numeric(prices, errors="coerce")
-    if numeric.notna().sum() < 2:
-        # All values identical or missing.
-        return pd.Series(
-            ["bin_single" if not np.isnan(value) else "missing" for value in numeric],
-            index=prices.index,
-        )
+# Process-local state of pool workers, populated by ``_init_worker``.
+_WORKER_STATE: Dict[str, Any] = {}
 
-    try:
-        bins = pd.qcut(numeric, q=min(n_bins, numeric.nunique()), duplicates="drop")
-    except ValueError:
-        bins = pd.cut(numeric, bins=n_bins)
 
-    labels = bins.astype(str)
-    labels = labels.fillna("missing")
-    labels[numeric.isna()] = "missing"
-    return labels
+def _dump_csr(matrix: sparse.csr_matrix, directory: Path, prefix: str) -> None:
+    np.save(directory / f"{prefix}_data.npy", matrix.data)
+    np.save(directory / f"{prefix}_indices.npy", matrix.indices)
+    np.save(directory / f"{prefix}_indptr.npy", matrix.indptr)
 
 
-def build_feature_matrix(frame: pd.DataFrame) -> sparse.csr_matrix:
-    start = time.perf_counter()
+def _open_csr(directory: Path, prefix: str, shape: Tuple[int, int]) -> sparse.csr_matrix:
+    arrays = (
+        np.load(directory / f"{prefix}_data.npy", mmap_mode="r"),
+        np.load(directory / f"{prefix}_indices.npy", mmap_mode="r"),
+        np.load(directory / f"{prefix}_indptr.npy", mmap_mode="r"),
+    )
+    return sparse.csr_matrix(arrays, shape=shape, copy=False)
 
-    text_corpus = frame.apply(_compose_text_features, axis=1)
-    tfidf = TfidfVectorizer(min_df=1, ngram_range=(1, 2))
-    tfidf_matrix = tfidf.fit_transform(text_corpus)
-    logger.info("TF-IDF matrix shape: %s", tfidf_matrix.shape)
 
-    frame = frame.copy()
-    frame["price_bin"] = _assign_price_bins(frame.get("price"))
+def _init_worker(directory: str, shape: Tuple[int, int], top_k: int) -> None:
+    """Attach a pool worker to the memory-mapped feature matrix."""
 
-    categorical = frame[["brand", "category_id", "price_bin"]].fillna("unknown")
-    encoder = OneHotEncoder(sparse=True, handle_unknown="ignore", dtype=np.float32)
-    categorical_matrix = encoder.fit_transform(categorical)
-    logger.info("Categorical matrix shape: %s", categorical_matrix.shape)
+    path = Path(directory)
+    _WORKER_STATE["matrix"] = _open_csr(path, "matrix", shape)
+    _WORKER_STATE["transposed"] = _open_csr(path, "transposed", (shape[1], shape[0]))
+    _WORKER_STATE["top_k"] = top_k
 
-    feature_matrix = sparse.hstack([tfidf_matrix, categorical_matrix]).tocsr()
-    feature_matrix = normalize(feature_matrix, norm="l2")
 
-    elapsed = time.perf_counter() - start
-    logger.info(
-        "Feature matrix built with shape %s and %s non-zero values in %.2f seconds",
-        feature_matrix.shape,
-        feature_matrix.nnz,
-        elapsed,
+def _score_block_in_worker(bounds: Tuple[int, int]) -> List[RowNeighbors]:
+    row_start, row_end = bounds
+    return _score_block(
+        _WORKER_STATE["matrix"],
+        _WORKER_STATE["transposed"],
+        row_start,
+        row_end,
+        _WORKER_STATE["top_k"],
     )
-    return feature_matrix
 
 
-def compute_neighbors(
-    feature_matrix: sparse.csr_matrix, top_k: int = DEFAULT_TOP_K
-) -> List[List[Dict[str, float]]]:
-    logger.info("Computing cosine similarity for %s products", feature_matrix.shape[0])
+def _iter_parallel_blocks(
+    matrix: sparse.csr_matrix,
+    transposed: sparse.csr_matrix,
+    bounds: List[Tuple[int, int]],
+    top_k: int,
+    workers: int,
+) -> Iterator[List[RowNeighbors]]:
+    """Score ``bounds`` in a process pool, yielding blocks in input order.
+
+    The CSR arrays are written once to a temporary directory and every worker
+    maps them read-only, so the feature matrix is shared through the page
+    cache instead of being pickled into each process.
+    """
+
+    with tempfile.TemporaryDirectory(prefix="neighbors-") as directory:
+        path = Path(directory)
+        _dump_csr(matrix, path, "matrix")
+        _dump_csr(transposed, path, "transposed")
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(directory, matrix.shape, top_k),
+        ) as executor:
+            yield from executor.map(_score_block_in_worker, bounds)
+
+
+def compute_neighbor_rows(
+    feature_matrix: sparse.csr_matrix,
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int = 1,
+) -> List[RowNeighbors]:
+    """Compute the ``top_k`` cosine neighbours of every row of ``feature_matrix``.
+
+    Every row is returned as a ``(neighbour_indices, scores)`` pair of arrays.
+
+    The similarity matrix is never materialised as a whole: rows are processed
+    in blocks of ``block_size`` so that peak memory is bounded by
+    ``block_size x n_products`` similarities regardless of the catalog size.
+    With ``workers > 1`` the blocks are distributed over a process pool; the
+    result is identical to the single-process path.
+    """
+
+    if top_k < 1:
+        raise ValueError("top_k must be a positive integer")
+    if block_size < 1:
+        raise ValueError("block_size must be a positive integer")
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+
+    matrix = sparse.csr_matrix(feature_matrix)
+    total_rows = matrix.shape[0]
+    logger.info(
+        "Computing cosine similarity for %s products in blocks of %s rows using %s worker(s)",
+        total_rows,
+        block_size,
+        workers,
+    )
     start = time.perf_counter()
 
-    similarity = feature_matrix @ feature_matrix.T
-    similarity = similarity.tocsr()
-    similarity.setdiag(0)
-
-    neighbors: List[List[Dict[str, float]]] = []
-    for idx in range(similarity.shape[0]):
-        row = similarity.getrow(idx)
-        if row.nnz == 0:
-            neighbors.append([])
-            continue
-        sorted_idx = np.argsort(row.data)[::-1][:top_k]
-        top_indices = row.indices[sorted_idx]
-        top_scores = row.data[sorted_idx]
-        neighbors.append(
-            [
-                {"index": int(neighbor_idx), "score": float(score)}
-                for neighbor_idx, score in zip(top_indices, top_scores)
-            ]
+    transposed = matrix.T.tocsr()
+    bounds = [
+        (row_start, min(row_start + block_size, total_rows))
+        for row_start in range(0, total_rows, block_size)
+    ]
+    if workers > 1 and len(bounds) > 1:
+        blocks = _iter_parallel_blocks(matrix, transposed, bounds, top_k, workers)
+    else:
+        blocks = (
+            _score_block(matrix, transposed, row_start, row_end, top_k)
+            for row_start, row_end in bounds
         )
 
+    neighbors: List[RowNeighbors] = []
+    blocks_per_report = max(1, PROGRESS_REPORT_ROWS // block_size)
+    for block_number, ((_, row_end), rows) in enumerate(zip(bounds, blocks), start=1):
+        neighbors.extend(rows)
+        if block_number % blocks_per_report == 0 and row_end < total_rows:
+            _log_progress(row_end, total_rows, start)
+
     elapsed = time.perf_counter() - start
     logger.info("Computed neighbours in %.2f seconds", elapsed)
+    _log_progress(total_rows, total_rows, start)
     return neighbors
 
 
+def compute_neighbors(
+    feature_matrix: sparse.csr_matrix,
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int = 1,
+) -> List[List[Dict[str, float]]]:
+    """Same as :func:`compute_neighbor_rows`, formatted as ``{"index", "score"}`` dicts."""
+
+    return _format_rows(compute_neighbor_rows(feature_matrix, top_k, block_size, workers))
+
+
 def save_neighbors(
-    products: List[Product],
-    neighbors: List[List[Dict[str, float]]],
+    product_ids: Sequence[str],
+    neighbors: List[RowNeighbors],
     output_path: Path,
+    artifact_format: str = "binary",
 ) -> None:
-    product_ids = [str(prod.id) for prod in products]
-    mapping: Dict[str, List[Dict[str, float]]] = {}
+    artifact = RankedLists.from_rows(
+        product_ids,
+        neighbors,
+        product_ids,
+        meta={"generated_at": datetime.now(timezone.utc).isoformat(), "source": "content"},
+    )
+    target = save_artifact(output_path, artifact, artifact_format)
+    logger.info("Saved neighbours for %s products to %s", len(artifact), target)
+
+
+def _load_catalog(settings: ServiceSettings, catalog: Optional[ColumnarCatalog] = None) -> ColumnarCatalog:
+    if catalog is None:
+        try:
+            catalog = load_catalog_snapshot(settings=settings)
+        except CatalogLoaderError as exc:
+            logger.error("Failed to load catalog: %s", exc)
+            raise
+    duplicated = pd.Index(catalog.ids).duplicated()
+    if duplicated.any():
+        # Artifacts are keyed by product id, so only the first occurrence is used.
+        logger.warning("Ignoring %s duplicated product ids in the catalog", int(duplicated.sum()))
+        catalog = catalog.take(np.flatnonzero(~duplicated))
+    return catalog
+
+
+def _row_digests(frame: pd.DataFrame) -> np.ndarray:
+    """Hash the feature columns of every product to detect changed rows."""
+
+    digests = pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64, copy=True)
+    digests[digests == REMOVED_DIGEST] = 1
+    return digests
+
+
+class FeatureState:
+    """Feature matrix of the last neighbour build, kept for incremental updates.
+
+    Row ``i`` of ``matrix`` belongs to ``ids[i]``, which is also the id
+    dictionary of the neighbours artifact. ``digests`` detect products whose
+    features changed; removed products keep their zeroed row with the
+    ``REMOVED_DIGEST`` until the next full rebuild compacts the matrix.
+    """
+
+    def __init__(
+        self,
+        matrix: sparse.csr_matrix,
+        ids: np.ndarray,
+        digests: np.ndarray,
+        top_k: int,
+        updates: int = 0,
+    ) -> None:
+        self.matrix = matrix
+        self.ids = ids
+        self.digests = digests
+        self.top_k = top_k
+        self.updates = updates
+
+    def save(self, path: Path) -> None:
+        """Persist the state atomically as an uncompressed ``.npz`` archive."""
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("wb") as handle:
+            np.savez(
+                handle,
+                ids=np.asarray(self.ids, dtype=str),
+                digests=self.digests,
+                matrix_data=self.matrix.data,
+                matrix_indices=self.matrix.indices,
+                matrix_indptr=self.matrix.indptr,
+                matrix_shape=np.asarray(self.matrix.shape),
+                params=np.asarray([self.top_k, self.updates]),
+            )
+            handle.flush()
+        tmp_path.replace(path)
+        logger.info("Saved feature matrix of %s products to %s", len(self.ids), path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureState":
+        with np.load(path, allow_pickle=False) as archive:
+            matrix = sparse.csr_matrix(
+                (archive["matrix_data"], archive["matrix_indices"], archive["matrix_indptr"]),
+                shape=tuple(archive["matrix_shape"]),
+            )
+            top_k, updates = (int(value) for value in archive["params"])
+            return cls(matrix, archive["ids"].astype(object), archive["digests"], top_k, updates)
+
+
+def _replace_matrix_rows(
+    matrix: sparse.csr_matrix,
+    rows: np.ndarray,
+    values: sparse.csr_matrix,
+    n_rows: int,
+) -> sparse.csr_matrix:
+    """Return ``matrix`` grown to ``n_rows`` rows with ``rows`` set to ``values``."""
+
+    matrix = sparse.csr_matrix(matrix, copy=True)
+    matrix.resize((n_rows, matrix.shape[1]))
+    keep = np.ones(n_rows, dtype=matrix.dtype)
+    keep[rows] = 0
+    placement = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=matrix.dtype), (rows, np.arange(len(rows)))),
+        shape=(n_rows, len(rows)),
+    )
+    result = (sparse.diags(keep) @ matrix + placement @ values).tocsr()
+    result.eliminate_zeros()
+    return result
+
 
-    for product_id, row_neighbors in zip(product_ids, neighbors):
-        formatted = []
-        for neighbor in row_neighbors:
-            neighbor_id = product_ids[neighbor["index"]]
-            formatted.append({"product_id": neighbor_id, "score": neighbor["score"]})
-        mapping[product_id] = formatted
+def _make_featurizer(settings: ServiceSettings) -> ProductFeaturizer:
+    return ProductFeaturizer(
+        vectorizer=settings.feature_vectorizer,
+        max_features=settings.feature_max_features,
+        hash_bits=settings.feature_hash_bits,
+    )
+
+
+def _fit_features(settings: ServiceSettings, frame: pd.DataFrame) -> Tuple[ProductFeaturizer, sparse.csr_matrix]:
+    """Fit the feature pipeline, reusing the saved one when the catalog is unchanged."""
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("w", encoding="utf-8") as fp:
-        json.dump(mapping, fp, ensure_ascii=False, indent=2)
-    logger.info("Saved neighbours for %s products to %s", len(mapping), output_path)
+    featurizer = _make_featurizer(settings)
+    cached = load_fitted(Path(settings.feature_pipeline_path), frame, featurizer.options)
+    if cached is not None:
+        return cached, cached.transform(frame)
+    return featurizer, featurizer.fit_transform(frame)
 
 
-def build_product_neighbors(top_k: int = DEFAULT_TOP_K, output_path: Path = NEIGHBORS_FILE) -> None:
+def _make_lsh_index(settings: ServiceSettings) -> LSHIndex:
+    return LSHIndex(
+        num_tables=settings.ann_num_tables,
+        num_bits=settings.ann_num_bits or None,
+    )
+
+
+def build_product_neighbors(
+    top_k: int = DEFAULT_TOP_K,
+    output_path: Optional[Path] = None,
+    backend: Optional[str] = None,
+    catalog: Optional[ColumnarCatalog] = None,
+    job: Optional[JobMetrics] = None,
+) -> None:
     settings = ServiceSettings()
-    try:
-        catalog = load_catalog(settings=settings)
-    except CatalogLoaderError as exc:
-        logger.error("Failed to load catalog: %s", exc)
-        raise
+    # Written where the API reads it (NEIGHBORS_PATH) unless told otherwise.
+    output_path = output_path or Path(settings.fallback_neighbors_path)
+    backend = backend or settings.neighbors_backend
+    if backend not in NEIGHBOR_BACKENDS:
+        raise ValueError(f"Unknown neighbours backend {backend!r}; expected one of {NEIGHBOR_BACKENDS}")
+    job = job or JobMetrics(NEIGHBORS_JOB)
+
+    with job.stage("fetch"):
+        catalog = _load_catalog(settings, catalog)
+    logger.info("Loaded %s products for neighbour computation", len(catalog))
+
+    with job.stage("features"):
+        frame = catalog.to_frame()
+        featurizer, feature_matrix = _fit_features(settings, frame)
+
+    if backend == "lsh":
+        with job.stage("similarity"):
+            index = _make_lsh_index(settings).fit(feature_matrix, catalog.ids.tolist())
+            neighbors = index.all_neighbors(top_k)
+        with job.stage("write"):
+            index.save(Path(settings.ann_index_path))
+            featurizer.save(Path(settings.feature_pipeline_path))
+            save_neighbors(catalog.ids.tolist(), neighbors, output_path, settings.artifact_format)
+            # The exact state no longer matches the refitted feature pipeline.
+            Path(settings.feature_matrix_path).unlink(missing_ok=True)
+        return
+
+    with job.stage("similarity"):
+        neighbors = compute_neighbor_rows(
+            feature_matrix,
+            top_k=top_k,
+            block_size=settings.neighbors_block_size,
+            workers=settings.neighbors_workers,
+        )
+    with job.stage("write"):
+        save_neighbors(catalog.ids.tolist(), neighbors, output_path, settings.artifact_format)
+        # Written after the artifact: a state that does not match the artifact
+        # makes the next incremental update fall back to a full rebuild.
+        featurizer.save(Path(settings.feature_pipeline_path))
+        FeatureState(feature_matrix, catalog.ids, _row_digests(frame), top_k).save(
+            Path(settings.feature_matrix_path)
+        )
 
-    products = catalog.products
-    logger.info("Loaded %s products for neighbour computation", len(products))
 
-    frame = _products_to_dataframe(products)
-    feature_matrix = build_feature_matrix(frame)
-    neighbors = compute_neighbors(feature_matrix, top_k=top_k)
-    save_neighbors(products, neighbors, output_path)
+def _scored_rows(
+    transposed: sparse.csr_matrix,
+    rows: np.ndarray,
+    vectors: sparse.csr_matrix,
+    top_k: int,
+) -> Tuple[List[RowNeighbors], sparse.coo_matrix]:
+    """Neighbours of ``rows`` (whose features are ``vectors``) against the whole matrix.
+
+    The similarities are returned as well, as a ``len(rows) x n_products``
+    COO matrix, so callers can also use the reverse direction.
+    """
+
+    similarity = (vectors @ transposed).tocsr()
+    return _top_k_block(similarity, 0, top_k, self_columns=rows), similarity.tocoo()
+
+
+def _merge_row(
+    indices: np.ndarray,
+    scores: np.ndarray,
+    stale: np.ndarray,
+    candidates: np.ndarray,
+    candidate_scores: np.ndarray,
+    top_k: int,
+) -> RowNeighbors:
+    keep = ~stale[indices]
+    indices = np.concatenate([indices[keep], candidates]).astype(np.int64)
+    scores = np.concatenate([scores[keep].astype(np.float64), candidate_scores])
+    order = np.lexsort((indices, -scores))[:top_k]
+    return indices[order], scores[order]
+
+
+def update_product_neighbors(
+    top_k: int = DEFAULT_TOP_K,
+    output_path: Optional[Path] = None,
+    catalog: Optional[ColumnarCatalog] = None,
+    job: Optional[JobMetrics] = None,
+) -> Dict[str, int]:
+    """Patch the neighbours artifact for products added, changed or removed since the last build.
+
+    The feature pipeline and matrix saved by the last full rebuild are reused:
+    only the changed products are scored against the catalog, and the other
+    rows are patched with the reverse similarities. A row is recomputed only
+    when it was full and one of its neighbours changed or disappeared, since
+    its replacement is unknown. Falls back to :func:`build_product_neighbors`
+    when there is no state, after ``NEIGHBORS_FULL_REBUILD_EVERY`` updates
+    (new products are projected onto the old vocabulary until then) or when
+    the change exceeds ``NEIGHBORS_MAX_DELTA_FRACTION`` of the catalog.
+    """
 
+    settings = ServiceSettings()
+    if settings.neighbors_backend != "exact":
+        raise ValueError("Incremental updates need the exact backend; use --add-new with the lsh backend")
+    output_path = output_path or Path(settings.fallback_neighbors_path)
+    job = job or JobMetrics(NEIGHBORS_JOB)
+
+    start = time.perf_counter()
+    state_path = Path(settings.feature_matrix_path)
+    pipeline_path = Path(settings.feature_pipeline_path)
+    with job.stage("fetch"):
+        existing = resolve_existing(output_path)
+        state: Optional[FeatureState] = None
+        reason: Optional[str] = None
+        if not state_path.exists() or not pipeline_path.exists() or existing is None:
+            reason = "no incremental state from a previous exact build"
+        else:
+            state = FeatureState.load(state_path)
+            artifact = load_artifact(existing)
+            if state.updates >= settings.neighbors_full_rebuild_every:
+                reason = f"{state.updates} incremental updates since the last full rebuild"
+            elif state.top_k != top_k:
+                reason = f"top_k changed from {state.top_k} to {top_k}"
+            else:
+                try:
+                    artifact = artifact.reindex(state.ids)
+                except ValueError:
+                    reason = "the neighbours artifact does not match the saved feature matrix"
+
+        catalog = _load_catalog(settings, catalog)
+    with job.stage("features"):
+        if reason is None:
+            frame = catalog.to_frame()
+            digests = _row_digests(frame)
+            positions = pd.Index(state.ids).get_indexer(catalog.ids)
+            is_new = positions < 0
+            is_changed = ~is_new & (state.digests[np.where(is_new, 0, positions)] != digests)
+            removed = np.flatnonzero(
+                (pd.Index(catalog.ids).get_indexer(state.ids) < 0) & (state.digests != REMOVED_DIGEST)
+            )
+            delta = np.flatnonzero(is_new | is_changed)
+            if delta.size + removed.size > settings.neighbors_max_delta_fraction * len(catalog):
+                reason = f"{delta.size + removed.size} of {len(catalog)} products changed"
+
+    if reason is not None:
+        logger.info("Running a full neighbour rebuild: %s", reason)
+        build_product_neighbors(
+            top_k=top_k, output_path=output_path, backend="exact", catalog=catalog, job=job
+        )
+        return {"full_rebuild": 1}
+
+    stats = {
+        "full_rebuild": 0,
+        "new": int(is_new.sum()),
+        "changed": int(is_changed.sum()),
+        "removed": int(removed.size),
+        "patched": 0,
+        "recomputed": 0,
+    }
+    if not delta.size and not removed.size:
+        logger.info("Catalog unchanged since the last neighbour build")
+        return stats
+
+    n_old = len(state.ids)
+    ids = np.concatenate([state.ids, catalog.ids[is_new]])
+    rows = positions.copy()
+    rows[is_new] = n_old + np.arange(stats["new"])
+    delta_rows = rows[delta]
+
+    with job.stage("features"):
+        featurizer = ProductFeaturizer.load(pipeline_path)
+        vectors = featurizer.transform(catalog.take(delta).to_frame())
+        zeroed = sparse.csr_matrix((removed.size, vectors.shape[1]), dtype=vectors.dtype)
+        matrix = _replace_matrix_rows(
+            state.matrix,
+            np.concatenate([delta_rows, removed]),
+            sparse.vstack([vectors, zeroed]).tocsr(),
+            len(ids),
+        )
+
+    with job.stage("similarity"):
+        # Rows whose lists may hold outdated entries.
+        stale = np.zeros(len(ids), dtype=bool)
+        stale[rows[is_changed]] = True
+        stale[removed] = True
+        replaced = np.zeros(len(ids), dtype=bool)
+        replaced[delta_rows] = True
+        replaced[removed] = True
+
+        key_rows = pd.Index(state.ids).get_indexer(np.char.decode(artifact.keys, "utf-8"))
+        lengths = np.diff(artifact.offsets.astype(np.int64))
+        has_stale = np.bincount(
+            np.repeat(np.arange(len(artifact)), lengths)[stale[artifact.indices]], minlength=len(artifact)
+        ) > 0
+        full = lengths >= top_k
+        recompute = np.zeros(len(ids), dtype=bool)
+        recompute[key_rows[has_stale & full]] = True
+        recompute &= ~replaced
+        # A candidate can only enter a full list by beating its last entry.
+        threshold = np.full(len(ids), -np.inf)
+        last = artifact.scores[np.maximum(artifact.offsets[1:].astype(np.int64) - 1, 0)].astype(np.float64)
+        threshold[key_rows[full]] = last[full]
+
+        transposed = matrix.T.tocsr()
+        new_rows: Dict[int, RowNeighbors] = {}
+        candidate_rows: List[np.ndarray] = []
+        candidate_columns: List[np.ndarray] = []
+        candidate_scores: List[np.ndarray] = []
+        block_size = settings.neighbors_block_size
+        for block_start in range(0, delta.size, block_size):
+            block_rows = delta_rows[block_start:block_start + block_size]
+            block_vectors = vectors[block_start:block_start + block_size]
+            block_neighbours, similarity = _scored_rows(transposed, block_rows, block_vectors, top_k)
+            new_rows.update(zip(block_rows.tolist(), block_neighbours))
+            target, source, score = similarity.col, block_rows[similarity.row], similarity.data
+            keep = (
+                (score > 0)
+                & (target != source)
+                & ~replaced[target]
+                & ~recompute[target]
+                & (score >= threshold[target])
+            )
+            candidate_rows.append(target[keep])
+            candidate_columns.append(source[keep])
+            candidate_scores.append(score[keep])
+
+        recompute_rows = np.flatnonzero(recompute)
+        for block_start in range(0, recompute_rows.size, block_size):
+            block_rows = recompute_rows[block_start:block_start + block_size]
+            block_neighbours, _ = _scored_rows(transposed, block_rows, matrix[block_rows], top_k)
+            new_rows.update(zip(block_rows.tolist(), block_neighbours))
+        stats["recomputed"] = int(recompute_rows.size)
+
+        targets = np.concatenate(candidate_rows) if candidate_rows else np.empty(0, dtype=np.int64)
+        sources = np.concatenate(candidate_columns) if candidate_columns else np.empty(0, dtype=np.int64)
+        scores = np.concatenate(candidate_scores) if candidate_scores else np.empty(0)
+        patched = np.zeros(len(ids), dtype=bool)
+        patched[targets] = True
+        patched[key_rows[has_stale & ~full]] = True
+        patched &= ~replaced & ~recompute
+        order = np.argsort(targets, kind="stable")
+        targets, sources, scores = targets[order], sources[order], scores[order]
+        patched_rows = np.flatnonzero(patched)
+        lows = np.searchsorted(targets, patched_rows, side="left")
+        highs = np.searchsorted(targets, patched_rows, side="right")
+        for row, low, high in zip(patched_rows.tolist(), lows.tolist(), highs.tolist()):
+            row_indices, row_scores = artifact.lookup(ids[row])
+            new_rows[row] = _merge_row(row_indices, row_scores, stale, sources[low:high], scores[low:high], top_k)
+        stats["patched"] = int(patched_rows.size)
+
+    with job.stage("write"):
+        updated_rows = list(new_rows)
+        meta = {
+            **artifact.meta,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "incremental_updates": state.updates + 1,
+        }
+        updated = artifact.replace_rows(
+            [ids[row] for row in updated_rows],
+            [new_rows[row] for row in updated_rows],
+            ids.tolist(),
+            drop=ids[removed].tolist(),
+            meta=meta,
+        )
+        target = save_artifact(output_path, updated, settings.artifact_format)
+
+        state_digests = np.concatenate([state.digests, np.zeros(stats["new"], dtype=np.uint64)])
+        state_digests[rows] = digests
+        state_digests[removed] = REMOVED_DIGEST
+        FeatureState(matrix, ids, state_digests, top_k, state.updates + 1).save(state_path)
+
+    logger.info(
+        "Updated neighbours in %s in %.2f seconds: %s",
+        target,
+        time.perf_counter() - start,
+        stats,
+    )
+    return stats
+
+
+def add_new_products_to_index(job: Optional[JobMetrics] = None) -> int:
+    """Append catalog products that are missing from the persisted ANN index.
+
+    The feature pipeline fitted by the last full rebuild is reused, so new
+    products become queryable through ``/recs/similar`` without recomputing
+    the neighbours of the whole catalog.
+    """
+
+    settings = ServiceSettings()
+    index_path = Path(settings.ann_index_path)
+    pipeline_path = Path(settings.feature_pipeline_path)
+    if not index_path.exists() or not pipeline_path.exists():
+        raise FileNotFoundError(
+            "ANN index or feature pipeline not found; run a full rebuild with the lsh backend first"
+        )
+    job = job or JobMetrics(NEIGHBORS_JOB)
+
+    with job.stage("fetch"):
+        index = LSHIndex.load(index_path)
+        featurizer = ProductFeaturizer.load(pipeline_path)
+        catalog = _load_catalog(settings)
+    missing = np.flatnonzero([product_id not in index for product_id in catalog.ids.tolist()])
+    if not missing.size:
+        logger.info("ANN index already contains every catalog product")
+        return 0
+
+    new_products = catalog.take(missing)
+    with job.stage("features"):
+        vectors = featurizer.transform(new_products.to_frame())
+    with job.stage("similarity"):
+        index.add(vectors, new_products.ids.tolist())
+    with job.stage("write"):
+        index.save(index_path)
+    return len(new_products)
+
+
+def recall_report(top_k: int = DEFAULT_TOP_K, sample_size: int = 1000, seed: int = 0) -> Dict[str, float]:
+    """Compare the LSH backend against the exact path on a sample of products."""
+
+    settings = ServiceSettings()
+    catalog = _load_catalog(settings)
+    _, feature_matrix = _fit_features(settings, catalog.to_frame())
+
+    start = time.perf_counter()
+    index = _make_lsh_index(settings).fit(feature_matrix, catalog.ids.tolist())
+    approximate = index.all_neighbors(top_k)
+    lsh_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(catalog), size=min(sample_size, len(catalog)), replace=False))
+    matrix = sparse.csr_matrix(feature_matrix)
+    transposed = matrix.T.tocsr()
+
+    start = time.perf_counter()
+    exact = [_score_block(matrix, transposed, int(row), int(row) + 1, top_k)[0] for row in sample]
+    exact_seconds = (time.perf_counter() - start) * len(catalog) / max(len(sample), 1)
+
+    report = {
+        "products": float(len(catalog)),
+        "sample_size": float(len(sample)),
+        "k": float(top_k),
+        "recall_at_k": recall_at_k(
+            (row_indices for row_indices, _ in exact),
+            (approximate[row][0] for row in sample),
+            top_k,
+        ),
+        "lsh_build_seconds": lsh_seconds,
+        "exact_seconds_estimated": exact_seconds,
+    }
+    logger.info("Recall report: %s", report)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build product similarity neighbours.")
+    parser.add_argument("--backend", choices=NEIGHBOR_BACKENDS, default=None)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument(
+        "--add-new",
+        action="store_true",
+        help="Append products missing from the ANN index instead of running a full rebuild.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only score products added, changed or removed since the last build (exact backend).",
+    )
+    parser.add_argument(
+        "--recall-report",
+        action="store_true",
+        help="Print recall@k of the LSH backend against the exact computation.",
+    )
+    args = parser.parse_args()
 
-if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    build_product_neighbors()
+    if args.recall_report:
+        print(json.dumps(recall_report(top_k=args.top_k), indent=2))
+        return
+
+    metrics_dir = Path(ServiceSettings().job_metrics_dir)
+    job = JobMetrics(NEIGHBORS_JOB)
+    try:
+        if args.add_new:
+            add_new_products_to_index(job=job)
+        elif args.incremental:
+            update_product_neighbors(top_k=args.top_k, job=job)
+        else:
+            build_product_neighbors(top_k=args.top_k, backend=args.backend, job=job)
+    except BaseException:
+        job.write(metrics_dir, success=False)
+        raise
+    job.write(metrics_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Popularity ranking used for users without personalised recommendations.
+
+The trainer derives a ratings-based popularity score per product and stores
+it as a single-row :class:`~artifacts.RankedLists` artifact. The API blends
+it with the content-based neighbour scores once per artifact load, so a
+cold-start request only slices a precomputed ranking.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from artifacts import RankedLists
+
+POPULARITY_KEY = "all"
+
+
+class PopularRanking:
+    """Products ordered by blended popularity.
+
+    ``ids`` are fixed-width UTF-8 product ids, so the API workers can share
+    one memory-mapped copy of the ranking (see :mod:`shared_artifacts`).
+    """
+
+    def __init__(self, ids: np.ndarray, scores: np.ndarray) -> None:
+        self.ids = ids
+        self.scores = scores
+
+    @classmethod
+    def empty(cls) -> "PopularRanking":
+        return cls(np.empty(0, dtype="S1"), np.empty(0))
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return [
+            {"product_id": product_id.decode("utf-8"), "score": round(score, 6)}
+            for product_id, score in zip(self.ids[:limit].tolist(), self.scores[:limit].tolist())
+        ]
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        return {"ids": self.ids, "scores": self.scores}, {}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> "PopularRanking":
+        return cls(arrays["ids"], arrays["scores"])
+
+
+def compute_rating_popularity(frame: pd.DataFrame) -> RankedLists:
+    """Score products by number of ratings and their Bayesian-average rating.
+
+    The mean rating is shrunk towards the global mean with a prior weight of
+    the median ratings count, then multiplied by ``log1p(count)`` and scaled
+    to ``[0, 1]``.
+    """
+
+    clean = frame.dropna(subset=["product_id", "rating"])
+    if clean.empty:
+        return RankedLists.empty()
+
+    ratings = clean["rating"].astype(float)
+    stats = ratings.groupby(clean["product_id"].astype(str)).agg(["count", "mean"])
+    prior_weight = float(stats["count"].median())
+    global_mean = float(ratings.mean())
+    bayesian_mean = (stats["count"] * stats["mean"] + prior_weight * global_mean) / (
+        stats["count"] + prior_weight
+    )
+    scores = np.log1p(stats["count"].to_numpy()) * bayesian_mean.to_numpy()
+    scores = scores / scores.max() if scores.max() > 0 else scores
+
+    order = np.lexsort((np.arange(scores.size), -scores))
+    return RankedLists.from_rows(
+        [POPULARITY_KEY],
+        [(order, scores[order])],
+        stats.index.tolist(),
+    )
+
+
+def _max_neighbour_scores(neighbours: RankedLists) -> np.ndarray:
+    best = np.full(len(neighbours.ids), -np.inf, dtype=np.float32)
+    np.maximum.at(best, neighbours.indices, neighbours.scores)
+    return best
+
+
+def blend_popularity(
+    neighbours: RankedLists,
+    popularity: RankedLists,
+    popularity_weight: float,
+) -> PopularRanking:
+    """Combine the best neighbour similarity of every product with its popularity.
+
+    Both signals are on a ``[0, 1]`` scale. Products that only appear in one
+    of the sources contribute zero for the other one.
+    """
+
+    scores: Dict[str, float] = {}
+    if len(neighbours.ids):
+        best = _max_neighbour_scores(neighbours)
+        weight = 1.0 - popularity_weight if len(popularity) else 1.0
+        for index in np.flatnonzero(np.isfinite(best)):
+            scores[neighbours.product_id(int(index))] = weight * float(best[index])
+
+    indices, values = popularity.lookup(POPULARITY_KEY)
+    for index, value in zip(indices.tolist(), values.tolist()):
+        product_id = popularity.product_id(index)
+        scores[product_id] = scores.get(product_id, 0.0) + popularity_weight * value
+
+    product_ids = list(scores)
+    values_array = np.fromiter(scores.values(), dtype=np.float64, count=len(product_ids))
+    order = np.argsort(-values_array, kind="stable")
+    if not product_ids:
+        return PopularRanking.empty()
+    ids = np.char.encode(np.asarray(product_ids, dtype=str), "utf-8")
+    return PopularRanking(ids[order], values_array[order])
@@ -0,0 +1,113 @@
+"""Opt-in sampling profiler for hot API requests.
+
+While a profiled request is in flight a background thread takes the stack of
+the thread serving it every ``interval`` seconds and counts identical
+stacks. The result is served by ``GET /debug/profile`` in the collapsed
+format (``frame;frame;frame count`` per line) that ``flamegraph.pl`` and
+speedscope read. Only ``sample_rate`` of the requests to the configured
+paths are profiled, so it can stay enabled on a loaded instance.
+
+Async handlers share the event loop thread: samples taken while another
+request runs on the loop are attributed to the profiled one, and samples
+taken while the loop waits for I/O show up under ``select``. Both are
+visible as separate stacks in the output.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Frames beyond this depth (counted from the innermost one) are dropped.
+MAX_STACK_DEPTH = 64
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Count the stacks of threads serving profiled requests, grouped by path."""
+
+    def __init__(self, paths: Iterable[str], sample_rate: float, interval: float) -> None:
+        self.paths = frozenset(paths)
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Profiled requests in flight: token -> (path, thread ident).
+        self._active: Dict[object, Tuple[str, int]] = {}
+        self._stacks: Counter = Counter()
+        self._requests: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls, routes: str, sample_rate: float, interval_ms: float) -> Optional["StackSampler"]:
+        """Build a sampler from ``PROFILE_*`` settings; ``None`` when profiling is off."""
+
+        paths = [path.strip() for path in routes.split(",") if path.strip()]
+        if not paths or sample_rate <= 0:
+            return None
+        return cls(paths, sample_rate, interval_ms / 1000.0)
+
+    def should_profile(self, path: str) -> bool:
+        return ("*" in self.paths or path in self.paths) and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, path: str) -> Iterator[None]:
+        token = object()
+        with self._lock:
+            self._active[token] = (path, threading.get_ident())
+            self._requests[path] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self._active[token]
+
+    def _run(self) -> None:
+        current = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    # Checked under the lock: a request starting now sees no
+                    # thread and starts a new one.
+                    self._thread = None
+                    return
+                active = list(self._active.values())
+            frames = sys._current_frames()  # pylint: disable=protected-access
+            samples = [
+                (path, _collapse(frames[ident]))
+                for path, ident in active
+                if ident != current and ident in frames
+            ]
+            with self._lock:
+                for path, stack in samples:
+                    self._stacks[f"{path};{stack}"] += 1
+            time.sleep(self.interval)
+
+    def collapsed(self, reset: bool = False) -> str:
+        """Return the collected stacks, prefixed by the request path, in collapsed format."""
+
+        with self._lock:
+            stacks = dict(self._stacks)
+            if reset:
+                self._stacks = Counter()
+                self._requests = Counter()
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._requests)
@@ -1,31 +1,140 @@
 from __future__ import annotations
 
+import io
 import logging
-from typing import Optional
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import psycopg2
 import requests
 
 from models import ServiceSettings
+from streaming import RATING_COLUMNS, parse_ratings
 
 logger = logging.getLogger(__name__)
 
+CURSOR_CHUNK_ROWS = 50_000
 
-def _load_from_database(database_url: str) -> pd.DataFrame:
-    logger.info("Loading ratings from database")
-    with psycopg2.connect(database_url) as connection:
-        query = "SELECT user_id, product_id, rating FROM ratings"
-        frame = pd.read_sql_query(query, connection)
+
+@dataclass
+class RatingsLoad:
+    """Ratings frame together with the ``updated_at`` watermark it covers.
+
+    ``watermark`` is the newest ``updated_at`` seen in the database snapshot
+    the rows were read from; pass it as ``since`` to the next load to fetch
+    only ratings created or changed afterwards. It is ``None`` when the
+    ratings came from the HTTP export, which always returns every rating.
+    """
+
+    frame: pd.DataFrame
+    watermark: Optional[datetime] = None
+    incremental: bool = False
+
+
+def _ratings_query(cursor: Any, since: Optional[datetime]) -> str:
+    query = "SELECT user_id, product_id, rating FROM ratings"
+    if since is None:
+        return query
+    # COPY does not accept bind parameters, so the watermark is quoted by the driver.
+    return cursor.mogrify(query + " WHERE updated_at > %s", (since,)).decode("utf-8")
+
+
+def _typed_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    frame["product_id"] = frame["product_id"].astype(str)
+    frame["rating"] = frame["rating"].astype(np.float64)
     return frame
 
 
-def _load_from_api(base_url: str, token: Optional[str], timeout: float) -> pd.DataFrame:
+def _copy_ratings(cursor: Any, query: str) -> pd.DataFrame:
+    """Read the rows with ``COPY ... TO STDOUT`` and parse them with pandas' C CSV reader."""
+
+    buffer = io.BytesIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    size = buffer.tell()
+    buffer.seek(0)
+    if size == 0:
+        return pd.DataFrame(columns=RATING_COLUMNS)
+    frame = pd.read_csv(
+        buffer,
+        header=None,
+        names=RATING_COLUMNS,
+        dtype={"product_id": str},
+        na_filter=False,
+    )
+    return _typed_frame(frame)
+
+
+def _cursor_ratings(connection: Any, query: str) -> pd.DataFrame:
+    """Read the rows through a named server-side cursor, one chunk at a time."""
+
+    chunks: List[pd.DataFrame] = []
+    with connection.cursor(name="ratings_export") as cursor:
+        cursor.itersize = CURSOR_CHUNK_ROWS
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(CURSOR_CHUNK_ROWS)
+            if not rows:
+                break
+            chunks.append(pd.DataFrame.from_records(rows, columns=RATING_COLUMNS))
+    if not chunks:
+        return pd.DataFrame(columns=RATING_COLUMNS)
+    return _typed_frame(pd.concat(chunks, ignore_index=True))
+
+
+def _load_from_database(
+    database_url: str,
+    since: Optional[datetime] = None,
+    method: str = "copy",
+) -> Tuple[pd.DataFrame, Optional[datetime]]:
+    logger.info(
+        "Loading ratings from database using %s%s",
+        method,
+        f" (updated after {since.isoformat()})" if since is not None else "",
+    )
+    start = time.perf_counter()
+    with closing(psycopg2.connect(database_url)) as connection:
+        # The watermark and the rows are read from the same snapshot, so a
+        # rating written in between is neither lost nor counted twice.
+        connection.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT max(updated_at) FROM ratings")
+                watermark = cursor.fetchone()[0]
+                query = _ratings_query(cursor, since)
+                if method == "copy":
+                    frame = _copy_ratings(cursor, query)
+                else:
+                    frame = _cursor_ratings(connection, query)
+
+    logger.info("Loaded %s ratings from database in %.2f seconds", len(frame), time.perf_counter() - start)
+    return frame, watermark if watermark is not None else since
+
+
+def _load_from_api(
+    base_url: str,
+    token: Optional[str],
+    timeout: float,
+    streaming: bool = True,
+) -> pd.DataFrame:
     url = f"{base_url.rstrip('/')}/ratings/export"
     logger.info("Loading ratings from API %s", url)
     headers = {}
     if token:
         headers["x-export-token"] = token
+
+    if streaming:
+        with requests.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            frame = parse_ratings(response.raw)
+        logger.info("Streamed %s ratings from API", len(frame))
+        return frame
+
     response = requests.get(url, headers=headers, timeout=timeout)
     response.raise_for_status()
     payload = response.json()
@@ -49,28 +158,46 @@ def _load_from_api(base_url: str, token: Optional[str], timeout: float) -> pd.Da
     return pd.DataFrame.from_records(records, columns=["user_id", "product_id", "rating"])
 
 
-def load_ratings(settings: Optional[ServiceSettings] = None) -> pd.DataFrame:
+def load_ratings_since(
+    settings: Optional[ServiceSettings] = None,
+    since: Optional[datetime] = None,
+) -> RatingsLoad:
+    """Load ratings updated after ``since`` (all ratings when it is ``None``).
+
+    Only the database source can filter by ``since``; the HTTP export
+    fallback always returns the full set and reports ``incremental=False``.
+    """
+
     settings = settings or ServiceSettings()
 
     if settings.database_url:
         try:
-            frame = _load_from_database(settings.database_url)
-            if not frame.empty:
-                return frame
+            frame, watermark = _load_from_database(
+                settings.database_url, since, settings.ratings_db_method
+            )
+            if not frame.empty or since is not None:
+                return RatingsLoad(frame, watermark, incremental=since is not None)
             logger.warning("Ratings table in database is empty; falling back to API if configured")
         except Exception as exc:  # pylint: disable=broad-except
             logger.warning("Failed to load ratings from database: %s", exc)
 
     if settings.ratings_api_base_url:
+        if since is not None:
+            logger.warning("The ratings export API cannot filter by date; loading every rating")
         try:
             frame = _load_from_api(
                 settings.ratings_api_base_url,
                 settings.ratings_api_token,
                 settings.ratings_request_timeout,
+                streaming=settings.json_streaming,
             )
-            return frame
+            return RatingsLoad(frame)
         except requests.RequestException as exc:
             logger.warning("Failed to load ratings from API: %s", exc)
 
     logger.info("No ratings source available; returning empty dataset")
-    return pd.DataFrame(columns=["user_id", "product_id", "rating"])
+    return RatingsLoad(pd.DataFrame(columns=["user_id", "product_id", "rating"]))
+
+
+def load_ratings(settings: Optional[ServiceSettings] = None) -> pd.DataFrame:
+    return load_ratings_since(settings).frame
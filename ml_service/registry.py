@@ -0,0 +1,152 @@
+"""Local registry of versioned model artifacts.
+
+The trainer publishes every run into its own directory and then moves a
+``CURRENT`` pointer to it::
+
+    registry/
+        CURRENT                      -> "20240101T120000123456Z"
+        versions/
+            20240101T120000123456Z/
+                manifest.json
+                user_recommendations.bin
+                product_popularity.bin
+                svd_factors.npz
+
+A version directory is complete before it is renamed into ``versions/`` and
+the pointer is replaced with ``os.replace``, so readers see either the old
+or the new version and never a partially written one. The API only reads
+the pointer; it never trains.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from artifacts import resolve_existing
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+VERSIONS_DIR = "versions"
+STAGING_PREFIX = ".staging-"
+
+
+class RegistryError(RuntimeError):
+    """Raised when a version cannot be published."""
+
+
+class ModelRegistry:
+    """Publish and resolve versioned artifacts under ``root``."""
+
+    def __init__(self, root: Path, keep_versions: int = 5) -> None:
+        self.root = Path(root)
+        self.keep_versions = keep_versions
+
+    @property
+    def versions_dir(self) -> Path:
+        return self.root / VERSIONS_DIR
+
+    # ------------------------------------------------------------------
+    # Reads (API)
+    # ------------------------------------------------------------------
+    def current_version(self) -> Optional[str]:
+        try:
+            version = (self.root / CURRENT_FILE).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        return version or None
+
+    def locate(self, filename: str) -> Optional[Path]:
+        """Return ``filename`` (or its ``.json`` sibling) in the current version."""
+
+        version = self.current_version()
+        if version is None:
+            return None
+        return resolve_existing(self.versions_dir / version / filename)
+
+    def manifest(self, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        version = version or self.current_version()
+        if version is None:
+            return None
+        try:
+            with (self.versions_dir / version / MANIFEST_FILE).open(encoding="utf-8") as handle:
+                return json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def versions(self) -> List[str]:
+        if not self.versions_dir.is_dir():
+            return []
+        return sorted(path.name for path in self.versions_dir.iterdir() if path.is_dir())
+
+    # ------------------------------------------------------------------
+    # Writes (trainer)
+    # ------------------------------------------------------------------
+    def staging_dir(self) -> Path:
+        """Create an empty directory the trainer writes a new version into."""
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=self.root))
+
+    def publish(self, staging: Path, meta: Optional[Mapping[str, Any]] = None) -> str:
+        """Turn ``staging`` into a new version and point ``CURRENT`` at it."""
+
+        files = sorted(path.name for path in staging.iterdir() if path.is_file())
+        if not files:
+            raise RegistryError(f"Nothing to publish in {staging}")
+
+        created = datetime.now(timezone.utc)
+        version = created.strftime("%Y%m%dT%H%M%S%fZ")
+        manifest = {
+            "version": version,
+            "created_at": created.isoformat(),
+            "files": files,
+            "meta": dict(meta or {}),
+        }
+        with (staging / MANIFEST_FILE).open("w", encoding="utf-8") as handle:
+            json.dump(manifest, handle, ensure_ascii=False, indent=2, default=str)
+
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        target = self.versions_dir / version
+        os.replace(staging, target)
+        self._point_to(version)
+        logger.info("Published model version %s (%s)", version, ", ".join(files))
+        self.prune()
+        return version
+
+    def _point_to(self, version: str) -> None:
+        # Containers sharing the registry volume all run as PID 1, so the
+        # temporary name cannot be derived from the PID.
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{CURRENT_FILE}.", suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                handle.write(version)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_name, self.root / CURRENT_FILE)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def discard(self, staging: Path) -> None:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def prune(self) -> None:
+        """Delete the oldest versions beyond ``keep_versions``, never the current one."""
+
+        current = self.current_version()
+        stale = [version for version in self.versions()[: -self.keep_versions] if version != current]
+        for version in stale:
+            # Readers may still map files of an old version; unlinking keeps
+            # those mappings valid until they are closed.
+            shutil.rmtree(self.versions_dir / version, ignore_errors=True)
+        if stale:
+            logger.info("Pruned %s old model versions", len(stale))
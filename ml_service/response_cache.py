@@ -0,0 +1,81 @@
+"""Bounded LRU cache of serialised recommendation responses.
+
+Traffic to the single-id endpoints is dominated by a few hot products and
+users, so their JSON bodies are cached as bytes and served without slicing
+the artifact or serialising the list again. Keys contain the versions of the
+artifacts a response was built from; a response can therefore never outlive
+the artifact it came from, and the store listener drops the whole cache as
+soon as a new version is published so stale entries do not hold memory.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+CACHE_STATS = ("hits", "misses", "evictions", "invalidations")
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serialise like FastAPI's ``JSONResponse``."""
+
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseCache:
+    """Thread-safe LRU mapping of keys to response bodies; ``max_entries=0`` disables it."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(CACHE_STATS, 0)
+
+    def fetch(self, key: Hashable, build: Callable[[], Any]) -> bytes:
+        """Return the cached body for ``key`` or serialise ``build()`` and cache it."""
+
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return body
+            self._counters["misses"] += 1
+
+        # Built outside the lock: concurrent misses for one key may both build
+        # it, which is cheaper than serialising every miss behind one lock.
+        body = encode_json(build())
+        if self.max_entries <= 0:
+            return body
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters["evictions"] += 1
+        return body
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self._bytes = 0
+                self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                **self._counters,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,369 @@
+"""On-demand personalised scoring for the API.
+
+``train_model.py`` precomputes a fixed top-N per user, which cannot answer
+longer lists or filtered requests. The :class:`PersonalScorer` ranks the
+catalog for one user per request instead:
+
+* user and item factors are contiguous ``float32`` arrays; items are the
+  catalog products ordered by id, so ties break like in the precomputed
+  lists;
+* the products each user rated form a sparse CSR matrix (users x products)
+  and are excluded from the ranking;
+* every category and the in-stock flag are precomputed bitsets over the
+  products (``np.packbits``), brands a code per product; a price range is a
+  slice of the products ordered by price.
+
+All of it is kept in flat arrays, so the API workers share one
+memory-mapped copy (see :mod:`shared_artifacts`).
+
+A request costs one matrix-vector product and an ``argpartition`` of the
+scores, whatever the ``limit``; selective filters only score the matching
+products.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from catalog_columns import ColumnarCatalog
+from catalog_loader import CatalogSnapshot
+from factor_model import FactorModel
+from popularity import PopularRanking
+
+logger = logging.getLogger(__name__)
+
+# Filters matching at most this share of the products score only the matching
+# rows; gathering them costs about as much as scoring them.
+SPARSE_FILTER_SHARE = 0.25
+
+
+@dataclass(frozen=True)
+class ItemFilter:
+    """Product filters of a personalised request; the default matches every product."""
+
+    categories: Tuple[str, ...] = ()
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: bool = False
+    brands: Tuple[str, ...] = ()
+
+    def __bool__(self) -> bool:
+        return (
+            bool(self.categories)
+            or bool(self.brands)
+            or self.min_price is not None
+            or self.max_price is not None
+            or self.in_stock
+        )
+
+
+NO_FILTER = ItemFilter()
+
+
+def _encode(values: np.ndarray) -> np.ndarray:
+    """Fixed-width UTF-8 bytes; byte order sorts like the strings."""
+
+    if not values.size:
+        return np.empty(0, dtype="S1")
+    return np.char.encode(values.astype(str), "utf-8")
+
+
+def _category_bitsets(columns: List[Tuple[np.ndarray, np.ndarray]], n_items: int) -> Tuple[List[str], np.ndarray]:
+    """Pack one bitset per category value; a product matches any of its ``columns``."""
+
+    masks: Dict[str, np.ndarray] = {}
+    for codes, values in columns:
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(values.size + 1))
+        for code, value in enumerate(values.tolist()):
+            mask = masks.setdefault(value, np.zeros(n_items, dtype=bool))
+            mask[order[bounds[code] : bounds[code + 1]]] = True
+    names = sorted(masks)
+    bits = np.zeros((len(names), (n_items + 7) // 8), dtype=np.uint8)
+    for row, name in enumerate(names):
+        bits[row] = np.packbits(masks[name])
+    return names, bits
+
+
+class PersonalScorer:
+    """Rank the catalog for one user of a :class:`~factor_model.FactorModel` at a time.
+
+    Every member is a flat array (users and products are sorted fixed-width
+    UTF-8 keys looked up by binary search), so the scorer round-trips through
+    :meth:`to_arrays` and is shared by the API workers as one memory-mapped
+    file.
+    """
+
+    # Part of the shared file key: bump when the arrays change.
+    FORMAT = 2
+
+    def __init__(
+        self,
+        arrays: Dict[str, np.ndarray],
+        rating_scale: Tuple[float, float],
+        category_names: List[str],
+        brand_names: List[str],
+    ) -> None:
+        self.arrays = arrays
+        self.user_keys = arrays["user_keys"]
+        self.user_factors = arrays["user_factors"]
+        self.user_biases = arrays["user_biases"]
+        self.product_ids = arrays["product_ids"]
+        self.item_factors = arrays["item_factors"]
+        # Global mean plus item bias, added to every score.
+        self.item_offsets = arrays["item_offsets"]
+        # Products rated by each user as CSR rows over the products.
+        self.rated_indptr = arrays["rated_indptr"]
+        self.rated_indices = arrays["rated_indices"]
+        self.category_bits = arrays["category_bits"]
+        self.in_stock = arrays["in_stock"]
+        # Index into ``brand_names`` per product, -1 without a brand.
+        self.brand_codes = arrays["brand_codes"]
+        self.price_order = arrays["price_order"]
+        # Products without a price sort last and never match a price range.
+        self.sorted_prices = arrays["sorted_prices"]
+        self.rating_scale = rating_scale
+        self.categories = {name: row for row, name in enumerate(category_names)}
+        self.brands = {name: code for code, name in enumerate(brand_names)}
+        self._popular: Tuple[Optional[PopularRanking], np.ndarray] = (None, np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def build(cls, model: FactorModel, catalog: ColumnarCatalog) -> "PersonalScorer":
+        """Index ``model`` over the products of ``catalog``."""
+
+        if not len(catalog):
+            raise ValueError("The catalog has no products to score")
+        start = time.perf_counter()
+        # Deduplicated and sorted like the product index of the precomputed lists.
+        product_ids, first = np.unique(catalog.ids.astype(str), return_index=True)
+        item_factors, item_biases = model.gather(product_ids.astype(object), "item")
+
+        user_keys = _encode(np.asarray(model.user_ids))
+        user_order = np.argsort(user_keys, kind="stable")
+        user_rows = np.empty(user_order.size, dtype=np.int64)
+        user_rows[user_order] = np.arange(user_order.size)
+
+        users = model.rating_users
+        items = pd.Index(product_ids).get_indexer(model.item_ids.astype(str))[model.rating_items]
+        known = (users >= 0) & (items >= 0)
+        rated = sparse.csr_matrix(
+            (np.ones(int(known.sum()), dtype=bool), (user_rows[users[known]], items[known])),
+            shape=(user_keys.size, product_ids.size),
+        )
+        rated.sum_duplicates()
+
+        prices = catalog.prices[first]
+        price_order = np.argsort(prices, kind="stable")
+        category_names, category_bits = _category_bitsets(
+            [
+                (catalog.category_id.codes[first], catalog.category_id.values),
+                (catalog.category.codes[first], catalog.category.values),
+            ],
+            product_ids.size,
+        )
+        scorer = cls(
+            {
+                "user_keys": user_keys[user_order],
+                "user_factors": np.ascontiguousarray(model.user_factors[user_order], dtype=np.float32),
+                "user_biases": np.asarray(model.user_biases[user_order], dtype=np.float32),
+                "product_ids": _encode(product_ids),
+                "item_factors": np.ascontiguousarray(item_factors, dtype=np.float32),
+                "item_offsets": (model.global_mean + item_biases).astype(np.float32),
+                "rated_indptr": rated.indptr.astype(np.int64),
+                "rated_indices": rated.indices.astype(np.int32),
+                "category_bits": category_bits,
+                "in_stock": np.packbits(catalog.in_stock[first]),
+                "brand_codes": catalog.brand.codes[first].astype(np.int32),
+                "price_order": price_order.astype(np.int64),
+                "sorted_prices": prices[price_order][: int(np.count_nonzero(~np.isnan(prices)))],
+            },
+            rating_scale=model.rating_scale,
+            category_names=category_names,
+            brand_names=catalog.brand.values.tolist(),
+        )
+        logger.info(
+            "Indexed %s users and %s products for on-demand scoring in %.2f seconds",
+            len(scorer),
+            product_ids.size,
+            time.perf_counter() - start,
+        )
+        return scorer
+
+    @classmethod
+    def from_files(cls, factors_path: Optional[Path], catalog_path: Optional[Path]) -> Optional["PersonalScorer"]:
+        """Build from ``svd_factors.npz`` and a catalog snapshot; ``None`` until both exist."""
+
+        if factors_path is None or catalog_path is None:
+            return None
+        return cls.build(FactorModel.load(factors_path), CatalogSnapshot.load(catalog_path).to_catalog())
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        meta = {
+            "rating_scale": list(self.rating_scale),
+            "category_names": sorted(self.categories, key=self.categories.get),
+            "brand_names": sorted(self.brands, key=self.brands.get),
+        }
+        return self.arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> "PersonalScorer":
+        return cls(arrays, tuple(meta["rating_scale"]), meta["category_names"], meta["brand_names"])
+
+    def __len__(self) -> int:
+        return int(self.user_keys.shape[0])
+
+    @property
+    def n_items(self) -> int:
+        return int(self.product_ids.shape[0])
+
+    def _user_row(self, user_id: str) -> Optional[int]:
+        encoded = str(user_id).encode("utf-8")
+        if not len(self) or len(encoded) > self.user_keys.dtype.itemsize:
+            return None
+        row = int(np.searchsorted(self.user_keys, encoded))
+        if row < len(self) and self.user_keys[row] == encoded:
+            return row
+        return None
+
+    def candidates(self, item_filter: ItemFilter) -> Optional[np.ndarray]:
+        """Boolean mask of the products matching ``item_filter``; ``None`` matches all."""
+
+        if not item_filter:
+            return None
+        packed: Optional[np.ndarray] = None
+        if item_filter.categories:
+            rows = [self.categories[value] for value in item_filter.categories if value in self.categories]
+            if not rows:
+                return np.zeros(self.n_items, dtype=bool)
+            packed = np.bitwise_or.reduce(self.category_bits[rows], axis=0)
+        if item_filter.in_stock:
+            packed = self.in_stock if packed is None else packed & self.in_stock
+        mask = None if packed is None else np.unpackbits(packed, count=self.n_items).view(bool)
+        if item_filter.brands:
+            codes = [self.brands[value] for value in item_filter.brands if value in self.brands]
+            branded = np.isin(self.brand_codes, codes)
+            mask = branded if mask is None else mask & branded
+
+        if item_filter.min_price is not None or item_filter.max_price is not None:
+            low = 0 if item_filter.min_price is None else np.searchsorted(self.sorted_prices, item_filter.min_price, "left")
+            high = (
+                self.sorted_prices.size
+                if item_filter.max_price is None
+                else np.searchsorted(self.sorted_prices, item_filter.max_price, "right")
+            )
+            in_range = np.zeros(self.n_items, dtype=bool)
+            in_range[self.price_order[low:high]] = True
+            mask = in_range if mask is None else mask & in_range
+        return mask
+
+    def recommend(
+        self, user_id: str, limit: int, item_filter: ItemFilter = NO_FILTER
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Top ``limit`` unrated products for ``user_id``; ``None`` for users unknown to the model."""
+
+        row = self._user_row(user_id)
+        if row is None:
+            return None
+
+        mask = self.candidates(item_filter)
+        if mask is not None and not mask.any():
+            return []
+        rated = self.rated_indices[self.rated_indptr[row] : self.rated_indptr[row + 1]]
+        positions: Optional[np.ndarray] = None
+        if mask is not None and np.count_nonzero(mask) <= SPARSE_FILTER_SHARE * self.n_items:
+            positions = np.flatnonzero(mask)
+            scores = self.item_factors[positions] @ self.user_factors[row]
+            scores += self.item_offsets[positions]
+        else:
+            scores = self.item_factors @ self.user_factors[row]
+            scores += self.item_offsets
+        # Same estimate as ``SVD.predict``: mean + b_u + b_i + p_u . q_i, clipped.
+        scores += self.user_biases[row]
+        np.clip(scores, *self.rating_scale, out=scores)
+
+        if positions is None:
+            if mask is not None:
+                scores[~mask] = -np.inf
+            scores[rated] = -np.inf
+        elif rated.size:
+            hits = np.minimum(np.searchsorted(positions, rated), positions.size - 1)
+            scores[hits[positions[hits] == rated]] = -np.inf
+
+        # Positions are ascending, so ties still break in id order.
+        top = self._top(scores, limit)
+        top_scores = scores[top]
+        if positions is not None:
+            top = positions[top]
+        return [
+            {"product_id": product_id.decode("utf-8"), "score": round(score, 6)}
+            for product_id, score in zip(self.product_ids[top].tolist(), top_scores.tolist())
+        ]
+
+    @staticmethod
+    def _top(scores: np.ndarray, limit: int) -> np.ndarray:
+        """Indices of the ``limit`` highest finite scores, best first.
+
+        Like ``train_model._select_top_n``, scores tied with the last selected
+        one are taken in index order.
+        """
+
+        size = scores.size
+        limit = min(limit, size)
+        if limit <= 0:
+            return np.empty(0, dtype=np.intp)
+        if limit < size:
+            partition = np.argpartition(scores, size - limit)
+            top = partition[size - limit :]
+            threshold = scores[partition[size - limit]]
+            if np.count_nonzero(scores == threshold) > np.count_nonzero(scores[top] == threshold):
+                # Ties straddle the cut: fill up with the lowest tied indices.
+                above = np.flatnonzero(scores > threshold)
+                tied = np.flatnonzero(scores == threshold)[: limit - above.size]
+                top = np.concatenate([above, tied])
+        else:
+            top = np.arange(size)
+        top = top[np.isfinite(scores[top])]
+        return top[np.lexsort((top, -scores[top]))]
+
+    def filter_items(self, items: List[Dict[str, Any]], item_filter: ItemFilter) -> List[Dict[str, Any]]:
+        """Keep the ``items`` whose products are in the catalog and match ``item_filter``."""
+
+        mask = self.candidates(item_filter)
+        if mask is None or not items:
+            return items
+        keys = _encode(np.asarray([item["product_id"] for item in items], dtype=object))
+        positions = np.minimum(np.searchsorted(self.product_ids, keys), max(self.n_items - 1, 0))
+        keep = (self.product_ids[positions] == keys) & mask[positions]
+        return [item for item, kept in zip(items, keep.tolist()) if kept]
+
+    def filter_popular(
+        self, popular: PopularRanking, limit: int, item_filter: ItemFilter = NO_FILTER
+    ) -> List[Dict[str, Any]]:
+        """The most popular products matching ``item_filter``."""
+
+        mask = self.candidates(item_filter)
+        if mask is None:
+            return popular.top(limit)
+        ranking, positions = self._popular
+        if ranking is not popular:
+            # Computed once per popularity version and kept; replacing the
+            # tuple is atomic, so concurrent requests at worst both compute it.
+            positions = np.minimum(np.searchsorted(self.product_ids, popular.ids), max(self.n_items - 1, 0))
+            positions[self.product_ids[positions] != popular.ids] = -1
+            self._popular = (popular, positions)
+        allowed = np.zeros(positions.size, dtype=bool)
+        known = positions >= 0
+        allowed[known] = mask[positions[known]]
+        chosen = np.flatnonzero(allowed)[:limit]
+        return [
+            {"product_id": product_id.decode("utf-8"), "score": round(score, 6)}
+            for product_id, score in zip(popular.ids[chosen].tolist(), popular.scores[chosen].tolist())
+        ]
@@ -0,0 +1,123 @@
+"""Real-time recommendations from in-session signals.
+
+Products a user has just viewed, added to the cart or rated are turned into
+a weighted sum of their neighbour lists, so fresh activity is reflected
+immediately instead of after the next training run. The session score is
+then blended with the user's precomputed recommendations, if any.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from ann_index import LSHIndex
+from artifacts import RankedLists
+
+VIEW_WEIGHT = 1.0
+CART_WEIGHT = 2.0
+RATING_SCALE = (1.0, 5.0)
+# Only the most recent signals of each kind are used to bound request latency.
+MAX_SESSION_SIGNALS = 50
+DEFAULT_TOP_K = 50
+
+
+def _rating_weight(rating: float) -> float:
+    # Maps the rating scale onto [-1, 1]: low ratings push similar products down.
+    lower, upper = RATING_SCALE
+    midpoint = (lower + upper) / 2
+    return (min(max(rating, lower), upper) - midpoint) / (upper - midpoint)
+
+
+def session_weights(
+    viewed: Iterable[str],
+    carted: Iterable[str],
+    rated: Mapping[str, float],
+) -> Dict[str, float]:
+    """Combine the session signals into a single weight per product."""
+
+    weights: Dict[str, float] = {}
+    for product_ids, weight in ((viewed, VIEW_WEIGHT), (carted, CART_WEIGHT)):
+        for product_id in list(product_ids)[-MAX_SESSION_SIGNALS:]:
+            weights[product_id] = weights.get(product_id, 0.0) + weight
+    for product_id, rating in list(rated.items())[-MAX_SESSION_SIGNALS:]:
+        weights[product_id] = weights.get(product_id, 0.0) + _rating_weight(rating)
+    return weights
+
+
+def _normalised(scores: Dict[str, float]) -> Dict[str, float]:
+    peak = max((abs(score) for score in scores.values()), default=0.0)
+    if peak == 0:
+        return scores
+    return {product_id: score / peak for product_id, score in scores.items()}
+
+
+def _aggregate_neighbours(
+    weights: Mapping[str, float],
+    neighbours: RankedLists,
+    index: Optional[LSHIndex],
+) -> Dict[str, float]:
+    positions: List[np.ndarray] = []
+    contributions: List[np.ndarray] = []
+    extra: Dict[str, float] = {}
+    for product_id, weight in weights.items():
+        if weight == 0:
+            continue
+        indices, scores = neighbours.lookup(product_id)
+        if indices.size:
+            positions.append(indices)
+            contributions.append(weight * scores.astype(np.float64))
+        elif index is not None:
+            # Products added after the last full rebuild are only known to the ANN index.
+            for item in index.query_id(product_id, DEFAULT_TOP_K):
+                extra[item["product_id"]] = extra.get(item["product_id"], 0.0) + weight * item["score"]
+
+    scores: Dict[str, float] = {}
+    if positions:
+        # Only the touched products are summed, independent of the catalogue size.
+        unique, inverse = np.unique(np.concatenate(positions), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(contributions), minlength=unique.size)
+        scores = {
+            neighbours.product_id(int(position)): float(total)
+            for position, total in zip(unique.tolist(), totals.tolist())
+        }
+    for product_id, score in extra.items():
+        scores[product_id] = scores.get(product_id, 0.0) + score
+    return scores
+
+
+def score_session(
+    weights: Mapping[str, float],
+    neighbours: RankedLists,
+    personal: List[Dict[str, float]],
+    limit: int,
+    session_weight: float,
+    index: Optional[LSHIndex] = None,
+) -> List[Dict[str, float]]:
+    """Rank products by session similarity blended with ``personal`` recommendations.
+
+    Both signals are scaled to a maximum absolute value of one before being
+    mixed with ``session_weight``; products from the session are excluded.
+    """
+
+    session_scores = _normalised(_aggregate_neighbours(weights, neighbours, index))
+    personal_scores = _normalised({item["product_id"]: item["score"] for item in personal})
+    if not session_scores:
+        session_weight = 0.0
+    elif not personal_scores:
+        session_weight = 1.0
+
+    combined: Dict[str, float] = {}
+    for scores, weight in ((session_scores, session_weight), (personal_scores, 1.0 - session_weight)):
+        if weight == 0:
+            continue
+        for product_id, score in scores.items():
+            combined[product_id] = combined.get(product_id, 0.0) + weight * score
+
+    ranked: List[Tuple[str, float]] = sorted(
+        ((product_id, score) for product_id, score in combined.items() if product_id not in weights and score > 0),
+        key=lambda entry: entry[1],
+        reverse=True,
+    )[:limit]
+    return [{"product_id": product_id, "score": round(score, 6)} for product_id, score in ranked]
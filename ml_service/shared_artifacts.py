@@ -0,0 +1,108 @@
+"""Derived artifacts built once and memory-mapped by every API worker.
+
+Values the API derives from its input artifacts (the popularity ranking, the
+on-demand scorer) would otherwise be rebuilt on the heap of every worker,
+so running several workers multiplied their memory. The
+:class:`SharedArtifactCache` stores each derived value as a memory-mapped
+array file named after the versions of its inputs. The first process that
+needs a version builds it under an exclusive file lock; every other process
+waits for the lock and maps the finished file, so all workers share the
+same page-cache pages and their private memory no longer grows with the
+artifacts.
+
+Shared values implement ``to_arrays() -> (arrays, meta)`` and a
+``from_arrays(arrays, meta)`` classmethod.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import fcntl
+import gc
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterator, Tuple
+
+import numpy as np
+
+from artifacts import map_arrays, write_arrays
+
+logger = logging.getLogger(__name__)
+
+SHARED_MAGIC = b"SHRART01"
+
+Arrays = Tuple[Dict[str, np.ndarray], Dict[str, Any]]
+
+
+def _release_heap() -> None:
+    """Return freed heap pages to the OS where the C library allows it (glibc).
+
+    Building an artifact leaves the heap of the building worker fragmented
+    by freed temporaries; without trimming, that worker would keep the peak
+    of the build as private memory.
+    """
+
+    gc.collect()
+    library = ctypes.util.find_library("c")
+    try:
+        ctypes.CDLL(library).malloc_trim(0)
+    except (AttributeError, OSError, TypeError):
+        pass
+
+
+class SharedArtifactCache:
+    """Directory of derived artifacts keyed by the versions of their inputs."""
+
+    def __init__(self, directory: Path, keep: int = 2) -> None:
+        self.directory = directory
+        # Files per artifact kept on disk; workers still mapping an older one
+        # keep their mapping after it is deleted.
+        self.keep = keep
+
+    def path(self, kind: str, key: Hashable) -> Path:
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:20]
+        return self.directory / f"{kind}-{digest}.bin"
+
+    @contextmanager
+    def _locked(self, kind: str) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with (self.directory / f".{kind}.lock").open("a") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def open_or_build(self, kind: str, key: Hashable, build: Callable[[], Arrays]) -> Arrays:
+        """Map the ``kind`` artifact for ``key``, building it with ``build()`` if no process has yet."""
+
+        path = self.path(kind, key)
+        with self._locked(kind):
+            if path.exists():
+                logger.info("Mapping shared artifact %s from %s", kind, path)
+                return map_arrays(path, SHARED_MAGIC)
+            start = time.perf_counter()
+            arrays, meta = build()
+            nbytes = write_arrays(path, arrays, meta, SHARED_MAGIC)
+            logger.info(
+                "Built shared artifact %s (%s bytes of arrays) in %.2f seconds", kind, nbytes, time.perf_counter() - start
+            )
+            self._prune(kind, path)
+            # The built arrays are dropped in favour of the mapped file, so the
+            # building process ends up with the same footprint as the others.
+            del arrays
+            _release_heap()
+        return map_arrays(path, SHARED_MAGIC)
+
+    def _prune(self, kind: str, current: Path) -> None:
+        files = sorted(self.directory.glob(f"{kind}-*.bin"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in [path for path in files if path != current][max(self.keep - 1, 0) :]:
+            try:
+                os.unlink(path)
+            except OSError as exc:
+                logger.warning("Could not remove shared artifact %s: %s", path, exc)
@@ -2,11 +2,24 @@
 
 set -eu
 
-echo "▶️ Training collaborative filtering model..."
-if python train_model.py; then
-    echo "✅ Training finished"
-else
-    echo "⚠️ Training failed, starting API with fallback recommendations" >&2
-fi
-
-exec uvicorn app:app --host 0.0.0.0 --port 8000
+# The API only serves the latest model published in the registry; training
+# runs in a separate process: `start.sh trainer` (scheduled) or
+# `python trainer.py --once` (on demand).
+case "${1:-api}" in
+    api)
+        # Workers map the derived artifacts from SHARED_ARTIFACTS_DIR, so
+        # adding workers does not multiply the model memory. A single malloc
+        # arena lets the worker that built them return the heap afterwards;
+        # glibc does not shrink the arenas of the reload threads.
+        export MALLOC_ARENA_MAX="${MALLOC_ARENA_MAX:-1}"
+        exec uvicorn app:app --host 0.0.0.0 --port 8000 --workers "${API_WORKERS:-1}"
+        ;;
+    trainer)
+        echo "▶️ Starting scheduled trainer..."
+        exec python trainer.py
+        ;;
+    *)
+        echo "Usage: $0 [api|trainer]" >&2
+        exit 2
+        ;;
+esac
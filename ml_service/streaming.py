@@ -0,0 +1,158 @@
+"""Incremental JSON parsing of large upstream exports.
+
+``response.json()`` materialises the whole body, then the whole object tree,
+then per-row records on top of it, so peak memory grows with several times
+the export size. The helpers here feed the HTTP body to ``ijson`` chunk by
+chunk. Ratings are appended straight into typed column buffers, while
+catalog items are yielded one at a time.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional
+
+import httpx
+import ijson
+import numpy as np
+import pandas as pd
+
+RATING_COLUMNS = ["user_id", "product_id", "rating"]
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class _Interner:
+    """Map repeated ids onto dense ``int32`` codes."""
+
+    def __init__(self) -> None:
+        self.codes: Dict[Hashable, int] = {}
+        self.values: List[Hashable] = []
+
+    def code(self, value: Hashable) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def column(self, codes: np.ndarray) -> np.ndarray:
+        values = np.asarray(self.values) if self.values else np.empty(0)
+        if values.dtype.kind not in "iuf":
+            # Mixed or string ids: the column references the interned objects.
+            values = np.asarray(self.values, dtype=object)
+        return values[codes]
+
+
+class RatingsBuffer:
+    """Columnar accumulator for ``(user_id, product_id, rating)`` rows.
+
+    Ids are interned into ``int32`` codes and ratings stored as ``float32`` in
+    growable ``array`` buffers, so memory grows by 12 bytes per row plus the
+    distinct ids rather than by a dict per row.
+    """
+
+    def __init__(self) -> None:
+        self.users = _Interner()
+        self.products = _Interner()
+        self._user_codes = array("i")
+        self._product_codes = array("i")
+        self._ratings = array("f")
+
+    def __len__(self) -> int:
+        return len(self._ratings)
+
+    def append(self, user_id: Hashable, product_id: Hashable, rating: float) -> None:
+        self._user_codes.append(self.users.code(user_id))
+        self._product_codes.append(self.products.code(product_id))
+        self._ratings.append(rating)
+
+    def to_frame(self) -> pd.DataFrame:
+        user_codes = np.frombuffer(self._user_codes, dtype=np.int32)
+        product_codes = np.frombuffer(self._product_codes, dtype=np.int32)
+        return pd.DataFrame(
+            {
+                "user_id": self.users.column(user_codes),
+                "product_id": self.products.column(product_codes),
+                "rating": np.frombuffer(self._ratings, dtype=np.float32).astype(np.float64),
+            },
+            columns=RATING_COLUMNS,
+        )
+
+
+def parse_ratings(stream: Any) -> pd.DataFrame:
+    """Parse a ``[{"userId", "productId", "rating"}, ...]`` export from a binary file object.
+
+    Each item is decoded by ijson's C backend, copied into the column buffers
+    and dropped right away, so only one row is alive at a time. Rows missing
+    any of the three fields are skipped, like in the buffered loader; rows
+    whose rating is not numeric are skipped as well.
+    """
+
+    buffer = RatingsBuffer()
+    append = buffer.append
+    for item in ijson.items(stream, "item", buf_size=READ_CHUNK_BYTES, use_float=True):
+        if not isinstance(item, dict):
+            continue
+        user_id = item.get("userId")
+        product_id = item.get("productId")
+        rating = item.get("rating")
+        if user_id is None or product_id is None or rating is None:
+            continue
+        try:
+            append(user_id, product_id, float(rating))
+        except (TypeError, ValueError):
+            continue
+    return buffer.to_frame()
+
+
+class _AsyncBodyReader:
+    """Expose an httpx streaming response as the async file object ijson expects."""
+
+    def __init__(self, response: httpx.Response) -> None:
+        self._chunks = response.aiter_bytes(READ_CHUNK_BYTES)
+
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            # ijson probes the return type with ``read(0)``.
+            return b""
+        # An empty read means end of input, so empty chunks are skipped.
+        async for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b""
+
+
+async def iter_catalog_items(response: httpx.Response) -> AsyncIterator[dict]:
+    """Yield products from a streamed ``[...]``, ``{"products": [...]}`` or single-product body.
+
+    Like ``_normalize_payload`` of the loader, a top-level object without a
+    ``products`` list is one product; any other top-level value raises
+    ``ValueError``.
+    """
+
+    item_prefix: Optional[str] = None
+    item: Optional[ijson.ObjectBuilder] = None
+    # The top-level object, built without the products it lists, in case it
+    # turns out to be a single product.
+    root: Optional[ijson.ObjectBuilder] = None
+    async for prefix, event, value in ijson.parse_async(_AsyncBodyReader(response), use_float=True):
+        if item_prefix is None:
+            if event == "start_array":
+                item_prefix = "item"
+            elif event == "start_map":
+                item_prefix, root = "products.item", ijson.ObjectBuilder()
+            else:
+                raise ValueError(f"Unexpected top-level JSON value in catalog response: {event}")
+
+        if item is None and prefix == item_prefix and event == "start_map":
+            item = ijson.ObjectBuilder()
+        if item is not None:
+            item.event(event, value)
+            if prefix == item_prefix and event == "end_map":
+                yield item.value
+                item = None
+        elif root is not None and prefix != item_prefix:
+            root.event(event, value)
+
+    if root is not None and not isinstance(root.value.get("products"), list):
+        yield root.value
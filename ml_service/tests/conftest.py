@@ -0,0 +1,124 @@
+"""Make the service modules importable as top-level modules, as ``uvicorn app:app`` does."""
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+import catalog_loader  # noqa: E402
+from catalog_columns import ColumnarCatalog  # noqa: E402
+from factor_model import FactorModel  # noqa: E402
+from models import ServiceSettings  # noqa: E402
+from scoring import PersonalScorer  # noqa: E402
+
+
+@pytest.fixture
+def scorer() -> PersonalScorer:
+    items = [
+        {
+            "id": f"p{index}",
+            "category_id": f"cat-{index % 3}",
+            "brand": f"brand-{index % 2}",
+            "price": 10.0 + index,
+            "in_stock": index % 2 == 0,
+        }
+        for index in range(12)
+    ]
+    catalog = ColumnarCatalog.from_items(items)
+    rng = np.random.default_rng(0)
+    user_ids = np.asarray(["1", "2"], dtype=object)
+    item_ids = np.asarray([item["id"] for item in items], dtype=object)
+    model = FactorModel(
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=rng.normal(0.0, 0.1, (2, 4)),
+        item_factors=rng.normal(0.0, 0.1, (12, 4)),
+        user_biases=np.zeros(2),
+        item_biases=np.zeros(12),
+        global_mean=3.0,
+        rating_scale=(1.0, 5.0),
+    )
+    model.remember(pd.DataFrame({"user_id": ["1", "1"], "product_id": ["p0", "p4"], "rating": [5, 4]}))
+    return PersonalScorer.build(model, catalog)
+
+
+class CatalogAPI:
+    """Upstream catalog gateway served through ``httpx.MockTransport``.
+
+    ``all_body`` is the ``/api/products/all`` JSON (``None`` answers 404) and
+    ``pages`` are served by the paginated ``/api/products`` endpoint, with
+    ``totalPages`` unless ``total_pages`` is off. Each request takes
+    ``delay`` seconds, and the statuses in ``errors`` are answered first.
+    """
+
+    def __init__(self, base_url: str = "http://catalog.test") -> None:
+        self.base_url = base_url
+        self.all_body: Any = None
+        self.pages: List[List[Dict[str, Any]]] = []
+        self.total_pages = True
+        self.delay = 0.0
+        self.errors: List[int] = []
+        self.requests: List[httpx.Request] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.errors:
+            return httpx.Response(self.errors.pop(0))
+        if request.url.path == "/api/products/all":
+            if self.all_body is None:
+                return httpx.Response(404)
+            return httpx.Response(200, json=self.all_body)
+        if request.url.path == "/api/products":
+            page = int(request.url.params["page"])
+            payload: Dict[str, Any] = {"products": self.pages[page - 1] if page <= len(self.pages) else []}
+            if self.total_pages:
+                payload["totalPages"] = len(self.pages)
+            return httpx.Response(200, json=payload)
+        return httpx.Response(404)
+
+    def paths(self) -> List[str]:
+        return [request.url.path for request in self.requests]
+
+    def pages_requested(self) -> List[int]:
+        return [int(request.url.params["page"]) for request in self.requests if request.url.path == "/api/products"]
+
+
+@pytest.fixture
+def catalog_api(monkeypatch: pytest.MonkeyPatch) -> CatalogAPI:
+    api = CatalogAPI()
+
+    def _client(settings: ServiceSettings) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(api.handle), timeout=settings.request_timeout)
+
+    monkeypatch.setattr(catalog_loader, "_make_client", _client)
+    return api
+
+
+@pytest.fixture
+def ratings() -> pd.DataFrame:
+    """Random ratings of users ``"0"``-``"39"`` for products ``p0``-``p29``."""
+
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "user_id": rng.integers(0, 40, 600).astype(str),
+            "product_id": [f"p{index}" for index in rng.integers(0, 30, 600)],
+            "rating": rng.integers(1, 6, 600).astype(float),
+        }
+    ).drop_duplicates(["user_id", "product_id"])
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from ann_index import LSHIndex
+
+
+@pytest.fixture
+def vectors() -> sparse.csr_matrix:
+    return sparse.random(300, 2_000, density=0.01, format="csr", dtype=np.float32, random_state=0)
+
+
+@pytest.fixture
+def index(vectors: sparse.csr_matrix) -> LSHIndex:
+    return LSHIndex(num_tables=4, num_bits=3, seed=7).fit(vectors[:280], [f"p{row}" for row in range(280)])
+
+
+def test_saved_index_stores_only_the_seed(tmp_path: Path, index: LSHIndex) -> None:
+    index.save(tmp_path / "index.npz")
+
+    loaded = LSHIndex.load(tmp_path / "index.npz")
+
+    with np.load(tmp_path / "index.npz") as archive:
+        assert "planes" not in archive.files
+    assert loaded.planes is None
+    np.testing.assert_array_equal(loaded.codes, index.codes)
+
+
+def test_loaded_index_serves_products_without_planes(tmp_path: Path, index: LSHIndex) -> None:
+    index.save(tmp_path / "index.npz")
+    loaded = LSHIndex.load(tmp_path / "index.npz")
+
+    for product_id in ("p0", "p5", "p17"):
+        assert loaded.query_id(product_id, 10) == index.query_id(product_id, 10)
+    assert loaded.planes is None
+
+
+def test_added_products_are_hashed_with_regenerated_planes(
+    tmp_path: Path, index: LSHIndex, vectors: sparse.csr_matrix
+) -> None:
+    index.save(tmp_path / "index.npz")
+    loaded = LSHIndex.load(tmp_path / "index.npz")
+    new_ids = [f"p{row}" for row in range(280, 300)]
+
+    loaded.add(vectors[280:], new_ids)
+    index.add(vectors[280:], new_ids)
+
+    np.testing.assert_array_equal(loaded.planes, index.planes)
+    np.testing.assert_array_equal(loaded.codes, index.codes)
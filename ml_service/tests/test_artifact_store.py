@@ -0,0 +1,95 @@
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> ArtifactStore:
+    store = ArtifactStore(interval=0.01)
+    for name in ("left", "right"):
+        path = tmp_path / f"{name}.txt"
+        store.register(name, lambda path=path: path, lambda path: path.read_text(), lambda: "")
+    return store
+
+
+def test_refresh_publishes_only_changed_files(tmp_path: Path, store: ArtifactStore) -> None:
+    (tmp_path / "left.txt").write_text("one")
+
+    assert store.refresh()
+    assert store.get("left") == "one"
+    assert store.versions() == {"left": 1, "right": 0}
+    assert not store.refresh()
+
+    (tmp_path / "left.txt").write_text("second")
+    store.refresh()
+
+    assert store.get("left") == "second"
+    assert store.versions() == {"left": 2, "right": 0}
+
+
+def test_broken_file_keeps_previous_version(tmp_path: Path, store: ArtifactStore) -> None:
+    loads: List[str] = []
+
+    def _load(path: Path) -> str:
+        loads.append(path.name)
+        text = path.read_text()
+        if text == "broken":
+            raise ValueError("cannot parse")
+        return text
+
+    store.register("left", lambda: tmp_path / "left.txt", _load, lambda: "")
+    (tmp_path / "left.txt").write_text("good")
+    store.refresh()
+    (tmp_path / "left.txt").write_text("broken")
+
+    store.refresh()
+    store.refresh()
+
+    state = store.state("left")
+    assert (state.value, state.version, state.error) == ("good", 1, "cannot parse")
+    assert len(loads) == 2
+
+
+def test_removed_file_serves_empty_version(tmp_path: Path, store: ArtifactStore) -> None:
+    (tmp_path / "left.txt").write_text("one")
+    store.refresh()
+
+    (tmp_path / "left.txt").unlink()
+    store.refresh()
+
+    assert store.get("left") == ""
+    assert store.versions()["left"] == 2
+
+
+def test_derived_value_is_built_once_per_pass(tmp_path: Path, store: ArtifactStore) -> None:
+    builds: List[str] = []
+
+    def _build(left: str, right: str) -> str:
+        builds.append(left + right)
+        return left + right
+
+    store.derive("both", ["left", "right"], _build, lambda: "")
+    (tmp_path / "left.txt").write_text("a")
+    (tmp_path / "right.txt").write_text("b")
+
+    store.refresh()
+
+    assert store.get("both") == "ab"
+    assert builds == ["ab"]
+
+
+def test_background_thread_picks_up_new_files(tmp_path: Path, store: ArtifactStore) -> None:
+    store.start()
+    try:
+        (tmp_path / "right.txt").write_text("fresh")
+        deadline = time.monotonic() + 5.0
+        while store.get("right") != "fresh" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        store.stop()
+
+    assert store.get("right") == "fresh"
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from catalog_loader import ALL_PAGE, CatalogSnapshot
+from registry import ModelRegistry
+
+# Threads share the PID, like the API and the trainer running as PID 1 of
+# their containers on one volume.
+WRITERS = 8
+
+
+def test_concurrent_snapshot_saves_do_not_interleave(tmp_path: Path) -> None:
+    path = tmp_path / "catalog_snapshot.json"
+    items = [{"id": f"p{index}", "name": "x" * 200} for index in range(2_000)]
+
+    def _save(version: int) -> None:
+        CatalogSnapshot(source=ALL_PAGE, pages={ALL_PAGE: {"items": items}}, version=version).save(path)
+
+    with ThreadPoolExecutor(WRITERS) as pool:
+        list(pool.map(_save, range(1, 4 * WRITERS + 1)))
+
+    assert len(CatalogSnapshot.load(path).items()) == len(items)
+    assert [entry.name for entry in tmp_path.iterdir()] == [path.name]
+
+
+def test_concurrent_publishes_leave_a_valid_pointer(tmp_path: Path) -> None:
+    registry = ModelRegistry(tmp_path, keep_versions=100)
+
+    def _publish(index: int) -> str:
+        staging = registry.staging_dir()
+        (staging / "model.bin").write_bytes(bytes([index]))
+        return registry.publish(staging)
+
+    with ThreadPoolExecutor(WRITERS) as pool:
+        versions = set(pool.map(_publish, range(2 * WRITERS)))
+
+    assert registry.current_version() in versions
+    assert not [entry.name for entry in tmp_path.iterdir() if entry.name.endswith(".tmp")]
@@ -0,0 +1,33 @@
+import json
+from typing import Any, Dict, List
+
+import pytest
+
+from catalog_columns import ColumnarCatalog
+from models import parse_product
+
+
+@pytest.fixture
+def items() -> List[Dict[str, Any]]:
+    return [
+        {"id": "p0", "name": "Red shirt", "description": "Cotton", "brand": "acme", "price": 19.5, "sizes": ["M"]},
+        {"id": 1, "title": "Blue jeans", "name": "jeans", "category_id": 7, "price": 40},
+        {"id": "p2", "name": "", "description": "", "brand": "", "category_id": "cat-1", "price": "12.5"},
+        {"id": "p3", "name": None, "price": True, "in_stock": False},
+        {"id": "p4"},
+    ]
+
+
+def test_blobs_leave_out_fields_held_in_columns(items: List[Dict[str, Any]]) -> None:
+    catalog = ColumnarCatalog.from_items(items)
+
+    assert json.loads(catalog.extras[0]) == {"sizes": ["M"]}
+    assert json.loads(catalog.extras[4]) == {}
+
+
+def test_products_round_trip_through_columns(items: List[Dict[str, Any]]) -> None:
+    products = ColumnarCatalog.from_items(items).to_products()
+
+    assert [product.model_dump() for product in products] == [
+        parse_product(item).model_dump() for item in items
+    ]
@@ -0,0 +1,173 @@
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import catalog_loader
+from catalog_loader import CatalogCache, CatalogLoaderError, CircuitBreaker, load_catalog, sync_catalog
+from conftest import CatalogAPI
+from models import ServiceSettings
+
+
+def test_sync_falls_back_to_pages_when_all_endpoint_is_empty(tmp_path: Path, catalog_api: CatalogAPI) -> None:
+    catalog_api.all_body = []
+    catalog_api.pages = [[{"id": "p0"}, {"id": "p1"}], [{"id": "p2"}]]
+    settings = ServiceSettings(
+        catalog_api_base_url=catalog_api.base_url,
+        catalog_snapshot_path=str(tmp_path / "catalog_snapshot.json"),
+        page_size=2,
+    )
+
+    snapshot = sync_catalog(settings)
+
+    assert snapshot.source == "paginated"
+    assert [item["id"] for item in snapshot.items()] == ["p0", "p1", "p2"]
+    assert catalog_api.paths()[0] == "/api/products/all"
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        ([{"id": "p0"}, {"id": "p1"}], ["p0", "p1"]),
+        ({"totalPages": 1, "products": [{"id": "p0", "products": []}, {"id": "p1"}]}, ["p0", "p1"]),
+        ({"id": "p0", "item": {"id": "nested"}, "tags": ["a"]}, ["p0"]),
+    ],
+)
+def test_all_endpoint_payload_shapes(catalog_api: CatalogAPI, streaming: bool, body: Any, expected: Any) -> None:
+    catalog_api.all_body = body
+    settings = ServiceSettings(catalog_api_base_url=catalog_api.base_url, json_streaming=streaming)
+
+    catalog = load_catalog(settings)
+
+    assert catalog.source == "all"
+    assert catalog.ids.tolist() == expected
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_unexpected_all_endpoint_payload_raises(catalog_api: CatalogAPI, streaming: bool) -> None:
+    catalog_api.all_body = "not a catalog"
+    settings = ServiceSettings(catalog_api_base_url=catalog_api.base_url, json_streaming=streaming)
+
+    with pytest.raises(CatalogLoaderError, match="Unexpected response format"):
+        load_catalog(settings)
+
+
+def _pages(count: int, size: int) -> List[List[Dict[str, Any]]]:
+    return [[{"id": f"p{page * size + row}"} for row in range(size)] for page in range(count)]
+
+
+def test_pages_are_fetched_concurrently_in_order(catalog_api: CatalogAPI) -> None:
+    catalog_api.pages = _pages(6, 2)
+    catalog_api.delay = 0.05
+    settings = ServiceSettings(catalog_api_base_url=catalog_api.base_url, page_size=2, catalog_concurrency=3)
+
+    catalog = load_catalog(settings)
+
+    assert catalog.source == "paginated"
+    assert catalog.ids.tolist() == [f"p{index}" for index in range(12)]
+    assert catalog_api.max_in_flight == 3
+    assert sorted(catalog_api.pages_requested()) == [1, 2, 3, 4, 5, 6]
+
+
+def test_pages_without_total_are_walked_until_a_short_page(catalog_api: CatalogAPI) -> None:
+    catalog_api.pages = _pages(3, 2) + [[{"id": "last"}]]
+    catalog_api.total_pages = False
+    settings = ServiceSettings(catalog_api_base_url=catalog_api.base_url, page_size=2)
+
+    catalog = load_catalog(settings)
+
+    assert catalog.ids.tolist()[-1] == "last"
+    assert catalog_api.pages_requested() == [1, 2, 3, 4]
+
+
+def test_transient_errors_are_retried(catalog_api: CatalogAPI, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(catalog_loader, "RETRY_BACKOFF_SECONDS", 0.0)
+    catalog_api.all_body = [{"id": "p0"}]
+    catalog_api.errors = [503, 429]
+    settings = ServiceSettings(catalog_api_base_url=catalog_api.base_url, catalog_max_retries=2)
+
+    assert load_catalog(settings).ids.tolist() == ["p0"]
+    assert len(catalog_api.requests) == 3
+
+
+def test_failure_after_retries_raises_loader_error(
+    catalog_api: CatalogAPI, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(catalog_loader, "RETRY_BACKOFF_SECONDS", 0.0)
+    catalog_api.pages = _pages(4, 2)
+    catalog_api.errors = [404] + [503] * 3
+    settings = ServiceSettings(catalog_api_base_url=catalog_api.base_url, page_size=2, catalog_max_retries=2)
+
+    with pytest.raises(CatalogLoaderError, match="503"):
+        load_catalog(settings)
+
+
+@pytest.fixture
+def cache_settings(tmp_path: Path, catalog_api: CatalogAPI) -> ServiceSettings:
+    catalog_api.all_body = [{"id": "p0"}, {"id": "p1"}]
+    return ServiceSettings(
+        catalog_api_base_url=catalog_api.base_url,
+        catalog_snapshot_path=str(tmp_path / "catalog_snapshot.json"),
+        catalog_max_retries=0,
+    )
+
+
+def test_concurrent_cold_requests_share_one_fetch(catalog_api: CatalogAPI, cache_settings: ServiceSettings) -> None:
+    catalog_api.delay = 0.05
+    cache = CatalogCache(cache_settings, ttl=60.0)
+
+    async def _burst() -> list:
+        return await asyncio.gather(*(cache.get() for _ in range(10)))
+
+    catalogs = asyncio.run(_burst())
+
+    assert all(catalog is catalogs[0] for catalog in catalogs)
+    assert catalog_api.paths() == ["/api/products/all"]
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_expired_catalog_is_served_while_refresh_fails(
+    catalog_api: CatalogAPI, cache_settings: ServiceSettings
+) -> None:
+    cache = CatalogCache(cache_settings, ttl=0.0)
+
+    async def _settle() -> None:
+        while cache.stats()["in_flight"]:
+            await asyncio.sleep(0.01)
+
+    async def _scenario() -> tuple:
+        first = await cache.get()
+        catalog_api.errors = [503]
+        stale = await cache.get()
+        await _settle()
+        after_failure = await cache.get()
+        await _settle()
+        return first, stale, after_failure
+
+    first, stale, after_failure = asyncio.run(_scenario())
+
+    assert stale is first
+    assert after_failure is first
+    assert cache.stats()["failures"] == 1
+
+
+def test_open_breaker_rejects_without_calling_upstream(
+    catalog_api: CatalogAPI, cache_settings: ServiceSettings
+) -> None:
+    catalog_api.errors = [500, 500]
+    cache = CatalogCache(cache_settings, ttl=60.0, breaker=CircuitBreaker(failures=2, reset_seconds=60.0))
+
+    async def _call() -> None:
+        await cache.get()
+
+    for _ in range(2):
+        with pytest.raises(CatalogLoaderError, match="500"):
+            asyncio.run(_call())
+    with pytest.raises(CatalogLoaderError, match="Catalog API is failing"):
+        asyncio.run(_call())
+
+    assert len(catalog_api.requests) == 2
+    assert cache.stats()["breaker"] == "open"
+    assert cache.stats()["rejected"] == 1
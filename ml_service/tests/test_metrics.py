@@ -0,0 +1,71 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as service
+from metrics import Histogram, JobMetrics, MetricsRegistry, read_job_metrics
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, ("/a",))
+
+    lines = histogram.render()
+
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 4.05' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+
+
+def test_failing_collector_keeps_other_metrics() -> None:
+    registry = MetricsRegistry()
+    registry.counter("kept_total", "Kept.").inc()
+
+    def _broken() -> list:
+        raise RuntimeError("collector failed")
+
+    registry.add_collector(_broken)
+
+    assert "kept_total 1" in registry.render()
+
+
+def test_job_files_are_merged_per_family(tmp_path: Path) -> None:
+    for job in ("trainer", "neighbors"):
+        metrics = JobMetrics(job)
+        with metrics.stage("fetch"):
+            pass
+        with metrics.stage("fetch"):
+            pass
+        metrics.write(tmp_path, success=job == "trainer")
+
+    text = read_job_metrics(tmp_path)
+
+    assert text.count("# HELP ml_job_stage_seconds") == 1
+    assert 'ml_job_stage_seconds{job="trainer",stage="fetch"}' in text
+    assert 'ml_job_success{job="neighbors"} 0' in text
+    assert 'ml_job_success{job="trainer"} 1' in text
+
+
+@pytest.fixture
+def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[TestClient]:
+    monkeypatch.setenv("JOB_METRICS_DIR", str(tmp_path))
+    JobMetrics("trainer").write(tmp_path)
+    service.get_settings.cache_clear()
+    yield TestClient(service.app)
+    service.get_settings.cache_clear()
+
+
+def test_requests_are_counted_by_route_template(client: TestClient) -> None:
+    client.get("/health")
+    client.get("/no-such-route")
+
+    body = client.get("/metrics").text
+
+    assert 'ml_http_requests_total{method="GET",route="/health",status="200"}' in body
+    assert 'ml_http_requests_total{method="GET",route="unmatched",status="404"}' in body
+    assert 'ml_job_success{job="trainer"} 1' in body
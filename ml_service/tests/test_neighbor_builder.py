@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+import neighbor_builder
+from artifacts import load_artifact
+from catalog_columns import ColumnarCatalog
+from neighbor_builder import build_product_neighbors, compute_neighbor_rows, update_product_neighbors
+
+
+@pytest.fixture
+def neighbors_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "neighbors.bin"
+    monkeypatch.setenv("NEIGHBORS_PATH", str(path))
+    monkeypatch.setenv("FEATURE_PIPELINE_PATH", str(tmp_path / "features.pkl"))
+    monkeypatch.setenv("FEATURE_MATRIX_PATH", str(tmp_path / "feature_matrix.npz"))
+    monkeypatch.setenv("ANN_INDEX_PATH", str(tmp_path / "ann_index.npz"))
+    return path
+
+
+@pytest.fixture
+def items() -> List[Dict[str, Any]]:
+    return [
+        {"id": f"p{index}", "name": f"{colour} shirt", "category_id": f"cat-{index % 2}"}
+        for index, colour in enumerate(["red", "blue", "green", "black", "white", "grey"] * 2)
+    ]
+
+
+def test_full_build_writes_to_neighbors_path(neighbors_path: Path, items: List[Dict[str, Any]]) -> None:
+    build_product_neighbors(top_k=3, catalog=ColumnarCatalog.from_items(items))
+
+    assert load_artifact(neighbors_path).get("p0")
+
+
+def test_incremental_update_writes_to_neighbors_path(neighbors_path: Path, items: List[Dict[str, Any]]) -> None:
+    build_product_neighbors(top_k=3, catalog=ColumnarCatalog.from_items(items))
+    added = {"id": "p12", "name": "red shirt", "category_id": "cat-0"}
+
+    stats = update_product_neighbors(top_k=3, catalog=ColumnarCatalog.from_items(items + [added]))
+
+    assert stats["full_rebuild"] == 0
+    assert load_artifact(neighbors_path).get("p12")
+
+
+def test_incremental_update_of_json_artifact_matches_binary(
+    neighbors_path: Path, items: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    added = {"id": "p12", "name": "red shirt", "category_id": "cat-0"}
+    updated = {}
+    # JSON first: the update reads ``neighbors.bin`` whenever it exists.
+    for artifact_format in ("json", "binary"):
+        monkeypatch.setenv("ARTIFACT_FORMAT", artifact_format)
+        build_product_neighbors(top_k=3, catalog=ColumnarCatalog.from_items(items))
+
+        stats = update_product_neighbors(top_k=3, catalog=ColumnarCatalog.from_items(items + [added]))
+
+        assert stats["full_rebuild"] == 0
+        path = neighbors_path.with_suffix(".json") if artifact_format == "json" else neighbors_path
+        updated[artifact_format] = load_artifact(path)
+
+    for product_id in [item["id"] for item in items] + ["p12"]:
+        assert updated["json"].get(product_id) == updated["binary"].get(product_id)
+
+
+def test_parallel_build_matches_serial_build_byte_for_byte(
+    neighbors_path: Path, items: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    class _FrozenDatetime(datetime):
+        # ``generated_at`` is the only part of the artifact that depends on the run.
+        @classmethod
+        def now(cls, tz: Optional[Any] = None) -> "_FrozenDatetime":
+            return cls(2024, 1, 1, tzinfo=tz or timezone.utc)
+
+    monkeypatch.setattr(neighbor_builder, "datetime", _FrozenDatetime)
+    catalog = ColumnarCatalog.from_items(items)
+    monkeypatch.setenv("NEIGHBORS_BLOCK_SIZE", "4")
+    build_product_neighbors(top_k=3, catalog=catalog)
+    serial = neighbors_path.read_bytes()
+
+    monkeypatch.setenv("NEIGHBORS_WORKERS", "3")
+    build_product_neighbors(top_k=3, catalog=catalog)
+
+    assert neighbors_path.read_bytes() == serial
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64])
+def test_blocked_top_k_matches_dense_similarity(block_size: int) -> None:
+    matrix = sparse.random(40, 25, density=0.2, format="csr", random_state=1)
+    # Duplicate rows produce ties, which must break by the lower index in every block layout.
+    matrix = sparse.vstack([matrix, matrix[:5]]).tocsr()
+    dense = (matrix @ matrix.T).toarray()
+    np.fill_diagonal(dense, 0.0)
+
+    rows = compute_neighbor_rows(matrix, top_k=4, block_size=block_size)
+
+    for row, (indices, scores) in enumerate(rows):
+        positive = np.flatnonzero(dense[row] > 0)
+        expected = positive[np.lexsort((positive, -dense[row, positive]))][:4]
+        np.testing.assert_array_equal(indices, expected)
+        np.testing.assert_allclose(scores, dense[row, expected])
@@ -0,0 +1,80 @@
+from typing import Iterator
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app as service
+from artifacts import RankedLists
+from models import PersonalRequest
+from popularity import PopularRanking
+from scoring import ItemFilter, PersonalScorer
+
+
+@pytest.fixture
+def client(scorer: PersonalScorer) -> Iterator[TestClient]:
+    ids = np.asarray([f"p{index}".encode("utf-8") for index in range(12)])
+    popular = PopularRanking(ids, np.linspace(1.0, 0.1, ids.size))
+    service.app.dependency_overrides.update(
+        {
+            service.get_scorer: lambda: scorer,
+            service.get_popular: lambda: popular,
+            service.get_neighbors: RankedLists.empty,
+            service.get_recommendations: RankedLists.empty,
+            service.get_ann_index: lambda: None,
+        }
+    )
+    try:
+        yield TestClient(service.app)
+    finally:
+        service.app.dependency_overrides.clear()
+
+
+def test_gateway_body_is_parsed() -> None:
+    request = PersonalRequest.model_validate(
+        {"user_id": 42, "categories": ["cat-0"], "brands": ["brand-1"], "priceRange": [10, 20]}
+    )
+
+    assert request.user_id == "42"
+    assert request.price_range == (10.0, 20.0)
+
+
+def test_scorer_filters_by_brand(scorer: PersonalScorer) -> None:
+    ids = [entry["product_id"] for entry in scorer.recommend("2", 20, ItemFilter(brands=("brand-1",)))]
+
+    assert sorted(ids) == sorted(f"p{index}" for index in range(1, 12, 2))
+
+
+def test_filter_items_drops_unknown_and_unmatched(scorer: PersonalScorer) -> None:
+    items = [{"product_id": product_id, "score": 1.0} for product_id in ("p3", "p4", "unknown")]
+
+    assert scorer.filter_items(items, ItemFilter(categories=("cat-0",))) == items[:1]
+
+
+def test_integer_user_id_is_accepted(client: TestClient) -> None:
+    response = client.post("/recs/personal", json={"user_id": 1})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 12
+
+
+def test_gateway_filters_restrict_recommendations(client: TestClient) -> None:
+    body = {"user_id": 1, "categories": ["cat-0"], "brands": ["brand-1"], "priceRange": [10, 20]}
+
+    response = client.post("/recs/personal", json=body)
+
+    assert response.status_code == 200
+    assert sorted(item["product_id"] for item in response.json()) == ["p3", "p9"]
+
+
+def test_inverted_price_range_in_body_is_rejected(client: TestClient) -> None:
+    response = client.post("/recs/personal", json={"user_id": 1, "priceRange": [30, 20]})
+
+    assert response.status_code == 422
+
+
+def test_batch_accepts_integer_user_ids(client: TestClient) -> None:
+    response = client.post("/recs/personalized/batch", json={"user_ids": [1, 2], "limit": 5})
+
+    assert response.status_code == 200
+    assert sorted(response.json()["results"]) == ["1", "2"]
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import _personalized_items
+from artifacts import RankedLists
+from popularity import POPULARITY_KEY, blend_popularity, compute_rating_popularity
+
+
+@pytest.fixture
+def popularity() -> RankedLists:
+    frame = pd.DataFrame(
+        {
+            "user_id": ["1", "2", "3", "1", "2", "1"],
+            "product_id": ["a", "a", "a", "b", "b", "c"],
+            "rating": [5.0, 4.0, 5.0, 2.0, 1.0, 5.0],
+        }
+    )
+    return compute_rating_popularity(frame)
+
+
+@pytest.fixture
+def neighbours() -> RankedLists:
+    return RankedLists.from_rows(["a", "d"], [([1], [0.8]), ([0], [0.4])], ["a", "d"])
+
+
+def test_rating_popularity_ranks_often_and_highly_rated_products_first(popularity: RankedLists) -> None:
+    indices, scores = popularity.lookup(POPULARITY_KEY)
+
+    assert [popularity.product_id(index) for index in indices.tolist()] == ["a", "c", "b"]
+    assert scores[0] == pytest.approx(1.0)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_blend_weights_neighbour_and_rating_scores(popularity: RankedLists, neighbours: RankedLists) -> None:
+    ranking = blend_popularity(neighbours, popularity, popularity_weight=0.25)
+    _, rating_scores = popularity.lookup(POPULARITY_KEY)
+
+    blended = {entry["product_id"]: entry["score"] for entry in ranking.top(10)}
+
+    assert blended["a"] == pytest.approx(0.75 * 0.4 + 0.25 * rating_scores[0], abs=1e-6)
+    assert blended["d"] == pytest.approx(0.75 * 0.8, abs=1e-6)
+    assert list(blended) == sorted(blended, key=blended.get, reverse=True)
+
+
+def test_blend_without_ratings_uses_neighbour_scores_only(neighbours: RankedLists) -> None:
+    ranking = blend_popularity(neighbours, RankedLists.empty(), popularity_weight=0.25)
+
+    assert ranking.top(10) == [{"product_id": "d", "score": 0.8}, {"product_id": "a", "score": 0.4}]
+
+
+def test_unknown_user_gets_the_precomputed_ranking(popularity: RankedLists, neighbours: RankedLists) -> None:
+    ranking = blend_popularity(neighbours, popularity, popularity_weight=0.25)
+
+    items = _personalized_items("unknown", 2, RankedLists.empty(), ranking)
+
+    assert items == ranking.top(2)
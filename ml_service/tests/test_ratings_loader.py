@@ -0,0 +1,134 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+import pandas as pd
+import pytest
+
+import ratings_loader
+from models import ServiceSettings
+from ratings_loader import load_ratings_since
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+WATERMARK = re.compile(r"WHERE updated_at > '([^']+)'")
+
+
+class FakeDatabase:
+    """The ``ratings`` table behind the subset of psycopg2 the loader uses."""
+
+    def __init__(self, rows: List[Tuple[int, str, int, datetime]]) -> None:
+        self.rows = rows
+        self.queries: List[str] = []
+        self.fetches = 0
+
+    def select(self, query: str) -> List[Tuple[int, str, int]]:
+        self.queries.append(query)
+        match = WATERMARK.search(query)
+        since = datetime.fromisoformat(match.group(1)) if match else None
+        return [row[:3] for row in self.rows if since is None or row[3] > since]
+
+
+class FakeCursor:
+    def __init__(self, database: FakeDatabase, name: Optional[str] = None) -> None:
+        self.database = database
+        self.name = name
+        self.itersize = 0
+        self.rows: List[Any] = []
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+    def mogrify(self, query: str, params: Tuple[datetime]) -> bytes:
+        return query.replace("%s", f"'{params[0].isoformat()}'").encode("utf-8")
+
+    def execute(self, query: str) -> None:
+        if query.startswith("SELECT max(updated_at)"):
+            self.rows = [(max((row[3] for row in self.database.rows), default=None),)]
+        else:
+            assert self.name is not None, "rows must be read through a named server-side cursor"
+            self.rows = self.database.select(query)
+
+    def fetchone(self) -> Any:
+        return self.rows[0]
+
+    def fetchmany(self, size: int) -> List[Any]:
+        self.database.fetches += 1
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def copy_expert(self, sql: str, buffer: Any) -> None:
+        query = re.fullmatch(r"COPY \((.*)\) TO STDOUT WITH \(FORMAT csv\)", sql).group(1)
+        for user_id, product_id, rating in self.database.select(query):
+            buffer.write(f"{user_id},{product_id},{rating}\n".encode("utf-8"))
+
+
+class FakeConnection:
+    def __init__(self, database: FakeDatabase) -> None:
+        self.database = database
+
+    def __enter__(self) -> "FakeConnection":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+    def set_session(self, **_: Any) -> None:
+        return None
+
+    def cursor(self, name: Optional[str] = None) -> FakeCursor:
+        return FakeCursor(self.database, name)
+
+    def close(self) -> None:
+        return None
+
+
+@pytest.fixture
+def database(monkeypatch: pytest.MonkeyPatch) -> FakeDatabase:
+    fake = FakeDatabase(
+        [
+            (user, f"{product:03d}", 1 + (user + product) % 5, START + timedelta(minutes=user))
+            for user in range(1, 6)
+            for product in range(4)
+        ]
+    )
+    monkeypatch.setattr(ratings_loader.psycopg2, "connect", lambda _url: FakeConnection(fake))
+    return fake
+
+
+@pytest.mark.parametrize("method", ["copy", "cursor"])
+def test_database_methods_return_typed_ratings(database: FakeDatabase, method: str) -> None:
+    settings = ServiceSettings(database_url="postgresql://ratings", ratings_db_method=method)
+
+    load = load_ratings_since(settings)
+
+    assert len(load.frame) == len(database.rows)
+    assert load.frame["product_id"].tolist()[:2] == ["000", "001"]
+    assert load.frame["rating"].dtype == "float64"
+    assert load.watermark == START + timedelta(minutes=5)
+    assert not load.incremental
+
+
+@pytest.mark.parametrize("method", ["copy", "cursor"])
+def test_since_reads_only_newer_ratings(database: FakeDatabase, method: str) -> None:
+    settings = ServiceSettings(database_url="postgresql://ratings", ratings_db_method=method)
+
+    load = load_ratings_since(settings, since=START + timedelta(minutes=3))
+
+    assert sorted(load.frame["user_id"].unique().tolist()) == [4, 5]
+    assert load.incremental
+    assert "WHERE updated_at >" in database.queries[-1]
+
+
+def test_cursor_reads_in_chunks(database: FakeDatabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ratings_loader, "CURSOR_CHUNK_ROWS", 6)
+    settings = ServiceSettings(database_url="postgresql://ratings", ratings_db_method="cursor")
+
+    frame = load_ratings_since(settings).frame
+
+    assert len(frame) == 20
+    assert database.fetches == 5
+    copied = load_ratings_since(settings.model_copy(update={"ratings_db_method": "copy"})).frame
+    pd.testing.assert_frame_equal(frame, copied)
@@ -0,0 +1,80 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as service
+from artifact_store import ArtifactStore
+from artifacts import RankedLists, load_artifact, save_artifact
+from response_cache import ResponseCache, encode_json
+
+
+def test_hit_returns_cached_body_without_building() -> None:
+    cache = ResponseCache(max_entries=4)
+    builds: List[str] = []
+
+    first = cache.fetch("key", lambda: builds.append("built") or [1])
+    second = cache.fetch("key", lambda: builds.append("built") or [2])
+
+    assert first == second == encode_json([1])
+    assert builds == ["built"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    cache = ResponseCache(max_entries=2)
+    cache.fetch("a", lambda: "a")
+    cache.fetch("b", lambda: "b")
+    cache.fetch("a", lambda: "a")
+
+    cache.fetch("c", lambda: "c")
+
+    assert cache.fetch("a", lambda: "rebuilt") == encode_json("a")
+    assert cache.fetch("b", lambda: "rebuilt") == encode_json("rebuilt")
+    assert cache.stats()["evictions"] == 2
+
+
+def test_zero_entries_disables_the_cache() -> None:
+    cache = ResponseCache(max_entries=0)
+    cache.fetch("key", lambda: 1)
+
+    assert cache.fetch("key", lambda: 2) == encode_json(2)
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def neighbours_path(tmp_path: Path) -> Path:
+    return tmp_path / "neighbors.bin"
+
+
+@pytest.fixture
+def client(neighbours_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    store = ArtifactStore()
+    store.register(service.NEIGHBOURS, lambda: neighbours_path, load_artifact, RankedLists.empty)
+    monkeypatch.setattr(service, "get_artifact_store", lambda: store)
+    # The real factory, so the cache is invalidated by the store like in the service.
+    cache = service.get_response_cache.__wrapped__()
+    monkeypatch.setattr(service, "get_response_cache", lambda: cache)
+    return TestClient(service.app)
+
+
+def _publish(path: Path, neighbour: str) -> None:
+    save_artifact(path, RankedLists.from_rows(["a"], [([0], [0.5])], [neighbour]))
+    service.get_artifact_store().refresh()
+
+
+def test_similar_responses_follow_the_artifact_version(neighbours_path: Path, client: TestClient) -> None:
+    _publish(neighbours_path, "b")
+    first = client.get("/recs/similar", params={"product_id": "a"}).json()
+    cached = client.get("/recs/similar", params={"product_id": "a"}).json()
+
+    # A longer id changes the file size, so the reload does not depend on mtime resolution.
+    _publish(neighbours_path, "longer-c")
+    updated = client.get("/recs/similar", params={"product_id": "a"}).json()
+
+    assert first == cached == [{"product_id": "b", "score": 0.5}]
+    assert updated == [{"product_id": "longer-c", "score": 0.5}]
+    assert service.get_response_cache().stats()["hits"] == 1
+    assert service.get_response_cache().stats()["invalidations"] == 1
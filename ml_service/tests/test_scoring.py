@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from surprise import SVD, Dataset, Reader
+
+from catalog_columns import ColumnarCatalog
+from factor_model import FactorModel
+from scoring import ItemFilter, PersonalScorer
+
+
+@pytest.mark.parametrize(
+    "item_filter",
+    [
+        ItemFilter(categories=("no-such-cat",)),
+        ItemFilter(min_price=999999.0),
+        ItemFilter(min_price=30.0, max_price=20.0),
+        ItemFilter(categories=("cat-1",), max_price=10.5),
+    ],
+)
+def test_filter_matching_nothing_returns_empty_list(scorer: PersonalScorer, item_filter: ItemFilter) -> None:
+    assert scorer.recommend("1", 20, item_filter) == []
+
+
+def test_filter_excludes_rated_and_unmatched_products(scorer: PersonalScorer) -> None:
+    ids = [entry["product_id"] for entry in scorer.recommend("1", 20, ItemFilter(categories=("cat-0",)))]
+
+    assert sorted(ids) == ["p3", "p6", "p9"]
+
+
+def test_inverted_price_range_is_rejected() -> None:
+    from app import app  # pylint: disable=import-outside-toplevel
+
+    response = TestClient(app).get("/recs/personalized", params={"user_id": "1", "min_price": 30, "max_price": 20})
+
+    assert response.status_code == 422
+
+
+def test_scores_match_svd_predict(ratings: pd.DataFrame) -> None:
+    trainset = Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5))).build_full_trainset()
+    algorithm = SVD(n_factors=8, n_epochs=10, random_state=0)
+    algorithm.fit(trainset)
+    # ``p30`` is unknown to the model and scored from the biases alone.
+    catalog = ColumnarCatalog.from_items([{"id": f"p{index}"} for index in range(31)])
+    scorer = PersonalScorer.build(FactorModel.from_svd(algorithm, ratings), catalog)
+
+    for user_id in ("0", "7", "21"):
+        recommendations = scorer.recommend(user_id, 31)
+
+        assert recommendations
+        for entry in recommendations:
+            expected = algorithm.predict(user_id, entry["product_id"]).est
+            assert entry["score"] == pytest.approx(expected, abs=1e-5)
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+import pytest
+
+import models
+from models import ServiceSettings
+
+
+@pytest.mark.parametrize(
+    ("variable", "field", "value", "expected"),
+    [
+        ("NEIGHBORS_PATH", "fallback_neighbors_path", "/tmp/neighbours.bin", "/tmp/neighbours.bin"),
+        ("CATALOG_REQUEST_TIMEOUT", "request_timeout", "3", 3.0),
+        ("CATALOG_PAGE_SIZE", "page_size", "7", 7),
+    ],
+)
+def test_documented_variable_names_are_read(monkeypatch, variable, field, value, expected) -> None:
+    monkeypatch.setenv(variable, value)
+
+    assert getattr(ServiceSettings(), field) == expected
+
+
+def test_catalog_snapshot_does_not_depend_on_the_working_directory(monkeypatch, tmp_path) -> None:
+    monkeypatch.delenv("CATALOG_SNAPSHOT_PATH", raising=False)
+    monkeypatch.chdir(tmp_path)
+
+    path = Path(ServiceSettings().catalog_snapshot_path)
+
+    assert path.is_absolute()
+    assert path.parent == Path(models.__file__).parent
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+import pytest
+
+import train_model
+from catalog_columns import ColumnarCatalog
+from factor_model import FactorModel, holdout_mask
+from models import ServiceSettings
+from ratings_loader import RatingsLoad
+
+WATERMARK = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class RatingsSource:
+    """Database source: every rating up to ``WATERMARK``, then ``changed``."""
+
+    def __init__(self, ratings: pd.DataFrame) -> None:
+        self.ratings = ratings
+        self.changed = ratings.iloc[:0]
+        self.calls: List[Optional[datetime]] = []
+
+    def load(self, settings: ServiceSettings, since: Optional[datetime] = None) -> RatingsLoad:
+        self.calls.append(since)
+        if since is None:
+            return RatingsLoad(self.ratings, WATERMARK)
+        return RatingsLoad(self.changed, WATERMARK.replace(year=2025), incremental=True)
+
+
+@pytest.fixture
+def source(ratings: pd.DataFrame) -> RatingsSource:
+    return RatingsSource(ratings)
+
+
+@pytest.fixture
+def run(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, source: RatingsSource) -> Callable[..., Dict[str, Any]]:
+    catalog = ColumnarCatalog.from_items([{"id": f"p{index}"} for index in range(30)])
+    monkeypatch.setattr(train_model, "load_ratings_since", source.load)
+    monkeypatch.setattr(train_model, "load_catalog_snapshot", lambda settings: catalog)
+    settings = ServiceSettings(training_engine="als", svd_holdout_fraction=0.2, svd_factors=4, als_epochs=3)
+
+    def _run(incremental: bool = False) -> Dict[str, Any]:
+        return train_model.train(
+            settings,
+            output_path=tmp_path / "recommendations.bin",
+            popularity_path=tmp_path / "popularity.bin",
+            factors_path=tmp_path / "factors.npz",
+            incremental=incremental,
+        )
+
+    return _run
+
+
+def test_published_model_is_trained_on_held_out_ratings(
+    tmp_path: Path, run: Callable[..., Dict[str, Any]], ratings: pd.DataFrame
+) -> None:
+    summary = run()
+
+    clean = train_model._prepare_ratings(ratings)  # pylint: disable=protected-access
+    model = FactorModel.load(tmp_path / "factors.npz")
+    assert summary["rmse"] is not None
+    assert summary["holdout_ratings"] == int(holdout_mask(clean, 0.2).sum()) > 0
+    assert len(model.rating_users) == len(clean)
+    assert set(model.user_ids) == set(clean["user_id"])
+
+
+def test_evaluation_reuses_the_published_fit(
+    monkeypatch: pytest.MonkeyPatch, run: Callable[..., Dict[str, Any]]
+) -> None:
+    fits = []
+    train = train_model._train_model  # pylint: disable=protected-access
+
+    def _counting(frame: pd.DataFrame, settings: ServiceSettings) -> FactorModel:
+        fits.append(len(frame))
+        return train(frame, settings)
+
+    monkeypatch.setattr(train_model, "_train_model", _counting)
+    run()
+
+    assert len(fits) == 1
+
+
+def test_incremental_run_reports_held_out_rmse(run: Callable[..., Dict[str, Any]]) -> None:
+    full = run()
+    incremental = run(incremental=True)
+
+    assert incremental["mode"] == "incremental"
+    assert incremental["holdout_ratings"] == full["holdout_ratings"]
+    assert incremental["rmse"] == pytest.approx(full["rmse"], rel=0.2)
+
+
+def test_incremental_run_reads_only_ratings_after_the_watermark(
+    tmp_path: Path, run: Callable[..., Dict[str, Any]], source: RatingsSource
+) -> None:
+    run()
+    user_id, product_id, rating = source.ratings.iloc[0]
+    changed_rating = 1.0 if rating != 1.0 else 2.0
+    source.changed = pd.DataFrame(
+        {"user_id": [user_id, "new"], "product_id": [product_id, "p1"], "rating": [changed_rating, 4.0]}
+    )
+
+    summary = run(incremental=True)
+
+    model = FactorModel.load(tmp_path / "factors.npz")
+    remembered = model.ratings().set_index(["user_id", "product_id"])["rating"]
+    assert source.calls == [None, WATERMARK]
+    assert summary["ratings_load"] == "incremental"
+    assert summary["touched_users"] == 2
+    assert len(remembered) == len(source.ratings) + 1
+    assert remembered[(user_id, product_id)] == changed_rating
+    assert remembered[("new", "p1")] == 4.0
+    assert model.watermark == WATERMARK.replace(year=2025).isoformat()
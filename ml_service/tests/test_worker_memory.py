@@ -0,0 +1,29 @@
+"""Per-worker memory must not grow with the served artifacts (shared via SHARED_ARTIFACTS_DIR)."""
+
+import argparse
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.worker_memory import _measure, _write_artifacts
+
+MAX_HEAP_GROWTH = 0.1
+
+
+def _heap_mib(directory: Path, products: int, private: bool = False) -> float:
+    users = products // 2
+    sample = _write_artifacts(directory, products, users, users * 20, 64)
+    args = argparse.Namespace(workers=2, requests=100, private=private, timeout=120.0)
+    return _measure(directory, sample, args)["anon"]
+
+
+@pytest.mark.skipif(not Path("/proc/self/smaps_rollup").exists(), reason="needs Linux /proc smaps_rollup")
+@pytest.mark.skipif(sys.platform != "linux", reason="MALLOC_ARENA_MAX is glibc-specific")
+def test_worker_heap_stays_flat_as_artifacts_grow(tmp_path: Path) -> None:
+    (tmp_path / "small").mkdir()
+    (tmp_path / "large").mkdir()
+    small = _heap_mib(tmp_path / "small", 2_000)
+    large = _heap_mib(tmp_path / "large", 20_000)
+
+    assert large <= small * (1 + MAX_HEAP_GROWTH), f"worker heap grew from {small:.1f} to {large:.1f} MiB"
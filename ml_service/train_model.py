@@ -1,37 +1,41 @@
 from __future__ import annotations
 
-import json
+import argparse
 import logging
-from collections import defaultdict
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
+import pandas as pd
+from scipy import sparse
 from surprise import Dataset, Reader, SVD
 
-from catalog_loader import CatalogLoaderError, load_catalog
+from als import fit_als
+from artifacts import RankedLists, save_artifact
+from catalog_loader import CatalogLoaderError, load_catalog_snapshot
+from factor_model import RATING_COLUMNS, FactorModel, holdout_mask
+from metrics import JobMetrics
 from models import ServiceSettings
-from ratings_loader import load_ratings
+from popularity import compute_rating_popularity
+from ratings_loader import load_ratings_since
 
 logger = logging.getLogger(__name__)
 
 TOP_N = 20
+RATING_SCALE = (1, 5)
+# Upper bound on the number of scores materialised per user block.
+SCORING_BLOCK_ELEMENTS = 1 << 24
 
 
-def _build_product_index(products: Iterable) -> List[str]:
-    product_ids: List[str] = []
-    for product in products:
-        product_id = getattr(product, "id", None)
-        if product_id is None:
-            continue
-        product_ids.append(str(product_id))
+def _build_product_index(product_ids: Iterable[str]) -> List[str]:
     unique_ids = sorted(set(product_ids))
     logger.info("Collected %s unique products for recommendation scoring", len(unique_ids))
     return unique_ids
 
 
-def _prepare_ratings(frame) -> Dataset | None:
+def _prepare_ratings(frame) -> Optional[pd.DataFrame]:
     if frame is None or frame.empty:
         return None
 
@@ -42,107 +46,398 @@ def _prepare_ratings(frame) -> Dataset | None:
     clean["user_id"] = clean["user_id"].astype(str)
     clean["product_id"] = clean["product_id"].astype(str)
     clean["rating"] = clean["rating"].astype(float)
-
-    reader = Reader(rating_scale=(1, 5))
-    dataset = Dataset.load_from_df(clean[["user_id", "product_id", "rating"]], reader)
-    return dataset
-
-
-def _train_model(dataset: Dataset):
-    trainset = dataset.build_full_trainset()
-    algorithm = SVD()
+    return clean[RATING_COLUMNS].reset_index(drop=True)
+
+
+def _fit_surprise(frame: pd.DataFrame, settings: ServiceSettings) -> FactorModel:
+    reader = Reader(rating_scale=RATING_SCALE)
+    trainset = Dataset.load_from_df(frame, reader).build_full_trainset()
+    algorithm = SVD(
+        n_factors=settings.svd_factors,
+        n_epochs=settings.svd_epochs,
+        lr_all=settings.svd_lr,
+        reg_all=settings.svd_reg,
+    )
     algorithm.fit(trainset)
-    return algorithm, trainset
-
-
-def _compute_user_recommendations(algorithm, frame, product_ids: List[str]) -> Dict[str, List[Dict[str, float]]]:
-    rated_lookup: Dict[str, set[str]] = defaultdict(set)
-    for row in frame.itertuples(index=False):
-        rated_lookup[str(row.user_id)].add(str(row.product_id))
-
-    recommendations: Dict[str, List[Dict[str, float]]] = {}
-
-    for user_id, rated_products in rated_lookup.items():
-        scored: List[tuple[str, float]] = []
-        for product_id in product_ids:
-            if product_id in rated_products:
+    return FactorModel.from_svd(algorithm, frame)
+
+
+def _fit_als(frame: pd.DataFrame, settings: ServiceSettings) -> FactorModel:
+    return fit_als(
+        frame,
+        n_factors=settings.svd_factors,
+        epochs=settings.als_epochs,
+        reg=settings.als_reg,
+        reg_base=settings.als_reg_base,
+        cg_steps=settings.als_cg_steps,
+        workers=settings.als_workers,
+        rating_scale=RATING_SCALE,
+    )
+
+
+# Engines fit a FactorModel from scratch on clean ratings; incremental runs,
+# scoring and evaluation only depend on the FactorModel they return.
+TRAINING_ENGINES: Dict[str, Callable[[pd.DataFrame, ServiceSettings], FactorModel]] = {
+    "surprise": _fit_surprise,
+    "als": _fit_als,
+}
+
+
+def _train_model(frame: pd.DataFrame, settings: ServiceSettings) -> FactorModel:
+    return TRAINING_ENGINES[settings.training_engine](frame, settings)
+
+
+def _previous_factors(
+    settings: ServiceSettings,
+    previous_path: Optional[Path],
+    incremental: bool,
+) -> Tuple[Optional[FactorModel], Optional[str]]:
+    """Load the factors an incremental run warm-starts from.
+
+    Returns the previous model, or ``None`` and the reason a full fit runs:
+    incremental training is off, there are no previous factors, their shape
+    no longer matches the settings, or ``SVD_FULL_RETRAIN_EVERY``
+    incremental runs have passed.
+    """
+
+    if not incremental:
+        return None, "incremental training is disabled"
+    if previous_path is None or not previous_path.exists():
+        return None, "no factors from a previous run"
+    previous = FactorModel.load(previous_path)
+    if previous.updates >= settings.svd_full_retrain_every:
+        return None, f"{previous.updates} incremental runs since the last full fit"
+    if previous.n_factors != settings.svd_factors:
+        return None, f"the number of factors changed from {previous.n_factors} to {settings.svd_factors}"
+    return previous, None
+
+
+def _load_training_ratings(
+    settings: ServiceSettings, previous: Optional[FactorModel]
+) -> Tuple[pd.DataFrame, Optional[datetime], Dict[str, Any]]:
+    """Read the ratings to train on and the watermark they cover.
+
+    A warm start from factors with a database watermark only reads the
+    ratings written since and upserts them into the ratings the factors
+    remember. Ratings deleted in the meantime (users or products removed
+    from the shop) are therefore kept until the next full fit, which reads
+    the whole table again.
+    """
+
+    since = datetime.fromisoformat(previous.watermark) if previous is not None and previous.watermark else None
+    load = load_ratings_since(settings, since)
+    if not load.incremental:
+        return load.frame, load.watermark, {"ratings_load": "full"}
+
+    frame = previous.ratings()
+    changed = _prepare_ratings(load.frame)
+    if changed is not None:
+        frame = pd.concat([frame, changed], ignore_index=True).drop_duplicates(
+            ["user_id", "product_id"], keep="last", ignore_index=True
+        )
+    logger.info("Read %s ratings written since %s", len(load.frame), since.isoformat())
+    return frame, load.watermark, {"ratings_load": "incremental", "changed_ratings": len(load.frame)}
+
+
+def _fit_factors(
+    frame: pd.DataFrame,
+    settings: ServiceSettings,
+    previous: Optional[FactorModel],
+    reason: Optional[str],
+) -> Tuple[FactorModel, Dict[str, Any]]:
+    """Fold ``frame`` into ``previous`` or, when ``reason`` says why not, fit from scratch."""
+
+    start = time.perf_counter()
+    if reason is not None:
+        logger.info("Running a full %s fit: %s", settings.training_engine, reason)
+        model = _train_model(frame, settings)
+        stats: Dict[str, Any] = {"mode": "full", "engine": settings.training_engine}
+    else:
+        users, items, stats = previous.touched(frame)
+        model = previous.fold_in(
+            frame,
+            users,
+            items,
+            settings.svd_incremental_epochs,
+            settings.svd_fold_in_reg,
+            settings.als_reg_base,
+        )
+        stats = {
+            "mode": "incremental",
+            "incremental_runs": model.updates,
+            "touched_users": len(users),
+            "touched_items": len(items),
+            **stats,
+        }
+    stats["fit_seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Fitted %s model in %.2f seconds", stats["mode"], stats["fit_seconds"])
+    return model, stats
+
+
+def _score_block(
+    model: FactorModel,
+    user_factors: np.ndarray,
+    user_biases: np.ndarray,
+    item_factors: np.ndarray,
+    item_biases: np.ndarray,
+) -> np.ndarray:
+    """Vectorised equivalent of ``SVD.predict(u, i).est`` for a user block."""
+
+    scores = user_factors @ item_factors.T
+    scores += model.global_mean + user_biases[:, None] + item_biases[None, :]
+    np.clip(scores, *model.rating_scale, out=scores)
+    return scores
+
+
+def _select_top_n(scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick the ``top_n`` columns of every row ordered by score, then by column.
+
+    ``argpartition`` only finds the threshold score; columns tied with it are
+    taken in ascending order so the result matches a stable descending sort.
+    """
+
+    n_rows, n_cols = scores.shape
+    top_n = min(top_n, n_cols)
+    threshold = -np.partition(-scores, top_n - 1, axis=1)[:, top_n - 1]
+
+    above = scores > threshold[:, None]
+    tied = scores == threshold[:, None]
+    needed = top_n - above.sum(axis=1)
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= needed[:, None]))
+
+    columns = np.nonzero(selected)[1].reshape(n_rows, top_n)
+    top_scores = np.take_along_axis(scores, columns, axis=1)
+    order = np.lexsort((columns, -top_scores), axis=1)
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _compute_user_recommendations(model: FactorModel, frame, product_ids: List[str]) -> RankedLists:
+    """Score every (user, product) pair in bulk and keep the top-N per user.
+
+    Users are processed in blocks so that the dense score matrix stays below
+    ``SCORING_BLOCK_ELEMENTS`` values; products the user already rated are
+    masked through a sparse users x products matrix.
+    """
+
+    user_codes, user_ids = pd.factorize(frame["user_id"].astype(str))
+    product_positions = pd.Index(product_ids).get_indexer(frame["product_id"].astype(str))
+    rated_rows = (user_codes >= 0) & (product_positions >= 0)
+    rated = sparse.csr_matrix(
+        (
+            np.ones(int(rated_rows.sum()), dtype=bool),
+            (user_codes[rated_rows], product_positions[rated_rows]),
+        ),
+        shape=(len(user_ids), len(product_ids)),
+    )
+
+    user_list = [str(user_id) for user_id in user_ids]
+    user_factors, user_biases = model.gather(user_list, "user")
+    item_factors, item_biases = model.gather(product_ids, "item")
+
+    block_size = max(1, SCORING_BLOCK_ELEMENTS // max(len(product_ids), 1))
+    users: List[str] = []
+    rows: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    for start in range(0, len(user_list), block_size):
+        end = min(start + block_size, len(user_list))
+        scores = _score_block(
+            model,
+            user_factors[start:end],
+            user_biases[start:end],
+            item_factors,
+            item_biases,
+        )
+        block_rated = rated[start:end].tocoo()
+        scores[block_rated.row, block_rated.col] = -np.inf
+        scores[~np.isfinite(scores)] = -np.inf
+
+        columns, top_scores = _select_top_n(scores, TOP_N)
+        for offset, (row_columns, row_scores) in enumerate(zip(columns, top_scores)):
+            valid = np.isfinite(row_scores)
+            if not valid.any():
                 continue
-            prediction = algorithm.predict(user_id, product_id)
-            score = float(getattr(prediction, "est", 0.0))
-            if not np.isfinite(score):
-                continue
-            scored.append((product_id, score))
-
-        if not scored:
-            continue
-
-        scored.sort(key=lambda item: item[1], reverse=True)
-        recommendations[user_id] = [
-            {"product_id": product_id, "score": round(score, 6)}
-            for product_id, score in scored[:TOP_N]
-        ]
+            users.append(user_list[start + offset])
+            rows.append((row_columns[valid], row_scores[valid]))
 
+    recommendations = RankedLists.from_rows(users, rows, product_ids)
     logger.info("Computed recommendations for %s users", len(recommendations))
     return recommendations
 
 
-def _write_payload(path: Path, payload: dict) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, ensure_ascii=False, indent=2)
-    logger.info("Saved recommendations to %s", path)
-
-
-def main() -> None:
-    logging.basicConfig(level=logging.INFO)
-    settings = ServiceSettings()
-    output_path = Path(settings.recommendations_output_path)
-
-    ratings_frame = load_ratings(settings)
+def _hottest_users(frame: pd.DataFrame, limit: int) -> pd.DataFrame:
+    """Keep the ratings of the ``limit`` users with the most ratings; 0 keeps every user.
+
+    The API scores every other user on demand from the factors.
+    """
+
+    user_ids = frame["user_id"].astype(str)
+    if limit <= 0 or user_ids.nunique() <= limit:
+        return frame
+    hottest = user_ids.value_counts(sort=True).index[:limit]
+    logger.info("Precomputing recommendations for the %s most active users", limit)
+    return frame[user_ids.isin(hottest).to_numpy()]
+
+
+def _write_payload(path: Path, recommendations: RankedLists, source: str, artifact_format: str) -> None:
+    recommendations.meta.update(
+        {"generated_at": datetime.now(timezone.utc).isoformat(), "source": source}
+    )
+    target = save_artifact(path, recommendations, artifact_format, wrap_key="users")
+    logger.info("Saved recommendations to %s", target)
+
+
+def _evaluate(
+    model: FactorModel, frame: pd.DataFrame, held_out: np.ndarray, settings: ServiceSettings
+) -> Optional[float]:
+    """RMSE on the ``held_out`` ratings of ``model`` with those ratings folded out.
+
+    The users and items with held-out ratings are re-solved on the other
+    ratings, the same fold-in an incremental run applies, and the ones rated
+    only in the held-out split are reset to unknown. Full and incremental
+    runs are therefore scored the same way, from the fit that is published,
+    without a second full fit. The re-solved copy is discarded.
+    """
+
+    train_split, held = frame[~held_out], frame[held_out]
+    users, items = pd.unique(held["user_id"]), pd.unique(held["product_id"])
+    evaluation = model.fold_in(
+        train_split,
+        users,
+        items,
+        settings.svd_incremental_epochs,
+        settings.svd_fold_in_reg,
+        settings.als_reg_base,
+    )
+    cold_users = evaluation.user_index.get_indexer(np.setdiff1d(users, train_split["user_id"].unique()))
+    evaluation.user_factors[cold_users] = 0.0
+    evaluation.user_biases[cold_users] = 0.0
+    cold_items = evaluation.item_index.get_indexer(np.setdiff1d(items, train_split["product_id"].unique()))
+    evaluation.item_factors[cold_items] = 0.0
+    evaluation.item_biases[cold_items] = 0.0
+    return evaluation.rmse(held)
+
+
+def train(
+    settings: ServiceSettings,
+    output_path: Optional[Path] = None,
+    popularity_path: Optional[Path] = None,
+    factors_path: Optional[Path] = None,
+    previous_factors_path: Optional[Path] = None,
+    incremental: Optional[bool] = None,
+    job: Optional[JobMetrics] = None,
+) -> Dict[str, Any]:
+    """Train the model and write the recommendation, popularity and factor artifacts.
+
+    The paths default to the ones configured in ``settings``; the trainer
+    passes paths inside a registry staging directory instead and reads the
+    previous factors from the current version. ``incremental`` defaults to
+    ``SVD_INCREMENTAL``. Stage durations are added to ``job``. Returns a
+    summary that ends up in the registry manifest; ``source`` is ``"svd"``
+    only when a model was actually trained.
+    """
+
+    output_path = output_path or Path(settings.recommendations_output_path)
+    popularity_path = popularity_path or Path(settings.popularity_path)
+    factors_path = factors_path or Path(settings.factor_model_path)
+    previous_factors_path = previous_factors_path or factors_path
+    incremental = settings.svd_incremental if incremental is None else incremental
+    job = job or JobMetrics("train_model")
+
+    with job.stage("fetch"):
+        previous, reason = _previous_factors(settings, previous_factors_path, incremental)
+        ratings_frame, watermark, load_stats = _load_training_ratings(settings, previous)
+    summary: Dict[str, Any] = {
+        "ratings": len(ratings_frame),
+        "ratings_watermark": watermark.isoformat() if watermark is not None else None,
+        **load_stats,
+    }
     if ratings_frame.empty:
         logger.warning("No ratings available; writing empty recommendation file")
-        _write_payload(output_path, {
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "users": {},
-            "source": "empty",
-        })
-        return
-
-    try:
-        catalog = load_catalog(settings=settings)
-        product_ids = _build_product_index(catalog.products)
-    except CatalogLoaderError as exc:
-        logger.error("Failed to load catalog: %s", exc)
-        product_ids = []
+        _write_payload(output_path, RankedLists.empty(), "empty", settings.artifact_format)
+        return {**summary, "source": "empty"}
+
+    with job.stage("prepare"):
+        popularity = compute_rating_popularity(ratings_frame)
+        popularity.meta["generated_at"] = datetime.now(timezone.utc).isoformat()
+    with job.stage("write"):
+        target = save_artifact(popularity_path, popularity, settings.artifact_format)
+    logger.info("Saved popularity of %s products to %s", len(popularity.ids), target)
+
+    with job.stage("fetch"):
+        try:
+            catalog = load_catalog_snapshot(settings=settings)
+            product_ids = _build_product_index(catalog.ids.tolist())
+        except CatalogLoaderError as exc:
+            logger.error("Failed to load catalog: %s", exc)
+            product_ids = []
 
     if not product_ids:
         logger.warning("No products available for recommendation scoring; aborting")
-        _write_payload(output_path, {
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "users": {},
-            "source": "no-products",
-        })
-        return
-
-    dataset = _prepare_ratings(ratings_frame)
-    if dataset is None:
+        _write_payload(output_path, RankedLists.empty(), "no-products", settings.artifact_format)
+        return {**summary, "source": "no-products"}
+
+    with job.stage("prepare"):
+        clean = _prepare_ratings(ratings_frame)
+    if clean is None:
         logger.warning("Ratings dataset is empty after sanitisation; aborting")
-        _write_payload(output_path, {
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "users": {},
-            "source": "empty",
-        })
-        return
-
-    algorithm, _ = _train_model(dataset)
-    recommendations = _compute_user_recommendations(algorithm, ratings_frame, product_ids)
-
-    payload = {
-        "generated_at": datetime.now(timezone.utc).isoformat(),
-        "users": recommendations,
+        _write_payload(output_path, RankedLists.empty(), "empty", settings.artifact_format)
+        return {**summary, "source": "empty"}
+
+    with job.stage("fit"):
+        model, fit_stats = _fit_factors(clean, settings, previous, reason)
+        model.watermark = summary["ratings_watermark"]
+    held_out = holdout_mask(clean, settings.svd_holdout_fraction)
+    rmse: Optional[float] = None
+    if held_out.any():
+        with job.stage("evaluate"):
+            rmse = _evaluate(model, clean, held_out, settings)
+    if rmse is not None:
+        logger.info("Held-out RMSE %.4f on %s ratings", rmse, int(held_out.sum()))
+    with job.stage("score"):
+        recommendations = _compute_user_recommendations(
+            model, _hottest_users(ratings_frame, settings.precompute_top_users), product_ids
+        )
+
+    with job.stage("write"):
+        _write_payload(output_path, recommendations, "svd", settings.artifact_format)
+        # Written last: the next incremental run starts from these factors only
+        # once the recommendations computed from them exist.
+        model.save(factors_path)
+    return {
+        **summary,
+        **fit_stats,
         "source": "svd",
+        "users": len(recommendations),
+        "products": len(product_ids),
+        "holdout_ratings": int(held_out.sum()) if rmse is not None else 0,
+        "rmse": round(rmse, 6) if rmse is not None else None,
+        "stages": job.summary(),
     }
-    _write_payload(output_path, payload)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train the recommendation model.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        dest="incremental",
+        action="store_true",
+        default=None,
+        help="Warm-start from the previous factors and re-fit only touched users and items.",
+    )
+    mode.add_argument("--full", dest="incremental", action="store_false", help="Fit the model from scratch.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = ServiceSettings()
+    job = JobMetrics("train_model")
+    try:
+        summary = train(settings, incremental=args.incremental, job=job)
+    except BaseException:
+        job.write(Path(settings.job_metrics_dir), success=False)
+        raise
+    job.write(Path(settings.job_metrics_dir), success=summary["source"] == "svd")
+    logger.info("Training summary: %s", summary)
 
 
 if __name__ == "__main__":
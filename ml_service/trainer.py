@@ -0,0 +1,113 @@
+"""Standalone trainer that publishes versioned models into the registry.
+
+Usage::
+
+    python trainer.py            # train every TRAINER_INTERVAL_SECONDS
+    python trainer.py --once     # train once and exit
+
+Every run trains into a staging directory of the :mod:`registry` and
+publishes it as a new version only if a model was actually trained, so a
+failed or empty run never replaces the model being served. With
+``SVD_INCREMENTAL`` a run warm-starts from the factors of the current
+version. Stage timings of every run are written to ``JOB_METRICS_DIR``
+(see :mod:`metrics`). While the scheduler waits, ``SIGUSR1`` starts a
+run immediately; ``SIGTERM`` and ``SIGINT`` stop it after the current run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from metrics import JobMetrics
+from models import ServiceSettings
+from registry import ModelRegistry
+from train_model import train
+
+logger = logging.getLogger(__name__)
+
+
+def run_once(settings: ServiceSettings, registry: ModelRegistry) -> Optional[str]:
+    """Train into a staging directory and publish it; returns the new version."""
+
+    staging = registry.staging_dir()
+    factors_name = Path(settings.factor_model_path).name
+    job = JobMetrics("trainer")
+    metrics_dir = Path(settings.job_metrics_dir)
+    start = time.perf_counter()
+    try:
+        summary = train(
+            settings,
+            output_path=staging / Path(settings.recommendations_output_path).name,
+            popularity_path=staging / Path(settings.popularity_path).name,
+            factors_path=staging / factors_name,
+            previous_factors_path=registry.locate(factors_name),
+            job=job,
+        )
+        elapsed = time.perf_counter() - start
+        if summary.get("source") != "svd":
+            logger.warning(
+                "Training produced no model (%s); keeping version %s",
+                summary.get("source"),
+                registry.current_version(),
+            )
+            registry.discard(staging)
+            job.write(metrics_dir, success=False)
+            return None
+        with job.stage("publish"):
+            version = registry.publish(staging, {**summary, "train_seconds": round(elapsed, 3)})
+        job.write(metrics_dir)
+        return version
+    except BaseException:
+        registry.discard(staging)
+        job.write(metrics_dir, success=False)
+        raise
+
+
+def run_forever(settings: ServiceSettings, registry: ModelRegistry, interval: float) -> None:
+    stop = threading.Event()
+    wake = threading.Event()
+
+    def _stop(signum: int, _frame) -> None:
+        logger.info("Received signal %s; stopping after the current run", signum)
+        stop.set()
+        wake.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: wake.set())
+
+    while not stop.is_set():
+        try:
+            run_once(settings, registry)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Training run failed; the current model version stays published")
+        wake.clear()
+        if not stop.is_set():
+            logger.info("Next training run in %.0f seconds", interval)
+            wake.wait(interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train models and publish them into the model registry.")
+    parser.add_argument("--once", action="store_true", help="Train once and exit.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = ServiceSettings()
+    registry = ModelRegistry(Path(settings.model_registry_dir), keep_versions=settings.registry_keep_versions)
+    if args.once or settings.trainer_interval_seconds == 0:
+        if run_once(settings, registry) is None:
+            raise SystemExit("Training produced no model")
+        return
+    run_forever(settings, registry, settings.trainer_interval_seconds)
+
+
+if __name__ == "__main__":
+    main()